@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Non-blocking storage access for async code
+Runs Database / RateLimiter calls on a dedicated thread and batches writes
+that arrive together into one transaction
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+# Maximum requests taken off the queue per batch
+MAX_BATCH = 256
+
+
+class _Request:
+    """One queued storage call"""
+
+    __slots__ = ('fn', 'args', 'kwargs', 'backend', 'write', 'future', 'loop')
+
+    def __init__(self, fn, args, kwargs, backend, write, future=None, loop=None):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.backend = backend
+        self.write = write
+        self.future = future
+        self.loop = loop
+
+
+class StorageExecutor:
+    """Dedicated storage thread with a request queue"""
+
+    def __init__(self, name: str = 'storage'):
+        """Initialize and start the storage thread"""
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable, args: tuple = (), kwargs: dict = None,
+               backend=None, write: bool = False) -> asyncio.Future:
+        """
+        Queue a call and return a future for its result
+
+        Args:
+            fn: Storage method to call
+            args: Positional arguments
+            kwargs: Keyword arguments
+            backend: SQLiteBackend the call writes to (used to batch writes)
+            write: True if the call modifies the database
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(_Request(fn, args, kwargs or {}, backend, write, future, loop))
+        return future
+
+    def defer(self, fn: Callable, *args, backend=None, **kwargs):
+        """Queue a write whose result nobody waits for"""
+        self._queue.put(_Request(fn, args, kwargs, backend, True))
+
+    def stop(self, timeout: float = 10.0):
+        """Flush queued requests and stop the thread"""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        """Thread main loop: drain the queue in batches"""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+
+            batch = [request]
+            stopping = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+
+            self._execute(batch)
+            if stopping:
+                return
+
+    def _execute(self, batch: list):
+        """Run a batch in order, grouping consecutive writes per backend"""
+        i = 0
+        while i < len(batch):
+            request = batch[i]
+            if not request.write or request.backend is None:
+                self._call(request)
+                i += 1
+                continue
+
+            # Consecutive writes to the same backend share one transaction
+            j = i
+            while (j < len(batch) and batch[j].write
+                   and batch[j].backend is request.backend):
+                j += 1
+            group = batch[i:j]
+
+            try:
+                with request.backend.transaction() as conn:
+                    results = [self._invoke_atomic(conn, n, r) for n, r in enumerate(group)]
+            except Exception as e:
+                logger.error("Storage write batch of %s failed: %s", len(group), e)
+                results = [(None, e)] * len(group)
+
+            for r, (result, error) in zip(group, results):
+                self._resolve(r, result, error)
+
+            if len(group) > 1:
+                logger.debug("Committed %s writes in one transaction", len(group))
+            i = j
+
+    @staticmethod
+    def _invoke(request: _Request):
+        """Call the storage method, capturing its result or error"""
+        try:
+            with span(f"db.{request.fn.__name__}"):
+                return request.fn(*request.args, **request.kwargs), None
+        except Exception as e:
+            return None, e
+
+    @classmethod
+    def _invoke_atomic(cls, conn, n: int, request: _Request):
+        """
+        Invoke one write of a batch inside its own savepoint
+
+        A write that raises or returns False (storage methods that handle
+        their own errors) is rolled back alone, so the batch commit never
+        keeps half of it.
+        """
+        conn.execute(f'SAVEPOINT write_{n}')
+        result, error = cls._invoke(request)
+        if error is not None or result is False:
+            conn.execute(f'ROLLBACK TO write_{n}')
+        conn.execute(f'RELEASE write_{n}')
+        return result, error
+
+    def _call(self, request: _Request):
+        """Run a single request and resolve it"""
+        result, error = self._invoke(request)
+        self._resolve(request, result, error)
+
+    @staticmethod
+    def _resolve(request: _Request, result: Any, error: Optional[Exception]):
+        """Hand the outcome back to the waiting event loop"""
+        if request.future is None:
+            if error is not None:
+                logger.error("Deferred storage call %s failed: %s", request.fn.__name__, error)
+            return
+
+        def _set():
+            if request.future.done():
+                return
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+        try:
+            request.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            # Event loop already closed (shutdown)
+            pass
+
+
+class AsyncProxy:
+    """Awaitable view of a Database or RateLimiter"""
+
+    def __init__(self, target, executor: StorageExecutor):
+        """
+        Initialize proxy
+
+        Args:
+            target: Object with a `storage` backend and a WRITE_METHODS set
+            executor: Storage executor to run calls on
+        """
+        self._target = target
+        self._executor = executor
+        self._write_methods = getattr(target, 'WRITE_METHODS', frozenset())
+
+    @property
+    def target(self):
+        """Underlying synchronous object"""
+        return self._target
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        write = name in self._write_methods
+        backend = getattr(self._target, 'storage', None)
+
+        async def call(*args, **kwargs):
+            return await self._executor.submit(attr, args, kwargs, backend=backend, write=write)
+
+        call.__name__ = name
+        return call
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> StorageExecutor:
+    """Get the shared storage executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = StorageExecutor()
+        return _executor
+
+
+def stop_executor():
+    """Flush and stop the shared storage executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.stop()
+            _executor = None
+
+
+if __name__ == '__main__':
+    # A failed write in a batch must leave nothing behind, whether it raised
+    # or handled its own error and returned False
+    from storage import MemoryBackend
+
+    backend = MemoryBackend()
+    with backend.transaction() as conn:
+        conn.execute('CREATE TABLE t (v INTEGER)')
+
+    def insert(v, fail=None):
+        with backend.transaction() as conn:
+            conn.execute('INSERT INTO t VALUES (?)', (v,))
+            conn.execute('INSERT INTO t VALUES (?)', (-v,))
+            if fail == 'raise':
+                raise RuntimeError(f"write {v} failed")
+        return fail != 'return'
+
+    def swallow(v):
+        try:
+            insert(v, fail='raise')
+        except RuntimeError:
+            return False
+
+    executor = StorageExecutor()
+    executor.defer(insert, 1, fail='raise', backend=backend)  # Alone in its batch
+    executor.stop()
+
+    executor = StorageExecutor()
+    for args in ((2,), (3, 'raise'), (4, 'return'), (5,)):
+        executor.defer(insert, *args, backend=backend)
+    executor.defer(swallow, 6, backend=backend)
+    executor.stop()
+
+    rows = sorted(v for v, in backend.execute('SELECT v FROM t'))
+    assert rows == [-5, -2, 2, 5], rows
+    print(f"Committed {rows}: failed writes rolled back")
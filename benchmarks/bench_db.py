@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Storage benchmark
+Measures ops/s for each Database and RateLimiter method
+
+Usage:
+    python benchmarks/bench_db.py [--ops 2000] [--memory] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import Database
+from rate_limiter import RateLimiter
+from storage import MemoryBackend, SQLiteBackend
+
+ADDRESS = '0x1247739ac8e238D21574D18dEAce064675546cfC'
+
+
+def bench(name: str, fn, ops: int) -> dict:
+    """Run fn(i) ops times and return the rate"""
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    result = {'name': name, 'ops': ops, 'seconds': elapsed, 'ops_per_sec': ops / elapsed}
+    print(f"  {name:<32} {result['ops_per_sec']:>10,.0f} ops/s")
+    return result
+
+
+def run(ops: int, memory: bool = False) -> list:
+    """Run all storage benchmarks in a scratch directory"""
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = MemoryBackend() if memory else SQLiteBackend(os.path.join(tmp, 'fluid_bot.db'))
+        print(f"Backend: {type(storage).__name__}")
+        db = Database(storage=storage)
+        limiter = RateLimiter(storage=storage, legacy_db_path=None)
+
+        print("Database")
+        results.append(bench('add_monitored_address',
+                             lambda i: db.add_monitored_address(i % 100, f"0x{i:040x}"), ops))
+        results.append(bench('get_monitored_addresses',
+                             lambda i: db.get_monitored_addresses(i % 100), ops))
+        results.append(bench('get_all_monitored_addresses',
+                             lambda i: db.get_all_monitored_addresses(), max(1, ops // 10)))
+        results.append(bench('remove_monitored_address',
+                             lambda i: db.remove_monitored_address(i % 100, f"0x{i:040x}"), ops))
+        results.append(bench('add_alert',
+                             lambda i: db.add_alert(i % 100, i, 1.08, 'WARNING', 'bench'), ops))
+        results.append(bench('get_recent_alerts',
+                             lambda i: db.get_recent_alerts(i % 100), ops))
+        results.append(bench('add_position_snapshot',
+                             lambda i: db.add_position_snapshot(i % 50, ADDRESS, 1.2, 75.0, 1e4, 7.5e3,
+                                                                chain='eth'), ops))
+        results.append(bench('get_position_history',
+                             lambda i: db.get_position_history(i % 50, chain='eth'), ops))
+        results.append(bench('set_chain_presence',
+                             lambda i: db.set_chain_presence(f"0x{i % 500:040x}", 'eth', i % 2 == 0,
+                                                             int(time.time())), ops))
+        results.append(bench('get_chain_presence',
+                             lambda i: db.get_chain_presence(), max(1, ops // 10)))
+
+        print("RateLimiter")
+        results.append(bench('record_query',
+                             lambda i: limiter.record_query(i % 100, 'position', str(i)), ops))
+        results.append(bench('check_rate_limit',
+                             lambda i: limiter.check_rate_limit(i % 100), ops))
+        results.append(bench('get_user_stats',
+                             lambda i: limiter.get_user_stats(i % 100), ops))
+        results.append(bench('cleanup_old_records',
+                             lambda i: limiter.cleanup_old_records(), max(1, ops // 10)))
+
+        storage.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Storage benchmark')
+    parser.add_argument('--ops', type=int, default=2000, help='Operations per method')
+    parser.add_argument('--memory', action='store_true', help='Use the in-memory backend')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = run(args.ops, args.memory)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
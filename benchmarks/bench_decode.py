@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Decode/parse/format benchmark on recorded RPC payloads
+Replays a fixture directory recorded with RPC_RECORD_DIR (rpc_recorder.py)
+and times each stage of turning a resolver response into a Telegram message:
+
+    call      web3 contract call end to end (replay lookup + ABI decode + formatting)
+    decode    eth_abi decode of the raw bytes only
+    parse     MultiChainFluidClient._parse_position_data per position
+    format    format_position + summary_line per position
+
+Without --fixtures, a fixture is first recorded from the local mock chain,
+with one --whale address holding many positions to produce a huge
+positionsByUser response.
+
+Usage:
+    python benchmarks/bench_decode.py [--fixtures DIR] [--addresses 500] [--whale 300]
+                                      [--repeat 3] [--profile decode.prof]
+                                      [--json results.json]
+"""
+
+import argparse
+import cProfile
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from eth_abi import decode
+from web3 import Web3
+
+from mock_rpc import MockRpcServer, synthetic_fixture, address_for, _abi_type
+from rpc_budget import RpcBudget
+from rpc_recorder import compact_directory
+
+WHALE_INDEX = 10 ** 6
+
+
+def record_from_mock(directory: str, addresses: int, whale: int):
+    """Record positionsByUser/positionByNftId traffic against the mock chain"""
+    from fluid_client_multichain import MultiChainFluidClient
+
+    fixture = synthetic_fixture(addresses)
+    eth = fixture['eth']
+    whale_address = address_for(WHALE_INDEX)
+    for n in range(whale):
+        template = eth['positions'][n % len(eth['positions'])]
+        eth['positions'].append({**template, 'nftId': 9 * 10 ** 7 + n, 'owner': whale_address})
+
+    server = MockRpcServer(fixture).start()
+    os.environ.update(server.environ())
+    try:
+        client = MultiChainFluidClient(budget=RpcBudget(default_rate=1e12), record_dir=directory)
+        owners = sorted({p['owner'] for p in eth['positions']})
+        for owner in owners:
+            client.get_user_positions(owner, 'eth')
+        for position in eth['positions'][:addresses]:
+            client.get_position_by_id(position['nftId'], 'eth')
+    finally:
+        server.stop()
+    compact_directory(directory)
+    print(f"Recorded {len(owners)} positionsByUser and {min(addresses, len(eth['positions']))} "
+          f"positionByNftId responses (whale: {whale} positions)")
+
+
+def recorded_calls(client, chain: str):
+    """(function name, argument, raw result bytes) for every recorded resolver call"""
+    resolver = client._get_client(chain)['resolver']
+    selectors = {
+        resolver.encodeABI(fn_name='positionsByUser', args=[address_for(0)])[:10]: 'positionsByUser',
+        resolver.encodeABI(fn_name='positionByNftId', args=[0])[:10]: 'positionByNftId',
+    }
+    store = client._get_client(chain)['w3'].provider.store
+    for key, response in store.responses.items():
+        method, params = json.loads(key)
+        if method != 'eth_call' or 'result' not in response:
+            continue
+        data = params[0]['data']
+        name = selectors.get(data[:10])
+        if name is None:
+            continue
+        (arg,) = decode(['address' if name == 'positionsByUser' else 'uint256'], bytes.fromhex(data[10:]))
+        if name == 'positionsByUser':
+            arg = Web3.to_checksum_address(arg)
+        yield name, arg, bytes.fromhex(response['result'][2:])
+
+
+def run(client, chain: str, repeat: int) -> dict:
+    """Time every stage over every recorded response"""
+    from bot import format_position
+    from message_packer import summary_line
+
+    resolver = client._get_client(chain)['resolver']
+    types = {
+        name: [_abi_type(o) for o in resolver.get_function_by_name(name).abi['outputs']]
+        for name in ('positionsByUser', 'positionByNftId')
+    }
+
+    calls = list(recorded_calls(client, chain))
+    totals = {'call': 0.0, 'decode': 0.0, 'parse': 0.0, 'format': 0.0}
+    positions = 0
+    largest = None
+
+    for _ in range(repeat):
+        for name, arg, raw in calls:
+            start = time.perf_counter()
+            result = getattr(resolver.functions, name)(arg).call()
+            t_call = time.perf_counter() - start
+
+            start = time.perf_counter()
+            decode(types[name], raw)
+            t_decode = time.perf_counter() - start
+
+            pairs = zip(result[0], result[1]) if name == 'positionsByUser' else [result]
+            start = time.perf_counter()
+            parsed = [client._parse_position_data(u, v, chain) for u, v in pairs]
+            t_parse = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for pos in parsed:
+                if pos:
+                    format_position(pos, 'Ethereum')
+                    summary_line(pos)
+            t_format = time.perf_counter() - start
+
+            totals['call'] += t_call
+            totals['decode'] += t_decode
+            totals['parse'] += t_parse
+            totals['format'] += t_format
+            positions += len(parsed)
+            if largest is None or len(raw) > largest['bytes']:
+                largest = {'function': name, 'bytes': len(raw), 'positions': len(parsed),
+                           'call_ms': t_call * 1000, 'decode_ms': t_decode * 1000,
+                           'parse_ms': t_parse * 1000, 'format_ms': t_format * 1000}
+
+    return {
+        'responses': len(calls),
+        'positions': positions // repeat,
+        'repeat': repeat,
+        'per_position_us': {stage: t / positions * 1e6 for stage, t in totals.items()},
+        'total_seconds': totals,
+        'largest_response': largest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode/parse/format benchmark on recorded payloads')
+    parser.add_argument('--fixtures', help='Recorded fixture directory (default: record from the mock)')
+    parser.add_argument('--chain', default='eth', help='Chain to replay')
+    parser.add_argument('--addresses', type=int, default=500, help='Mock wallets when recording')
+    parser.add_argument('--whale', type=int, default=300, help='Positions of the largest mock wallet')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the recorded responses')
+    parser.add_argument('--profile', help='Write a cProfile of the replay to this file')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    directory = args.fixtures
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix='fluid-fixtures-')
+        record_from_mock(directory, args.addresses, args.whale)
+
+    from fluid_client_multichain import MultiChainFluidClient
+    client = MultiChainFluidClient(budget=RpcBudget(default_rate=1e12), replay_dir=directory)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    result = run(client, args.chain, args.repeat)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile}")
+
+    print(f"{result['responses']} recorded responses, {result['positions']} positions, "
+          f"{args.repeat} pass(es)")
+    print("  per position: " + "  ".join(f"{stage} {us:,.0f} µs"
+                                         for stage, us in result['per_position_us'].items()))
+    big = result['largest_response']
+    if big:
+        print(f"  largest: {big['function']} {big['bytes'] / 1024:,.0f} KB, {big['positions']} positions: "
+              f"call {big['call_ms']:.1f} ms, decode {big['decode_ms']:.1f} ms, "
+              f"parse {big['parse_ms']:.1f} ms, format {big['format_ms']:.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'fixtures': directory, 'chain': args.chain, **result}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
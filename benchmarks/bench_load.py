@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+End-to-end handler load test
+Drives the bot's registered handlers with synthetic updates from many fake
+users, against the local mock chain (mock_rpc.py) and a stand-in for the
+Bot API that answers every method locally and counts the calls
+
+Workload (--mix, weights per update kind):
+    position     a position ID sent as text (handle_message)
+    address      a wallet address sent as text (handle_message)
+    monitor      /monitor <address>
+    stats        /stats
+    mymonitors   /mymonitors
+
+Updates arrive as a Poisson stream at --rate per second (0 queues them all
+at once). Reports updates/s, handler latency (update queued to every
+handler done) overall and per kind, event-loop lag, Bot API calls per
+method, RPC requests per update and the slowest profiling spans.
+
+Usage:
+    python benchmarks/bench_load.py [--updates 5000] [--users 500] [--rate 0]
+                                    [--concurrency 32] [--api-latency 0.05]
+                                    [--mix position=35,address=25,monitor=10,stats=15,mymonitors=15]
+                                    [--json results.json]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['DB_PATH'] = ':memory:'  # Before bench_updates imports bot, which reads it
+
+from telegram import Chat, Message, MessageEntity, Update, User
+from telegram.ext import Application, ExtBot
+from telegram.request import BaseRequest
+
+from mock_rpc import MockRpcServer, synthetic_fixture, address_for
+from bench_rpc import new_client, percentiles
+from bench_updates import BENCH_TOKEN
+
+DEFAULT_MIX = 'position=35,address=25,monitor=10,stats=15,mymonitors=15'
+KINDS = ('position', 'address', 'monitor', 'stats', 'mymonitors')
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fluid Bench', 'username': 'fluid_bench_bot'}
+LAG_INTERVAL = 0.01  # Event-loop lag probe period (s)
+
+
+class FakeBotApi(BaseRequest):
+    """Answers Bot API requests locally after --api-latency and counts them per method"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        params = request_data.json_parameters if request_data else {}
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint in ('sendMessage', 'editMessageText', 'sendDocument'):
+            if 'message_id' in params:
+                message_id = int(params['message_id'])
+            else:
+                self._message_id += 1
+                message_id = self._message_id
+            result = {'message_id': message_id, 'date': int(time.time()), 'from': BOT_USER,
+                      'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                      'text': params.get('text', '')}
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+
+def make_update(bot: ExtBot, update_id: int, user_id: int, text: str) -> Update:
+    """Private text message update bound to bot; a leading /command gets its entity"""
+    user = User(id=user_id, first_name=f"user{user_id}", is_bot=False)
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    entities = None
+    if text.startswith('/'):
+        entities = [MessageEntity(MessageEntity.BOT_COMMAND, 0, len(text.split()[0]))]
+    message = Message(message_id=update_id, date=datetime.now(timezone.utc), chat=chat,
+                      from_user=user, text=text, entities=entities)
+    update = Update(update_id=update_id, message=message)
+    for obj in (user, chat, message, update):
+        obj.set_bot(bot)  # Shortcuts like message.reply_text() need it
+    return update
+
+
+def parse_mix(text: str) -> dict:
+    """'position=35,stats=15' -> {'position': 35.0, 'stats': 15.0}"""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown update kind {kind!r} (one of {', '.join(KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def workload(fixture: dict, updates: int, users: int, wallets: int, mix: dict, seed: int) -> list:
+    """[(user_id, kind, text)] for the whole run"""
+    rng = random.Random(seed)
+    nft_ids = [p['nftId'] for chain in fixture.values() for p in chain['positions']]
+    kinds, weights = zip(*mix.items())
+
+    items = []
+    for kind in rng.choices(kinds, weights, k=updates):
+        if kind == 'position':
+            text = str(rng.choice(nft_ids))
+        elif kind == 'address':
+            text = address_for(rng.randrange(wallets))
+        elif kind == 'monitor':
+            text = f"/monitor {address_for(rng.randrange(wallets))}"
+        else:
+            text = f"/{kind}"
+        items.append((rng.randint(1, users), kind, text))
+    return items
+
+
+async def probe_lag(samples: list, stop: asyncio.Event):
+    """Record how late the event loop wakes a LAG_INTERVAL sleep"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        before = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(loop.time() - before - LAG_INTERVAL)
+
+
+async def run(items: list, rate: float, concurrency: int, api: FakeBotApi, seed: int) -> dict:
+    """Feed every item through a real Application and time each update"""
+    import bot
+
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='rpc')
+    )
+
+    queued_at, kind_of, latencies = {}, {}, {}
+    errors = []
+    completed = 0
+    done = asyncio.Event()
+
+    def finished(update: Update):
+        nonlocal completed
+        elapsed = time.perf_counter() - queued_at[update.update_id]
+        latencies.setdefault(kind_of[update.update_id], []).append(elapsed)
+        completed += 1
+        if completed == len(items):
+            done.set()
+
+    def tracked(handler):
+        # Inside the per-user serialization: an update queued behind the
+        # user's running one returns from process_update long before its
+        # handler has run, so completion is taken from the handler itself
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context):
+            try:
+                return await handler(update, context)
+            finally:
+                finished(update)
+        return serialize(wrapper)
+
+    async def on_error(update, context):
+        errors.append(repr(context.error))
+
+    application = (
+        Application.builder()
+        .bot(ExtBot(BENCH_TOKEN, request=api, get_updates_request=api))
+        .updater(None)
+        .concurrent_updates(concurrency)
+        .build()
+    )
+    serialize = bot.serialized_per_user
+    bot.serialized_per_user = tracked
+    try:
+        bot.add_handlers(application)
+    finally:
+        bot.serialized_per_user = serialize
+    application.add_error_handler(on_error)
+
+    await application.initialize()
+    await application.start()
+
+    lag, stop_lag = [], asyncio.Event()
+    lag_task = asyncio.create_task(probe_lag(lag, stop_lag))
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    next_at = start
+    for update_id, (user_id, kind, text) in enumerate(items, 1):
+        if rate:
+            next_at += rng.expovariate(rate)
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        queued_at[update_id] = time.perf_counter()
+        kind_of[update_id] = kind
+        await application.update_queue.put(make_update(application.bot, update_id, user_id, text))
+
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    stop_lag.set()
+    await lag_task
+    await application.stop()
+    await application.shutdown()
+
+    every = [s for samples in latencies.values() for s in samples]
+    return {
+        'updates': len(items),
+        'seconds': elapsed,
+        'updates_per_sec': len(items) / elapsed,
+        'latency': percentiles(every),
+        'latency_by_kind': {kind: {'count': len(s), **percentiles(s)} for kind, s in sorted(latencies.items())},
+        'loop_lag': percentiles(lag) if lag else {},
+        'errors': len(errors),
+        'first_errors': errors[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end handler load test')
+    parser.add_argument('--updates', type=int, default=5000, help='Updates to send')
+    parser.add_argument('--users', type=int, default=500, help='Fake Telegram users')
+    parser.add_argument('--wallets', type=int, default=2000, help='Wallets on the mock chain')
+    parser.add_argument('--rate', type=float, default=0.0, help='Arrival rate in updates/s (0: all at once)')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent_updates and RPC worker threads')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='Simulated Bot API latency (s)')
+    parser.add_argument('--rpc-latency', type=float, default=0.0, help='Mock RPC latency per request (s)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help='Update kind weights')
+    parser.add_argument('--quota', type=int, default=10 ** 9, help='Daily queries per user')
+    parser.add_argument('--seed', type=int, default=1, help='Workload seed')
+    parser.add_argument('--log-level', default='CRITICAL', help='Log level while running')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    fixture = synthetic_fixture(args.wallets)
+    server = MockRpcServer(fixture, latency=args.rpc_latency).start()
+    os.environ.update(server.environ())  # Before any client reads chain_config
+
+    import bot
+    from async_storage import stop_executor
+    from profiling import get_spans, format_spans
+
+    bot.QUERIES_PER_DAY = args.quota
+    bot.MAX_QUEUED_PER_USER = args.updates  # Measure queueing, never drop
+    bot.fluid_client = new_client()
+
+    items = workload(fixture, args.updates, args.users, args.wallets, args.mix, args.seed)
+    api = FakeBotApi(args.api_latency)
+    print(f"{args.updates:,} updates from {args.users:,} users, concurrency {args.concurrency}, "
+          f"rate {args.rate or 'unlimited'}, Bot API latency {args.api_latency * 1000:.0f} ms")
+
+    try:
+        result = asyncio.run(run(items, args.rate, args.concurrency, api, args.seed))
+    finally:
+        stop_executor()
+        server.stop()
+
+    result['bot_api_calls'] = api.calls
+    result['rpc_requests'] = server.stats['calls']
+    result['rpc_requests_per_update'] = server.stats['calls'] / args.updates
+    result['spans'] = get_spans().report()
+
+    lat, lag = result['latency'], result['loop_lag']
+    print(f"  throughput   {result['updates_per_sec']:,.1f} updates/s ({result['seconds']:.1f} s)")
+    print(f"  latency      p50 {lat['p50_ms']:,.1f} ms  p99 {lat['p99_ms']:,.1f} ms  max {lat['max_ms']:,.1f} ms")
+    for kind, r in result['latency_by_kind'].items():
+        print(f"    {kind:<11} {r['count']:>6,}  p50 {r['p50_ms']:,.1f} ms  p99 {r['p99_ms']:,.1f} ms")
+    if lag:
+        print(f"  loop lag     p50 {lag['p50_ms']:.1f} ms  p99 {lag['p99_ms']:.1f} ms  max {lag['max_ms']:.1f} ms")
+    print(f"  Bot API      {', '.join(f'{m} {n:,}' for m, n in sorted(api.calls.items()))}")
+    print(f"  RPC          {result['rpc_requests']:,} requests ({result['rpc_requests_per_update']:.2f} per update)")
+    print(f"  errors       {result['errors']}" + (f"  e.g. {result['first_errors'][0]}" if result['errors'] else ""))
+    print()
+    print(format_spans(result['spans'], limit=12))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': {**vars(args), 'mix': args.mix}, **result}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
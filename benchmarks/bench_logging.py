@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Logging overhead benchmark
+Runs monitor cycles against the local mock chain under several logging
+setups and measures the time spent inside logging calls on the calling
+threads (event loop and RPC workers), per cycle and per address:
+
+    off            nothing enabled (baseline)
+    sync           handler writing on the calling thread (logging.basicConfig)
+    queue          log_config queue handler, no sampling
+    queue-sampled  log_config queue handler with template sampling
+    queue-json     as queue-sampled, JSON lines
+
+--level DEBUG (default) includes the per-address lines, which is the volume
+the monitor wrote at INFO before they were demoted; --level INFO shows what
+production writes now. Output goes to a temporary file so terminal speed
+does not skew results.
+
+Usage:
+    python benchmarks/bench_logging.py [--sizes 1000 5000] [--level DEBUG] [--modes ...]
+                                       [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mock_rpc import MockRpcServer, synthetic_fixture, address_for
+from bench_rpc import CountingBot, new_client, run_cycle
+
+import log_config
+
+MODES = ('off', 'sync', 'queue', 'queue-sampled', 'queue-json')
+
+
+class LogTimer:
+    """Accumulates time spent in Logger._log (record creation, filters, handlers)"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._original = logging.Logger._log
+
+    def __enter__(self):
+        original = self._original
+        timer = self
+
+        def timed_log(logger, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(logger, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with timer._lock:
+                    timer.seconds += elapsed
+                    timer.calls += 1
+
+        logging.Logger._log = timed_log
+        return self
+
+    def __exit__(self, *exc):
+        logging.Logger._log = self._original
+
+
+def configure(mode: str, path: str, level: str = 'DEBUG'):
+    """Install the logging setup for a mode, writing to path"""
+    log_config.stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    if mode == 'off':
+        root.setLevel(logging.CRITICAL)
+    elif mode == 'sync':
+        handler = logging.StreamHandler(open(path, 'a'))
+        handler.setFormatter(logging.Formatter(log_config.TEXT_FORMAT))
+        root.addHandler(handler)
+        root.setLevel(level)
+    else:
+        log_config.setup_logging(
+            level=level, stream=open(path, 'a'),
+            fmt='json' if mode == 'queue-json' else 'text',
+            sample_limit=0 if mode == 'queue' else log_config.LOG_SAMPLE_LIMIT,
+        )
+
+    # Per-request transport logs would dominate otherwise
+    for noisy in ('urllib3', 'web3', 'asyncio'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+
+async def bench_size(size: int, modes: list, level: str, cycle_seconds: float) -> list:
+    """One warm monitor cycle per mode over size monitored addresses"""
+    from async_storage import stop_executor
+    from database import Database
+    from monitor import PositionMonitor
+    from storage import MemoryBackend
+
+    configure('off', os.devnull)
+    db = Database(storage=MemoryBackend())
+    for first in range(0, size, 10):
+        db.add_monitored_addresses(first // 10 + 1, [
+            (address_for(i), 1.15, 1.05) for i in range(first, min(first + 10, size))
+        ])
+
+    monitor = PositionMonitor(CountingBot(), db)
+    monitor.fluid_client = new_client()
+    await run_cycle(monitor, cycle_seconds)  # Cold cycle fills the chain presence cache
+
+    results = []
+    for mode in modes:
+        fd, path = tempfile.mkstemp(prefix=f'bench-log-{mode}-', suffix='.log')
+        os.close(fd)
+        configure(mode, path, level)
+
+        with LogTimer() as timer:
+            cycle = await run_cycle(monitor, cycle_seconds)
+        stats = log_config.get_log_stats() if mode.startswith('queue') else None
+        configure('off', os.devnull)  # Flushes the queue before the file is measured
+
+        with open(path) as f:
+            written = sum(1 for _ in f)
+        os.remove(path)
+
+        checked = max(cycle['checked'], 1)
+        results.append({
+            'size': size,
+            'mode': mode,
+            'level': level,
+            'cycle_seconds': cycle['seconds'],
+            'complete': cycle['complete'],
+            'log_calls': timer.calls,
+            'log_seconds': timer.seconds,
+            'log_us_per_address': timer.seconds / checked * 1e6,
+            'lines_written': written,
+            'suppressed': stats['suppressed'] if stats else 0,
+        })
+
+    stop_executor()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Logging overhead per monitor cycle')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help='Monitored address counts')
+    parser.add_argument('--level', default='DEBUG', type=str.upper, help='Log level while measuring')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help='Logging setups')
+    parser.add_argument('--cycle-seconds', type=float, default=120.0, help='Time box per monitor cycle')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    fixture = synthetic_fixture(max(args.sizes))
+    server = MockRpcServer(fixture).start()
+    os.environ.update(server.environ())
+
+    results = []
+    try:
+        for size in args.sizes:
+            print(f"{size:,} monitored addresses, {args.level}")
+            for r in asyncio.run(bench_size(size, args.modes, args.level, args.cycle_seconds)):
+                results.append(r)
+                print(f"  {r['mode']:<14} cycle {r['cycle_seconds']:6.2f} s  "
+                      f"logging {r['log_seconds'] * 1000:8.1f} ms ({r['log_us_per_address']:6.1f} µs/addr)  "
+                      f"{r['log_calls']:>7,} calls  {r['lines_written']:>7,} lines  "
+                      f"{r['suppressed']:>7,} sampled out")
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Offline RPC benchmark suite
+Runs the real client and monitor against the local mock chain (mock_rpc.py)
+instead of live endpoints
+
+Benchmarks:
+    single     positionByNftId latency on one chain
+    search     cross-chain address and position search latency
+    monitor    monitor-cycle throughput at each --sizes count of monitored
+               addresses (cold cycle probes every chain; warm cycle uses the
+               chain presence cache). Cycles are time-boxed by --cycle-seconds
+               and report whether they completed.
+
+Usage:
+    python benchmarks/bench_rpc.py [--sizes 100 1000 10000 100000] [--latency 0.0]
+                                   [--error-rate 0.0] [--queries 200]
+                                   [--cycle-seconds 60] [--fixture recorded.json]
+                                   [--only single search monitor] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mock_rpc import MockRpcServer, synthetic_fixture, load_fixture, address_for
+
+BENCHMARKS = ('single', 'search', 'monitor')
+
+
+class CountingBot:
+    """Stands in for telegram.Bot: counts alerts instead of sending them"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, *args, **kwargs):
+        self.sent += 1
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p90/p99/max in milliseconds"""
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+    return {'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99), 'max_ms': samples[-1] * 1000}
+
+
+def new_client():
+    """Client with an unlimited RPC budget (the mock has no key to protect)"""
+    from fluid_client_multichain import MultiChainFluidClient
+    from rpc_budget import RpcBudget
+    return MultiChainFluidClient(budget=RpcBudget(default_rate=1e12))
+
+
+def bench_single(server: MockRpcServer, fixture: dict, queries: int) -> dict:
+    """Latency of get_position_by_id on eth"""
+    client = new_client()
+    nft_ids = [p['nftId'] for p in fixture['eth']['positions']]
+    rng = random.Random(1)
+    client.get_position_by_id(nft_ids[0], 'eth')  # Connect outside the timing
+
+    samples = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        client.get_position_by_id(rng.choice(nft_ids), 'eth')
+        samples.append(time.perf_counter() - start)
+    return {'benchmark': 'single', 'queries': queries, **percentiles(samples)}
+
+
+def bench_search(server: MockRpcServer, fixture: dict, queries: int, addresses: int) -> dict:
+    """Latency of search_address_across_chains and search_position_across_chains"""
+    client = new_client()
+    rng = random.Random(2)
+    nft_ids = [p['nftId'] for chain in fixture.values() for p in chain['positions']]
+    client.search_address_across_chains(address_for(0))  # Connect every chain first
+
+    by_address, by_position = [], []
+    for _ in range(queries):
+        start = time.perf_counter()
+        client.search_address_across_chains(address_for(rng.randrange(addresses)))
+        by_address.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        client.search_position_across_chains(rng.choice(nft_ids))
+        by_position.append(time.perf_counter() - start)
+
+    return {
+        'benchmark': 'search',
+        'queries': queries,
+        'address': percentiles(by_address),
+        'position': percentiles(by_position),
+    }
+
+
+async def run_cycle(monitor, limit: float) -> dict:
+    """Run one monitor cycle, stopping after limit seconds"""
+    checked = 0
+    check = monitor._check_monitored
+
+    async def counted(key, thresholds):
+        nonlocal checked
+        result = await check(key, thresholds)
+        checked += 1
+        return result
+
+    monitor._check_monitored = counted
+    start = time.perf_counter()
+    task = asyncio.create_task(monitor.check_all_positions())
+    done, _ = await asyncio.wait({task}, timeout=limit)
+    elapsed = time.perf_counter() - start
+    if not done:
+        task.cancel()
+    monitor._check_monitored = check
+
+    return {
+        'complete': bool(done),
+        'checked': checked,
+        'seconds': elapsed,
+        'addresses_per_sec': checked / elapsed if elapsed else 0.0,
+    }
+
+
+async def bench_monitor_size(server: MockRpcServer, size: int, cycle_seconds: float) -> dict:
+    """Cold and warm monitor cycles over size monitored addresses"""
+    from async_storage import stop_executor
+    from database import Database
+    from monitor import PositionMonitor
+    from storage import MemoryBackend
+
+    db = Database(storage=MemoryBackend())
+    start = time.perf_counter()
+    # Ten addresses per user, like a small fund; one transaction per user
+    for first in range(0, size, 10):
+        db.add_monitored_addresses(first // 10 + 1, [
+            (address_for(i), 1.15, 1.05) for i in range(first, min(first + 10, size))
+        ])
+    load_seconds = time.perf_counter() - start
+
+    bot = CountingBot()
+    monitor = PositionMonitor(bot, db)
+    monitor.fluid_client = new_client()
+
+    calls_before = server.stats['calls']
+    cold = await run_cycle(monitor, cycle_seconds)
+    cold['rpc_calls'] = server.stats['calls'] - calls_before
+
+    result = {'benchmark': 'monitor', 'size': size, 'insert_seconds': load_seconds, 'cold': cold}
+    if cold['complete']:
+        calls_before = server.stats['calls']
+        warm = await run_cycle(monitor, cycle_seconds)
+        warm['rpc_calls'] = server.stats['calls'] - calls_before
+        result['warm'] = warm
+    result['alerts'] = bot.sent
+
+    stop_executor()
+    return result
+
+
+def print_result(result: dict):
+    """One-line summary per benchmark"""
+    kind = result['benchmark']
+    if kind == 'single':
+        print(f"  single position      p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms")
+    elif kind == 'search':
+        for name in ('address', 'position'):
+            r = result[name]
+            print(f"  search by {name:<10} p50 {r['p50_ms']:7.2f} ms  p99 {r['p99_ms']:7.2f} ms")
+    else:
+        line = f"  monitor {result['size']:>7,} addr"
+        for name in ('cold', 'warm'):
+            if name in result:
+                r = result[name]
+                status = "" if r['complete'] else f" (stopped, {r['checked']:,} checked)"
+                line += (f"  {name} {r['addresses_per_sec']:>8,.0f} addr/s "
+                         f"{r['rpc_calls'] / max(r['checked'], 1):.2f} calls/addr{status}")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline RPC benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help='Monitored address counts')
+    parser.add_argument('--queries', type=int, default=200, help='Queries per latency benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='Mock RPC latency per request (s)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random mock latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of failing mock requests')
+    parser.add_argument('--cycle-seconds', type=float, default=60.0, help='Time box per monitor cycle')
+    parser.add_argument('--fixture', help='Recorded fixture JSON instead of synthetic data')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help='Benchmarks to run')
+    parser.add_argument('--log-level', default='CRITICAL',
+                        help='Log level while benchmarking (misses and injected errors log at ERROR)')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    addresses = max(args.sizes)
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(addresses)
+    server = MockRpcServer(fixture, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate).start()
+    os.environ.update(server.environ())  # Before any client reads chain_config
+
+    positions = sum(len(chain['positions']) for chain in fixture.values())
+    print(f"Mock chain: {addresses:,} wallets, {positions:,} positions, "
+          f"latency {args.latency * 1000:.0f} ms, error rate {args.error_rate:.1%}")
+
+    results = []
+    try:
+        if 'single' in args.only:
+            results.append(bench_single(server, fixture, args.queries))
+            print_result(results[-1])
+        if 'search' in args.only:
+            results.append(bench_search(server, fixture, args.queries, addresses))
+            print_result(results[-1])
+        if 'monitor' in args.only:
+            for size in args.sizes:
+                results.append(asyncio.run(bench_monitor_size(server, size, args.cycle_seconds)))
+                print_result(results[-1])
+    finally:
+        server.stop()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'mock_requests': server.stats, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+/stats benchmark
+Compares the old four-aggregate get_user_stats against the daily rollup
+read on a large user_queries table, and times query log compaction
+
+Usage:
+    python benchmarks/bench_stats.py [--rows 1000000] [--users 1000] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from rate_limiter import RateLimiter, CLEANUP_BATCH
+from storage import SQLiteBackend
+
+# History spread over this many days
+HISTORY_DAYS = 365
+
+QUERY_TYPES = ('position', 'address', 'monitor')
+
+
+def legacy_user_stats(conn, user_id: int) -> dict:
+    """get_user_stats as it was before the rollups: four aggregates over the raw log"""
+    now = int(time.time())
+    queries_24h = conn.execute('SELECT COUNT(*) FROM user_queries WHERE user_id = ? AND created_ts > ?',
+                               (user_id, now - 86400)).fetchone()[0]
+    queries_7d = conn.execute('SELECT COUNT(*) FROM user_queries WHERE user_id = ? AND created_ts > ?',
+                              (user_id, now - 7 * 86400)).fetchone()[0]
+    queries_total = conn.execute('SELECT COUNT(*) FROM user_queries WHERE user_id = ?',
+                                 (user_id,)).fetchone()[0]
+    query_types = dict(conn.execute(
+        'SELECT query_type, COUNT(*) FROM user_queries WHERE user_id = ? AND created_ts > ? '
+        'GROUP BY query_type', (user_id, now - 86400)).fetchall())
+    return {'queries_24h': queries_24h, 'queries_7d': queries_7d,
+            'queries_total': queries_total, 'query_types': query_types}
+
+
+def populate(storage, rows: int, users: int):
+    """Fill user_queries and user_query_daily with random history"""
+    now = int(time.time())
+    rng = random.Random(42)
+    batch = 50000
+
+    with storage.transaction() as conn:
+        for offset in range(0, rows, batch):
+            conn.executemany(
+                'INSERT INTO user_queries (user_id, query_type, query_value, created_ts) VALUES (?, ?, ?, ?)',
+                [(rng.randrange(users), rng.choice(QUERY_TYPES), str(i),
+                  now - rng.randrange(HISTORY_DAYS * 86400))
+                 for i in range(offset, min(rows, offset + batch))]
+            )
+        conn.execute('''
+            INSERT INTO user_query_daily (user_id, day, query_type, count)
+            SELECT user_id, created_ts / 86400, query_type, COUNT(*)
+            FROM user_queries
+            GROUP BY user_id, created_ts / 86400, query_type
+        ''')
+
+
+def timed(name: str, fn, ops: int) -> dict:
+    """Run fn(i) ops times and return the per-call latency"""
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    result = {'name': name, 'ops': ops, 'seconds': elapsed, 'ms_per_op': elapsed * 1000 / ops}
+    print(f"  {name:<24} {result['ms_per_op']:>9.3f} ms/call")
+    return result
+
+
+def run(rows: int, users: int, ops: int) -> list:
+    """Build the table in a scratch directory and run the comparisons"""
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteBackend(os.path.join(tmp, 'fluid_bot.db'))
+        limiter = RateLimiter(storage=storage, legacy_db_path=None)
+
+        start = time.perf_counter()
+        populate(storage, rows, users)
+        print(f"Populated {rows:,} rows for {users:,} users in {time.perf_counter() - start:.1f}s")
+
+        conn = storage.connection()
+        print("get_user_stats")
+        results.append(timed('legacy (4 aggregates)', lambda i: legacy_user_stats(conn, i % users), ops))
+        results.append(timed('rollups', lambda i: limiter.get_user_stats(i % users), ops))
+
+        sample = limiter.get_user_stats(0)
+        legacy = legacy_user_stats(conn, 0)
+        print(f"  user 0: total {sample['queries_total']} vs {legacy['queries_total']}")
+
+        print("Compaction")
+        start = time.perf_counter()
+        deleted = batches = 0
+        while True:
+            n = limiter.cleanup_old_records()
+            deleted += n
+            batches += 1
+            if n < CLEANUP_BATCH:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"  deleted {deleted:,} rows in {batches} batches, {elapsed:.1f}s "
+              f"({elapsed * 1000 / batches:.1f} ms per batch)")
+        start = time.perf_counter()
+        folded = limiter.fold_old_rollups()
+        fold_elapsed = time.perf_counter() - start
+        print(f"  folded {folded:,} daily rollups in {fold_elapsed:.1f}s")
+        results.append({'name': 'compaction', 'rows': deleted, 'batches': batches, 'seconds': elapsed,
+                        'rollups_folded': folded, 'fold_seconds': fold_elapsed})
+
+        results.append(timed('rollups (compacted)', lambda i: limiter.get_user_stats(i % users), ops))
+        compacted = limiter.get_user_stats(0)
+        print(f"  user 0: total {compacted['queries_total']}, 7d {compacted['queries_7d']} "
+              f"vs {legacy['queries_7d']}")
+        storage.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/stats benchmark')
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows in user_queries')
+    parser.add_argument('--users', type=int, default=1000, help='Distinct users')
+    parser.add_argument('--ops', type=int, default=500, help='get_user_stats calls per variant')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.users, args.ops)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
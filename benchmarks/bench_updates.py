@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Update throughput benchmark
+Feeds simulated Telegram updates through a real Application (no network) and
+compares sequential handling with concurrent handling serialized per user
+
+Each update runs a handler that blocks a worker thread for --latency seconds,
+standing in for a cross-chain RPC query.
+
+Usage:
+    python benchmarks/bench_updates.py [--users 50] [--messages 4] [--latency 0.5]
+                                       [--concurrency 1 8 32] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, ExtBot, MessageHandler, filters
+
+from bot import serialized_per_user
+
+BENCH_TOKEN = '123456:offline-benchmark'
+
+
+class OfflineBot(ExtBot):
+    """Bot that never talks to the Telegram API"""
+
+    async def initialize(self):
+        self._initialized = True
+
+    async def shutdown(self):
+        self._initialized = False
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    """Build a private text message update"""
+    user = User(id=user_id, first_name=f"user{user_id}", is_bot=False)
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(timezone.utc), chat=chat,
+                      from_user=user, text=text)
+    return Update(update_id=update_id, message=message)
+
+
+async def run_once(concurrency: int, users: int, messages: int, latency: float) -> dict:
+    """Process users * messages updates and return throughput and ordering results"""
+    done = asyncio.Event()
+    total = users * messages
+    seen = {}          # user_id -> message numbers in handling order
+    latencies = []     # enqueue -> handler finished
+    enqueued_at = {}
+
+    async def handle(update: Update, context):
+        user_id = update.effective_user.id
+        seen.setdefault(user_id, []).append(int(update.message.text))
+        await asyncio.to_thread(time.sleep, latency)
+        latencies.append(time.perf_counter() - enqueued_at[update.update_id])
+        if len(latencies) == total:
+            done.set()
+
+    application = (
+        Application.builder()
+        .bot(OfflineBot(BENCH_TOKEN))
+        .updater(None)
+        .concurrent_updates(concurrency if concurrency > 1 else False)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, serialized_per_user(handle)))
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max(1, concurrency)))
+
+    await application.initialize()
+    await application.start()
+
+    start = time.perf_counter()
+    update_id = 0
+    for n in range(messages):
+        for user_id in range(1, users + 1):
+            update_id += 1
+            enqueued_at[update_id] = time.perf_counter()
+            await application.update_queue.put(make_update(update_id, user_id, str(n)))
+
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    await application.stop()
+    await application.shutdown()
+
+    in_order = all(order == sorted(order) for order in seen.values())
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'updates': total,
+        'seconds': elapsed,
+        'updates_per_sec': total / elapsed,
+        'p50_latency': latencies[len(latencies) // 2],
+        'p99_latency': latencies[int(len(latencies) * 0.99) - 1],
+        'per_user_order_kept': in_order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update throughput benchmark')
+    parser.add_argument('--users', type=int, default=50, help='Simulated users')
+    parser.add_argument('--messages', type=int, default=4, help='Messages per user')
+    parser.add_argument('--latency', type=float, default=0.5, help='Blocking handler time (s)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help='concurrent_updates values to compare')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{args.users} users x {args.messages} messages, {args.latency}s per update")
+    for concurrency in args.concurrency:
+        result = asyncio.run(run_once(concurrency, args.users, args.messages, args.latency))
+        results.append(result)
+        print(f"  concurrency {concurrency:>3}: {result['updates_per_sec']:>7.1f} updates/s  "
+              f"p50 {result['p50_latency']:.2f}s  p99 {result['p99_latency']:.2f}s  "
+              f"order kept: {result['per_user_order_kept']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
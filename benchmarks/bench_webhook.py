@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Webhook vs polling latency benchmark
+Measures update-to-handler latency for both delivery modes against a local
+stand-in for the Bot API (no network, no real token)
+
+Webhook: updates are POSTed as JSON to the embedded HTTP server with the
+secret token header, after a simulated one-way network delay of rtt/2.
+Polling: get_updates is a long poll whose request and response each take
+rtt/2; updates arriving while a response is in flight wait for the next poll.
+
+Also checks that a request with the wrong secret token is rejected.
+
+Usage:
+    python benchmarks/bench_webhook.py [--updates 200] [--rate 20] [--rtt 0.1]
+                                       [--port 8765] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+
+from bench_updates import OfflineBot, make_update, BENCH_TOKEN
+
+SECRET = 'local-benchmark-secret'
+URL_PATH = 'telegram'
+
+
+class LocalBot(OfflineBot):
+    """Offline bot whose get_updates long-polls a local queue"""
+
+    def __init__(self, token: str, rtt: float):
+        super().__init__(token)
+        with self._unfrozen():
+            self.rtt = rtt
+            self.pending: asyncio.Queue = None
+
+    async def set_webhook(self, *args, **kwargs):
+        return True
+
+    async def delete_webhook(self, *args, **kwargs):
+        return True
+
+    async def get_updates(self, offset=None, limit=100, timeout=0, **kwargs):
+        await asyncio.sleep(self.rtt / 2)  # Request reaches the server
+        try:
+            batch = [await asyncio.wait_for(self.pending.get(), timeout or 10)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.pending.empty() and len(batch) < limit:
+            batch.append(self.pending.get_nowait())
+        await asyncio.sleep(self.rtt / 2)  # Response comes back
+        return batch
+
+
+async def run_mode(mode: str, updates: int, rate: float, rtt: float, port: int) -> dict:
+    """Deliver updates in one mode and return latency percentiles"""
+    created = {}
+    latencies = []
+    done = asyncio.Event()
+
+    async def handle(update: Update, context):
+        latencies.append(time.perf_counter() - created[update.update_id])
+        if len(latencies) == updates:
+            done.set()
+
+    bot = LocalBot(BENCH_TOKEN, rtt)
+    with bot._unfrozen():
+        bot.pending = asyncio.Queue()
+    application = Application.builder().bot(bot).concurrent_updates(True).build()
+    application.add_handler(MessageHandler(filters.TEXT, handle))
+
+    await application.initialize()
+    await application.start()
+    rejected = None
+
+    if mode == 'webhook':
+        await application.updater.start_webhook(
+            listen='127.0.0.1', port=port, url_path=URL_PATH, secret_token=SECRET,
+        )
+        http = AsyncHTTPClient()
+        url = f"http://127.0.0.1:{port}/{URL_PATH}"
+
+        async def deliver(update: Update, secret: str = SECRET):
+            await asyncio.sleep(rtt / 2)  # Telegram -> bot
+            await http.fetch(url, method='POST', body=json.dumps(update.to_dict()),
+                             headers={'Content-Type': 'application/json',
+                                      'X-Telegram-Bot-Api-Secret-Token': secret})
+
+        try:
+            await deliver(make_update(10 ** 9, 1, 'forged'), secret='wrong')
+            rejected = False
+        except HTTPClientError as e:
+            rejected = e.code == 403
+    else:
+        await application.updater.start_polling(timeout=10)
+
+        async def deliver(update: Update):
+            await bot.pending.put(update)
+
+    # Poisson arrivals at `rate` updates per second
+    rng = random.Random(7)
+    tasks = []
+    for update_id in range(1, updates + 1):
+        await asyncio.sleep(rng.expovariate(rate))
+        update = make_update(update_id, update_id % 50 + 1, 'ping')
+        created[update_id] = time.perf_counter()
+        tasks.append(asyncio.create_task(deliver(update)))
+
+    await asyncio.gather(*tasks)
+    await asyncio.wait_for(done.wait(), 30)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+
+    latencies.sort()
+    result = {
+        'mode': mode,
+        'updates': updates,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p90_ms': latencies[int(len(latencies) * 0.9)] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'max_ms': latencies[-1] * 1000,
+    }
+    if rejected is not None:
+        result['wrong_secret_rejected'] = rejected
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook vs polling latency benchmark')
+    parser.add_argument('--updates', type=int, default=200, help='Updates per mode')
+    parser.add_argument('--rate', type=float, default=20.0, help='Mean arrival rate (updates/s)')
+    parser.add_argument('--rtt', type=float, default=0.1, help='Simulated round trip to Telegram (s)')
+    parser.add_argument('--port', type=int, default=8765, help='Local webhook port')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    print(f"{args.updates} updates at {args.rate}/s, rtt {args.rtt * 1000:.0f} ms")
+    results = []
+    for mode in ('polling', 'webhook'):
+        result = asyncio.run(run_mode(mode, args.updates, args.rate, args.rtt, args.port))
+        results.append(result)
+        extra = (f"  wrong secret rejected: {result['wrong_secret_rejected']}"
+                 if 'wrong_secret_rejected' in result else "")
+        print(f"  {mode:<8} p50 {result['p50_ms']:6.1f} ms  p90 {result['p90_ms']:6.1f} ms  "
+              f"p99 {result['p99_ms']:6.1f} ms  max {result['max_ms']:6.1f} ms{extra}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
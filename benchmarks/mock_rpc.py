@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Local mock JSON-RPC chain
+Serves the VaultResolver, ERC20 and Multicall3 calls the bot makes from
+synthetic or recorded fixtures, with configurable latency and error injection
+
+One server answers every chain at http://127.0.0.1:<port>/<chain>.
+
+Fixture format (JSON, one object per chain key):
+    {"eth": {
+        "tokens":    {"0x…": ["MOCK", 18]},
+        "vaults":    [{"address": "0x…", "supply_token": "0x…", "borrow_token": "0x…",
+                       "collateral_factor": 9000, "liquidation_threshold": 9300,
+                       "oracle_price": 3000000000000000000}],
+        "positions": [{"nftId": 1, "owner": "0x…", "vault": 0, "supply": …, "borrow": …,
+                       "liquidated": false}]
+    }}
+
+Usage:
+    python benchmarks/mock_rpc.py [--port 8547] [--addresses 1000] [--latency 0.02]
+                                  [--error-rate 0.01] [--fixture recorded.json]
+                                  [--save-fixture synthetic.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from eth_abi import decode, encode
+from web3 import Web3
+
+from chain_config import CHAINS, get_all_chains
+from fluid_client_multichain import KNOWN_TOKENS
+
+RESOLVER_ABI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                                 'FluidVaultResolver.json')
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# Share of addresses holding positions, per chain (synthetic fixtures)
+DEFAULT_ACTIVE_FRACTION = {'eth': 0.2, 'base': 0.1, 'arbitrum': 0.05, 'polygon': 0.02, 'plasma': 0.01}
+
+# Seconds per block reported by eth_blockNumber
+MOCK_BLOCK_TIME = 1.0
+
+
+def _selector(signature: str) -> str:
+    """4-byte selector as 0x-prefixed hex"""
+    return '0x' + bytes(Web3.keccak(text=signature)[:4]).hex()
+
+
+def _abi_type(component: Dict) -> str:
+    """Canonical type string of an ABI input/output (tuples expanded)"""
+    if component['type'].startswith('tuple'):
+        inner = ','.join(_abi_type(c) for c in component['components'])
+        return f"({inner}){component['type'][5:]}"
+    return component['type']
+
+
+def _default(component: Dict):
+    """Zero value for an ABI component (tuples as mutable lists)"""
+    kind = component['type']
+    if kind.endswith(']'):
+        return []
+    if kind == 'tuple':
+        return [_default(c) for c in component['components']]
+    if kind == 'address':
+        return ZERO_ADDRESS
+    if kind == 'bool':
+        return False
+    if kind.startswith('bytes'):
+        return b'\0' * int(kind[5:] or 0)
+    return 0
+
+
+def _freeze(value):
+    """Turn nested lists back into tuples for encoding"""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def address_for(index: int, seed: int = 0) -> str:
+    """Deterministic checksum address for a synthetic wallet"""
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).hexdigest()[:40]
+    return Web3.to_checksum_address('0x' + digest)
+
+
+def synthetic_fixture(addresses: int, seed: int = 0,
+                      active_fraction: Optional[Dict[str, float]] = None) -> Dict:
+    """
+    Build fixtures for every chain over the same wallet set
+
+    Wallets address_for(0..addresses-1) hold 1-3 positions with the given
+    probability per chain; health factors range from safe to just above
+    liquidation. One vault uses a token outside KNOWN_TOKENS so ERC20
+    lookups are exercised.
+    """
+    active_fraction = active_fraction or DEFAULT_ACTIVE_FRACTION
+    known = {symbol: address for address, (symbol, _) in KNOWN_TOKENS.items()}
+    mock_token = address_for(10 ** 9, seed)
+
+    # (supply symbol, borrow symbol, price of supply in borrow units, decimals)
+    markets = [
+        ('wstETH', 'USDC', 3600.0, 18, 6),
+        ('ETH', 'USDC', 3000.0, 18, 6),
+        ('WETH', 'USDT', 3000.0, 18, 6),
+        ('MOCK', 'USDC', 2.5, 18, 6),
+    ]
+
+    fixture = {}
+    for c, chain in enumerate(get_all_chains()):
+        rng = random.Random(f"{seed}:{chain}")
+        vaults = []
+        for v, (supply, borrow, price, supply_dec, borrow_dec) in enumerate(markets):
+            vaults.append({
+                'address': address_for(10 ** 8 + c * 100 + v, seed),
+                'supply_token': mock_token if supply == 'MOCK' else known[supply],
+                'borrow_token': known[borrow],
+                'collateral_factor': 9000,
+                'liquidation_threshold': 9300,
+                'oracle_price': int(price * 10 ** 27 * 10 ** borrow_dec / 10 ** supply_dec),
+                'price': price, 'supply_decimals': supply_dec, 'borrow_decimals': borrow_dec,
+            })
+
+        positions = []
+        fraction = active_fraction.get(chain, 0.0)
+        for i in range(addresses):
+            if rng.random() >= fraction:
+                continue
+            owner = address_for(i, seed)
+            for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                v = rng.randrange(len(vaults))
+                vault = vaults[v]
+                supply = rng.uniform(0.5, 50.0)
+                # Ratio as a share of the liquidation threshold: mostly safe, a few close
+                ratio = rng.choice((0.3, 0.5, 0.7, 0.85, 0.95)) * 0.93
+                borrow = supply * vault['price'] * ratio
+                positions.append({
+                    'nftId': c * 10 ** 7 + len(positions) + 1,
+                    'owner': owner,
+                    'vault': v,
+                    'supply': int(supply * 10 ** vault['supply_decimals']),
+                    'borrow': int(borrow * 10 ** vault['borrow_decimals']),
+                    'liquidated': False,
+                })
+
+        fixture[chain] = {
+            'tokens': {mock_token: ['MOCK', 18]},
+            'vaults': vaults,
+            'positions': positions,
+        }
+    return fixture
+
+
+class MockChain:
+    """Answers eth_call for one chain from a fixture"""
+
+    def __init__(self, chain: str, fixture: Dict, resolver_abi: List[Dict]):
+        """
+        Initialize chain state
+
+        Args:
+            chain: Chain key
+            fixture: Tokens, vaults and positions for this chain
+            resolver_abi: VaultResolver ABI (output layouts)
+        """
+        self.chain = chain
+        self.chain_id = CHAINS[chain]['chain_id']
+        self.tokens = {a.lower(): tuple(t) for a, t in fixture.get('tokens', {}).items()}
+        self.vaults = fixture['vaults']
+        self.positions = {p['nftId']: p for p in fixture['positions']}
+        self.by_owner: Dict[str, List[int]] = {}
+        for p in fixture['positions']:
+            self.by_owner.setdefault(p['owner'].lower(), []).append(p['nftId'])
+
+        outputs = next(f['outputs'] for f in resolver_abi if f.get('name') == 'positionByNftId')
+        self._user_component, self._vault_component = outputs
+        self.user_type = _abi_type(self._user_component)
+        self.vault_type = _abi_type(self._vault_component)
+        self._vault_values = [self._vault_tuple(v) for v in self.vaults]
+        self._responses: Dict[str, bytes] = {}  # call data -> encoded result (fixtures are static)
+        self._lock = threading.Lock()
+
+        self.handlers = {
+            _selector('positionByNftId(uint256)'): self._position_by_nft_id,
+            _selector('positionsByUser(address)'): self._positions_by_user,
+            _selector('positionsNftIdOfUser(address)'): self._positions_nft_id_of_user,
+            _selector('aggregate3((address,bool,bytes)[])'): self._aggregate3,
+        }
+        self.erc20 = {
+            _selector('symbol()'): lambda info: encode(['string'], [info[0]]),
+            _selector('decimals()'): lambda info: encode(['uint8'], [info[1]]),
+        }
+
+    def _vault_tuple(self, vault: Dict) -> tuple:
+        """VaultEntireData with the fields the client reads filled in"""
+        data = _default(self._vault_component)
+        data[0] = Web3.to_checksum_address(vault['address'])
+        data[3][8] = [Web3.to_checksum_address(vault['supply_token']), ZERO_ADDRESS]
+        data[3][9] = [Web3.to_checksum_address(vault['borrow_token']), ZERO_ADDRESS]
+        data[4][2] = vault['collateral_factor']
+        data[4][3] = vault['liquidation_threshold']
+        data[4][9] = vault['oracle_price']
+        data[4][10] = vault['oracle_price']
+        return _freeze(data)
+
+    def _user_tuple(self, position: Dict) -> tuple:
+        """UserPosition for a fixture position"""
+        data = _default(self._user_component)
+        data[0] = position['nftId']
+        data[1] = Web3.to_checksum_address(position['owner'])
+        data[2] = bool(position.get('liquidated'))
+        data[9] = position['supply']
+        data[10] = position['borrow']
+        return _freeze(data)
+
+    def _position_by_nft_id(self, args: bytes) -> bytes:
+        (nft_id,) = decode(['uint256'], args)
+        position = self.positions.get(nft_id)
+        if position is None:
+            raise ValueError("execution reverted")
+        return encode([self.user_type, self.vault_type],
+                      [self._user_tuple(position), self._vault_values[position['vault']]])
+
+    def _positions_by_user(self, args: bytes) -> bytes:
+        (owner,) = decode(['address'], args)
+        positions = [self.positions[n] for n in self.by_owner.get(owner.lower(), [])]
+        return encode([f"{self.user_type}[]", f"{self.vault_type}[]"],
+                      [[self._user_tuple(p) for p in positions],
+                       [self._vault_values[p['vault']] for p in positions]])
+
+    def _positions_nft_id_of_user(self, args: bytes) -> bytes:
+        (owner,) = decode(['address'], args)
+        return encode(['uint256[]'], [self.by_owner.get(owner.lower(), [])])
+
+    def _aggregate3(self, args: bytes) -> bytes:
+        (calls,) = decode(['(address,bool,bytes)[]'], args)
+        results = []
+        for target, allow_failure, data in calls:
+            try:
+                results.append((True, self.call(target, '0x' + data.hex())))
+            except ValueError:
+                if not allow_failure:
+                    raise
+                results.append((False, b''))
+        return encode(['(bool,bytes)[]'], [results])
+
+    def call(self, to: str, data: str) -> bytes:
+        """
+        Execute an eth_call
+
+        Raises:
+            ValueError: For unknown calls (reported as a revert)
+        """
+        selector, args = data[:10], bytes.fromhex(data[10:])
+        token = self.tokens.get(to.lower()) or KNOWN_TOKENS.get(to.lower())
+        if token is not None and selector in self.erc20:
+            return self.erc20[selector](token)
+
+        handler = self.handlers.get(selector)
+        if handler is None:
+            raise ValueError("execution reverted")
+
+        with self._lock:
+            cached = self._responses.get(data)
+        if cached is None:
+            cached = handler(args)
+            with self._lock:
+                self._responses[data] = cached
+        return cached
+
+
+class MockRpcServer:
+    """Threaded HTTP JSON-RPC server for all chains"""
+
+    def __init__(self, fixture: Dict, port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        """
+        Initialize server (call start() to serve)
+
+        Args:
+            fixture: {chain: chain fixture}
+            port: TCP port (0 = any free port)
+            latency: Seconds added to every HTTP request
+            jitter: Extra random latency, uniform in [0, jitter]
+            error_rate: Share of requests failing (HTTP 429 or a JSON-RPC error)
+            seed: Seed for jitter and error injection
+        """
+        with open(RESOLVER_ABI_PATH) as f:
+            resolver_abi = json.load(f)
+        self.chains = {chain: MockChain(chain, data, resolver_abi) for chain, data in fixture.items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.started = time.time()
+        self.stats = {'requests': 0, 'calls': 0, 'errors_injected': 0}
+        self.methods: Dict[str, int] = {}  # JSON-RPC method -> requests
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def url(self, chain: str) -> str:
+        """Endpoint for one chain"""
+        return f"http://127.0.0.1:{self.port}/{chain}"
+
+    def environ(self) -> Dict[str, str]:
+        """RPC_URL_<CHAIN> variables pointing every chain at this server"""
+        return {f"RPC_URL_{chain.upper()}": self.url(chain) for chain in self.chains}
+
+    def start(self) -> 'MockRpcServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-rpc', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _dispatch(self, chain: MockChain, request: Dict) -> Dict:
+        """Answer one JSON-RPC request"""
+        method = request.get('method')
+        params = request.get('params') or []
+        with self._stats_lock:
+            self.methods[method] = self.methods.get(method, 0) + 1
+        reply = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            if method == 'eth_chainId':
+                reply['result'] = hex(chain.chain_id)
+            elif method == 'net_version':
+                reply['result'] = str(chain.chain_id)
+            elif method == 'eth_blockNumber':
+                reply['result'] = hex(int((time.time() - self.started) / MOCK_BLOCK_TIME) + 1)
+            elif method == 'eth_call':
+                self._count('calls')
+                reply['result'] = '0x' + chain.call(params[0]['to'], params[0]['data']).hex()
+            else:
+                reply['error'] = {'code': -32601, 'message': f"Method {method} not supported"}
+        except ValueError as e:
+            reply['error'] = {'code': 3, 'message': str(e), 'data': '0x'}
+        return reply
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like a real provider
+            disable_nagle_algorithm = True  # Otherwise delayed ACKs add ~40 ms per call
+            wbufsize = -1  # Headers and body in one write
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                server._count('requests')
+
+                delay = server.latency + (server.rng.uniform(0, server.jitter) if server.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+
+                chain = server.chains.get(self.path.strip('/'))
+                if chain is None:
+                    self._send(404, b'{"error": "unknown chain"}')
+                    return
+
+                request = json.loads(body)
+                if server.error_rate and server.rng.random() < server.error_rate:
+                    server._count('errors_injected')
+                    if server.rng.random() < 0.5:
+                        self._send(429, b'{"error": "Too Many Requests"}')
+                        return
+                    requests = request if isinstance(request, list) else [request]
+                    replies = [{'jsonrpc': '2.0', 'id': r.get('id'),
+                                'error': {'code': -32000, 'message': 'injected failure'}}
+                               for r in requests]
+                    self._send(200, json.dumps(replies if isinstance(request, list) else replies[0]).encode())
+                    return
+
+                if isinstance(request, list):
+                    reply = [server._dispatch(chain, r) for r in request]
+                else:
+                    reply = server._dispatch(chain, request)
+                self._send(200, json.dumps(reply).encode())
+
+        return Handler
+
+
+def load_fixture(path: str) -> Dict:
+    """Load a recorded fixture file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock JSON-RPC chain')
+    parser.add_argument('--port', type=int, default=8547, help='TCP port')
+    parser.add_argument('--addresses', type=int, default=1000, help='Synthetic wallets')
+    parser.add_argument('--seed', type=int, default=0, help='Fixture and injection seed')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added per request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of failing requests')
+    parser.add_argument('--fixture', help='Recorded fixture JSON instead of synthetic data')
+    parser.add_argument('--save-fixture', help='Write the fixture in use to this file')
+    args = parser.parse_args()
+
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(args.addresses, args.seed)
+    if args.save_fixture:
+        with open(args.save_fixture, 'w') as f:
+            json.dump(fixture, f)
+
+    server = MockRpcServer(fixture, args.port, args.latency, args.jitter, args.error_rate, args.seed)
+    print(f"Mock RPC on port {server.port}: "
+          + ", ".join(f"{c} ({len(m.positions)} positions)" for c, m in server.chains.items()))
+    for name, value in server.environ().items():
+        print(f"  export {name}={value}")
+
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,32 +6,68 @@ Supports: ETH, BASE, ARBITRUM, PLASMA, POLYGON
 """
 
 import os
+import time
 import logging
 import asyncio
+import html
+import signal
+import secrets
+import collections
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from telegram import Update, Bot
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from telegram.error import BadRequest
+from telegram.request import HTTPXRequest
+from telegram.ext import (Application, CallbackQueryHandler, CommandHandler, MessageHandler,
+                          filters, ContextTypes)
 from fluid_client_multichain import MultiChainFluidClient
-from rate_limiter import RateLimiter
-from chain_config import get_all_chains, get_chain_name
+from rate_limiter import RateLimiter, CLEANUP_BATCH
+from chain_config import get_all_chains, get_chain_name, get_cache_ttl
 from database import Database
 from monitor import PositionMonitor
+from async_storage import AsyncProxy, get_executor, stop_executor
+from storage import StorageBackend, get_backend, DEFAULT_DB_PATH
+from stress import parse_shock, LEVEL_LIQUIDATION, LEVEL_CRITICAL
+from scheduler import CycleScheduler, summarize as summarize_scheduler
+from message_stream import ThrottledEditor
+from message_packer import (pack, summary_line, refresh_markup, parse_position_button,
+                            split_text, EXPAND_PREFIX, REFRESH_PREFIX)
+from bulk_monitor import parse_args, parse_csv, MAX_BULK_ADDRESSES, MAX_CSV_BYTES
+from portfolio import summarize, format_portfolio
+from rpc_budget import get_budget
+from profiling import span, get_spans, format_spans, ProfileSession, DEFAULT_TOP_N
+from log_config import setup_logging, get_log_stats
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Configuration
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '8560001067:AAGN272A94m9_xCN-SLS-j_WP9mQJ4MkP6w')
 QUERIES_PER_DAY = 10
+DB_PATH = os.environ.get('DB_PATH', DEFAULT_DB_PATH)  # ':memory:' for a throwaway in-memory store
+COMPACTION_INTERVAL = 3600  # Query log compaction period (seconds)
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', '32'))  # Updates handled at once
+MAX_QUEUED_PER_USER = 20  # Updates a user can have waiting before new ones are dropped
+
+# Update delivery: 'polling' (default) or 'webhook'
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').lower()
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL')  # Public HTTPS base URL Telegram posts to
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.environ.get('PORT', '8443'))  # PaaS platforms set PORT
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', 'telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')  # Random per start if unset
+
+# Telegram user IDs allowed to use /perf (comma-separated)
+ADMIN_USER_IDS = {int(i) for i in os.environ.get('ADMIN_USER_IDS', '').replace(' ', '').split(',') if i}
 
 # Global clients
 fluid_client = None
 rate_limiter = None
 database = None
 monitor = None
+user_queues = {}  # user_id -> deque of (handler, update, context) waiting behind the running one
+profile_session = ProfileSession()
 
 
 def get_fluid_client():
@@ -42,11 +78,16 @@ def get_fluid_client():
     return fluid_client
 
 
+def get_storage() -> StorageBackend:
+    """Get the storage backend shared by the database and rate limiter"""
+    return get_backend(DB_PATH)
+
+
 def get_rate_limiter():
     """Get or create rate limiter"""
     global rate_limiter
     if rate_limiter is None:
-        rate_limiter = RateLimiter(queries_per_day=QUERIES_PER_DAY)
+        rate_limiter = RateLimiter(queries_per_day=QUERIES_PER_DAY, storage=get_storage())
     return rate_limiter
 
 
@@ -54,10 +95,72 @@ def get_database():
     """Get or create database"""
     global database
     if database is None:
-        database = Database()
+        database = Database(storage=get_storage())
     return database
 
 
+def get_async_rate_limiter() -> AsyncProxy:
+    """Get rate limiter whose calls run on the storage thread"""
+    return AsyncProxy(get_rate_limiter(), get_executor())
+
+
+def get_async_database() -> AsyncProxy:
+    """Get database whose calls run on the storage thread"""
+    return AsyncProxy(get_database(), get_executor())
+
+
+def serialized_per_user(handler):
+    """
+    Run a handler for at most one update per user at a time
+    
+    Updates are processed concurrently, but each user's updates still run in
+    arrival order. An update arriving while the user has one running is
+    queued and returns at once, freeing its concurrent_updates slot; the
+    running update works through the queue afterwards, so a user never
+    holds more than one slot and cannot starve everyone else.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if user is None:
+            return await handler(update, context)
+        
+        pending = user_queues.get(user.id)
+        if pending is not None:
+            if len(pending) >= MAX_QUEUED_PER_USER:
+                logger.warning("Dropping update %s: user %s has %s queued", update.update_id, user.id, len(pending))
+                return
+            pending.append((handler, update, context))
+            return
+        
+        pending = user_queues[user.id] = collections.deque()
+        try:
+            with span(f"handler.{handler.__name__}"):
+                return await handler(update, context)
+        finally:
+            try:
+                while pending:
+                    queued_handler, queued_update, queued_context = pending.popleft()
+                    try:
+                        with span(f"handler.{queued_handler.__name__}"):
+                            await queued_handler(queued_update, queued_context)
+                    except Exception as e:
+                        # Its own process_update already returned: report it here
+                        await context.application.process_error(queued_update, e)
+            finally:
+                del user_queues[user.id]
+    
+    return wrapper
+
+
+class TimedRequest(HTTPXRequest):
+    """HTTPX request that records a span per Telegram Bot API method"""
+    
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
 def create_risk_bar(ratio: float, liquidation_threshold: float) -> str:
     """Create visual risk progress bar"""
     usage_percent = (ratio / liquidation_threshold) * 100
@@ -130,6 +233,11 @@ def format_position(pos: dict, chain_name: str = None, show_alerts: bool = False
     
     chain_info = f"\n🔗 Chain: {chain_name}" if chain_name else ""
     
+    # Served from cache because the shared RPC budget was used up
+    if pos.get('stale'):
+        fetched = datetime.fromtimestamp(pos['fetched_at'], tz=timezone.utc).strftime('%H:%M UTC')
+        alert_text += f"\n⏳ _Cached data from {fetched} (RPC busy, try again shortly)_"
+    
     msg = f"""
 📊 *Position #{pos['nftId']}*
 ━━━━━━━━━━━━━━━━━━━━━
@@ -178,9 +286,11 @@ I help you monitor lending positions on Fluid Protocol across multiple chains.
 • /help - Show help
 • /stats - View your query statistics
 • /chains - List supported chains
-• /monitor - Monitor an address for alerts
-• /unmonitor - Stop monitoring an address
+• /monitor - Monitor addresses for alerts (or upload a CSV)
+• /unmonitor - Stop monitoring an address (or `all`)
 • /mymonitors - View your monitored addresses
+• /stress - Simulate a price move on your monitored positions
+• /portfolio - Cross-chain risk summary for an address
 
 *Rate Limit:*
 ⏱️ You have 10 queries per day
@@ -215,15 +325,15 @@ The bot automatically searches across all chains when you send a query.
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show user statistics"""
     user_id = update.effective_user.id
-    limiter = get_rate_limiter()
+    limiter = get_async_rate_limiter()
     
-    stats = limiter.get_user_stats(user_id)
+    stats = await limiter.get_user_stats(user_id)
     
     msg = f"""
 📊 *Your Query Statistics*
 
 *Today (24h):*
-   Queries Used: {stats.get('queries_24h', 0)}/{QUERIES_PER_DAY}
+   Queries Used: {stats.get('queries_24h', 0):g}/{QUERIES_PER_DAY}
    Remaining: {stats.get('remaining_today', QUERIES_PER_DAY)}
 
 *This Week (7d):*
@@ -243,11 +353,16 @@ async def monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = """
 📡 *Monitor Address*
 
-Usage: `/monitor <address> [alert_threshold] [critical_threshold]`
+Usage: `/monitor <address> [more addresses] [alert_threshold] [critical_threshold]`
 
 *Examples:*
 • `/monitor 0x1247...6cfC`
 • `/monitor 0x1247...6cfC 1.15 1.05`
+• `/monitor 0x1247...6cfC 0x8f3a...91b2 1.2`
+
+*Bulk import:*
+Upload a `.csv` file with rows of `address,alert,critical`
+(thresholds optional, up to {max} addresses).
 
 *Default Thresholds:*
 • Alert (🟠): HF < 1.15
@@ -257,24 +372,32 @@ Usage: `/monitor <address> [alert_threshold] [critical_threshold]`
 1. Bot checks your positions every 30 minutes
 2. Sends Telegram alert if HF drops below threshold
 3. One alert per hour per position (no spam)
-"""
+""".replace('{max}', str(MAX_BULK_ADDRESSES))
         await update.message.reply_text(msg, parse_mode='Markdown')
         return
     
-    address = context.args[0]
-    alert_threshold = float(context.args[1]) if len(context.args) > 1 else 1.15
-    critical_threshold = float(context.args[2]) if len(context.args) > 2 else 1.05
+    try:
+        entries, invalid = parse_args(context.args)
+    except ValueError:
+        await update.message.reply_text("❌ Thresholds must be numbers, e.g. `/monitor 0x1247... 1.15 1.05`",
+                                        parse_mode='Markdown')
+        return
     
-    # Validate address
-    if not address.startswith('0x') or len(address) != 42:
-        await update.message.reply_text("❌ Invalid address format")
+    if len(entries) != 1 or invalid:
+        await add_monitors(update, entries, invalid)
         return
     
+    address, alert_threshold, critical_threshold = entries[0]
+    
     # Add to database
-    db = get_database()
-    success = db.add_monitored_address(user_id, address, alert_threshold, critical_threshold)
+    db = get_async_database()
+    success = await db.add_monitored_address(user_id, address, alert_threshold, critical_threshold)
     
     if success:
+        # Re-probe every chain for this address on the next cycle
+        if monitor is not None:
+            monitor.presence.mark_activity(address)
+        
         msg = f"""
 ✅ *Monitoring Started*
 
@@ -292,6 +415,106 @@ Use `/mymonitors` to view all monitored addresses.
         await update.message.reply_text("❌ Failed to add monitoring")
 
 
+async def add_monitors(update: Update, entries: list, invalid: list):
+    """
+    Add many monitors in one transaction and report which addresses have positions
+    
+    Each chain is probed once per batch of addresses with a multicall, and the
+    result seeds the monitor's chain presence cache.
+    """
+    user_id = update.effective_user.id
+    
+    if not entries:
+        msg = "❌ No valid addresses found"
+        if invalid:
+            msg += f" ({len(invalid)} invalid)"
+        await update.message.reply_text(msg)
+        return
+    
+    if len(entries) > MAX_BULK_ADDRESSES:
+        await update.message.reply_text(
+            f"❌ At most {MAX_BULK_ADDRESSES} addresses per import ({len(entries)} given)"
+        )
+        return
+    
+    loading_msg = await update.message.reply_text(f"📡 Adding {len(entries)} address(es)...")
+    
+    db = get_async_database()
+    added = await db.add_monitored_addresses(user_id, entries)
+    if not added:
+        await loading_msg.edit_text("❌ Failed to add monitoring")
+        return
+    
+    addresses = [address for address, _, _ in entries]
+    client = get_fluid_client()
+    
+    async def probe(chain: str):
+        try:
+            return chain, await asyncio.to_thread(client.count_user_positions, addresses, chain)
+        except Exception as e:
+            logger.warning("Failed to probe %s address(es) on %s: %s", len(addresses), chain, e)
+            return chain, None
+    
+    found = {}  # address -> {chain: positions}
+    unavailable = []
+    for chain, counts in await asyncio.gather(*(probe(chain) for chain in get_all_chains())):
+        if counts is None:
+            unavailable.append(chain)
+            continue
+        for address in addresses:
+            count = counts.get(address.lower())
+            if count is None:
+                continue
+            if count:
+                found.setdefault(address, {})[chain] = count
+            if monitor is not None:
+                monitor.presence.record(address, chain, bool(count))
+    
+    lines = [f"✅ *Monitoring {added} address(es)*", ""]
+    with_positions = [a for a in addresses if a in found]
+    without_positions = [a for a in addresses if a not in found]
+    
+    if with_positions:
+        lines.append(f"*With positions ({len(with_positions)}):*")
+        for address in with_positions:
+            chains = ", ".join(f"{n} on {get_chain_name(c)}" for c, n in found[address].items())
+            lines.append(f"• `{address[:10]}...{address[-8:]}`: {chains}")
+    if without_positions:
+        lines.append(f"\n*No positions yet ({len(without_positions)}):*")
+        lines.extend(f"• `{address[:10]}...{address[-8:]}`" for address in without_positions)
+    if invalid:
+        lines.append(f"\n❌ *Skipped, invalid ({len(invalid)}):*")
+        lines.extend(f"• `{text[:42].replace('`', '')}`" for text in invalid)
+    if unavailable:
+        lines.append(f"\n⚠️ Could not check: {', '.join(get_chain_name(c) for c in unavailable)}")
+    lines.append("\nUse `/mymonitors` to review thresholds.")
+    
+    chunks = split_text("\n".join(lines))
+    await loading_msg.edit_text(chunks[0], parse_mode='Markdown')
+    for chunk in chunks[1:]:
+        await update.message.reply_text(chunk, parse_mode='Markdown')
+
+
+async def monitor_csv(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bulk /monitor from an uploaded CSV of address[,alert,critical] rows"""
+    document = update.message.document
+    
+    if document.file_size and document.file_size > MAX_CSV_BYTES:
+        await update.message.reply_text(f"❌ CSV too large (max {MAX_CSV_BYTES // 1024} KB)")
+        return
+    
+    try:
+        file = await document.get_file()
+        data = await file.download_as_bytearray()
+    except Exception as e:
+        logger.error("Failed to download CSV: %s", e)
+        await update.message.reply_text("❌ Could not read the file")
+        return
+    
+    entries, invalid = parse_csv(bytes(data))
+    await add_monitors(update, entries, invalid)
+
+
 async def unmonitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /unmonitor command"""
     user_id = update.effective_user.id
@@ -300,10 +523,11 @@ async def unmonitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = """
 🔕 *Stop Monitoring*
 
-Usage: `/unmonitor <address>`
+Usage: `/unmonitor <address>` or `/unmonitor all`
 
-*Example:*
+*Examples:*
 • `/unmonitor 0x1247...6cfC`
+• `/unmonitor all`
 
 Use `/mymonitors` to see your monitored addresses.
 """
@@ -311,10 +535,18 @@ Use `/mymonitors` to see your monitored addresses.
         return
     
     address = context.args[0]
+    db = get_async_database()
+    
+    if address.lower() == 'all':
+        removed = await db.remove_all_monitored_addresses(user_id)
+        await update.message.reply_text(
+            f"✅ Stopped monitoring {removed} address(es)" if removed
+            else "You are not monitoring any addresses."
+        )
+        return
     
     # Remove from database
-    db = get_database()
-    success = db.remove_monitored_address(user_id, address)
+    success = await db.remove_monitored_address(user_id, address)
     
     if success:
         msg = f"""
@@ -332,9 +564,9 @@ You will no longer receive alerts for this address.
 async def mymonitors_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /mymonitors command"""
     user_id = update.effective_user.id
-    db = get_database()
+    db = get_async_database()
     
-    monitored = db.get_monitored_addresses(user_id)
+    monitored = await db.get_monitored_addresses(user_id)
     
     if not monitored:
         msg = """
@@ -362,12 +594,71 @@ Use `/monitor <address>` to start monitoring.
     await update.message.reply_text(msg, parse_mode='Markdown')
 
 
-async def check_rate_limit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Check if user has exceeded rate limit"""
+async def stress_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stress command"""
+    user_id = update.effective_user.id
+    
+    if len(context.args) < 2:
+        msg = """
+🧪 *Price Shock Stress Test*
+
+Usage: `/stress <token> <pct>`
+
+*Examples:*
+• `/stress ETH -20`
+• `/stress wstETH -15%`
+• `/stress USDC 5`
+
+Simulates the price move on all your monitored positions
+using cached data (does not count against your query limit).
+"""
+        await update.message.reply_text(msg, parse_mode='Markdown')
+        return
+    
+    try:
+        token, pct = parse_shock(context.args[0], context.args[1])
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Invalid stress test: {e}")
+        return
+    
+    if monitor is None or not len(monitor.position_book):
+        await update.message.reply_text(
+            "⏳ No cached positions yet. Monitored positions are cached after the first check cycle."
+        )
+        return
+    
+    results = monitor.position_book.stress({token: pct}).get(user_id, [])
+    
+    if not results:
+        await update.message.reply_text(
+            f"🟢 *{token} {pct:+.1f}%*: none of your monitored positions would cross a threshold.",
+            parse_mode='Markdown'
+        )
+        return
+    
+    msg = f"🧪 *Stress Test: {token} {pct:+.1f}%*\n\n"
+    for r in results:
+        if r['level'] == LEVEL_LIQUIDATION:
+            emoji = "💀"
+        elif r['level'] == LEVEL_CRITICAL:
+            emoji = "🔴"
+        else:
+            emoji = "🟠"
+        msg += (
+            f"{emoji} #{r['nftId']} ({get_chain_name(r['chain'])}) "
+            f"{r['supply_token']}/{r['borrow_token']}\n"
+            f"   HF {r['health_factor']:.4f} → {r['stressed_health_factor']:.4f} ({r['level']})\n"
+        )
+    
+    await update.message.reply_text(msg, parse_mode='Markdown')
+
+
+async def check_rate_limit(update: Update, query_type: str, query_value: str) -> bool:
+    """Take one query from the user's daily limit, replying if it is used up"""
     user_id = update.effective_user.id
-    limiter = get_rate_limiter()
     
-    is_allowed, used, remaining = limiter.check_rate_limit(user_id)
+    # In-memory check + record; the row is written behind on the storage thread
+    is_allowed, used, remaining = get_rate_limiter().try_acquire(user_id, query_type, query_value)
     
     if not is_allowed:
         msg = f"""
@@ -394,70 +685,316 @@ Daily at the same time you made your first query.
 async def query_position(update: Update, position_id: str):
     """Query a position across all chains"""
     try:
-        if not await check_rate_limit(update, None):
+        if not await check_rate_limit(update, 'position', position_id):
             return
         
         loading_msg = await update.message.reply_text("🔍 Searching across all chains...")
         
         client = get_fluid_client()
-        limiter = get_rate_limiter()
         
-        results = client.search_position_across_chains(position_id)
+        # Blocking RPC calls run on a worker thread so other updates keep flowing
+        results = await asyncio.to_thread(client.search_position_across_chains, position_id)
         
         if not results:
+            # Nothing found does not count against the limit
+            get_rate_limiter().refund(update.effective_user.id, 'position', position_id)
             await loading_msg.edit_text(f"❌ Position #{position_id} not found on any chain")
             return
         
-        # Record query
-        limiter.record_query(update.effective_user.id, 'position', position_id)
-        
         # Send results
         await loading_msg.delete()
         for pos, chain_name in results:
             msg = format_position(pos, chain_name)
-            await update.message.reply_text(msg, parse_mode='Markdown')
+            await update.message.reply_text(msg, parse_mode='Markdown',
+                                            reply_markup=refresh_markup(pos['chain'], pos['nftId']))
             
     except Exception as e:
-        logger.error(f"Failed to query position: {e}")
+        logger.error("Failed to query position: %s", e)
         await update.message.reply_text(f"❌ Query failed: {str(e)}")
 
 
+def chain_status_rows(status: dict, positions: dict) -> list:
+    """Packer rows: per-chain progress in chain order, with one row per position found"""
+    rows = []
+    for chain, (state, count) in status.items():
+        name = get_chain_name(chain)
+        if state == 'pending':
+            rows.append((f"⏳ {name}", chain, None))
+        elif state == 'found':
+            rows.append((f"\n✅ {name}: {count} position(s)", chain, None))
+            rows.extend((summary_line(pos), chain, pos['nftId']) for pos in positions[chain])
+        elif state == 'empty':
+            rows.append((f"➖ {name}: none", chain, None))
+        else:
+            rows.append((f"⚠️ {name}: unavailable", chain, None))
+    return rows
+
+
 async def query_address(update: Update, address: str):
-    """Query address across all chains"""
+    """
+    Query address across all chains
+    
+    Results stream into the loading message as each chain answers, as a
+    compact table packed into as few messages as possible. Tap a position's
+    button for the full card.
+    """
     try:
-        if not await check_rate_limit(update, None):
+        if not await check_rate_limit(update, 'address', address):
             return
         
-        loading_msg = await update.message.reply_text("🔍 Searching across all chains...")
-        
         client = get_fluid_client()
-        limiter = get_rate_limiter()
+        chains = get_all_chains()
+        status = {chain: ('pending', 0) for chain in chains}
+        positions = {}
         
-        results = client.search_address_across_chains(address)
+        messages = pack("🔍 Searching across all chains...\n", chain_status_rows(status, positions))
+        loading_msg = await update.message.reply_text(messages[0][0])
+        editor = ThrottledEditor(loading_msg)
         
-        if not results:
-            await loading_msg.edit_text(f"❌ No positions found for this address on any chain")
-            return
+        async def fetch(chain: str):
+            try:
+                found, chain_name = await asyncio.to_thread(
+                    client.get_user_positions, address, chain, raise_errors=True
+                )
+                return chain, found, None
+            except Exception as e:
+                return chain, [], e
         
-        # Record query
-        limiter.record_query(update.effective_user.id, 'address', address)
+        # Chains answer in whatever order they finish; show each as it lands
+        total = 0
+        for next_done in asyncio.as_completed([fetch(chain) for chain in chains]):
+            chain, found, error = await next_done
+            
+            if error is not None:
+                logger.warning("Failed to get positions for %s on %s: %s", address, chain, error)
+                status[chain] = ('error', 0)
+            else:
+                status[chain] = ('found' if found else 'empty', len(found))
+                positions[chain] = found
+                # Share what we learned with the monitor's chain presence cache
+                if monitor is not None and not any(p.get('stale') for p in found):
+                    monitor.presence.record(address, chain, bool(found))
+            total += len(found)
+            
+            # Only the first message is live-updated; overflow is sent at the end
+            messages = pack("🔍 Searching across all chains...\n", chain_status_rows(status, positions))
+            await editor.update(*messages[0])
+        
+        if not total:
+            get_rate_limiter().refund(update.effective_user.id, 'address', address)
+            await editor.update("❌ No positions found for this address on any chain")
+            await editor.flush()
+            return
         
-        # Send overview
-        total_positions = sum(len(positions) for positions, _ in results)
-        overview = f"📋 Found {total_positions} position(s) across {len(results)} chain(s)\n\n"
-        await loading_msg.edit_text(overview)
+        chains_found = sum(1 for state, _ in status.values() if state == 'found')
+        header = f"📋 Found {total} position(s) across {chains_found} chain(s)\nTap a position for details\n"
+        messages = pack(header, chain_status_rows(status, positions))
         
-        # Send each position
-        for positions, chain_name in results:
-            for pos in positions:
-                msg = format_position(pos, chain_name, show_alerts=True)
-                await update.message.reply_text(msg, parse_mode='Markdown')
+        await editor.update(*messages[0])
+        await editor.flush()
+        for text, reply_markup in messages[1:]:
+            await update.message.reply_text(text, reply_markup=reply_markup)
             
     except Exception as e:
-        logger.error(f"Failed to query address: {e}")
+        logger.error("Failed to query address: %s", e)
         await update.message.reply_text(f"❌ Query failed: {str(e)}")
 
 
+async def expand_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the full card for a position from a summary table button"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    chain, position_id = parse_position_button(query.data)
+    
+    # The table was just built from these positions: no RPC call needed
+    client = get_fluid_client()
+    pos = client.get_cached_position(position_id, chain)
+    if pos is None:
+        # Evicted since (or an old table): a fetch is charged like a refresh
+        limiter = get_rate_limiter()
+        is_allowed, _, _ = limiter.try_acquire(user_id, 'refresh', f"{chain}:{position_id}")
+        if not is_allowed:
+            await query.answer(f"Daily limit of {QUERIES_PER_DAY} queries reached", show_alert=True)
+            return
+        pos, _ = await asyncio.to_thread(client.get_position_by_id, position_id, chain)
+        if pos is None:
+            limiter.refund(user_id, 'refresh', f"{chain}:{position_id}")
+    
+    if pos is None:
+        await query.answer("Position not found", show_alert=True)
+        return
+    
+    await query.answer()
+    await query.message.reply_text(format_position(pos, get_chain_name(chain), show_alerts=True),
+                                   parse_mode='Markdown', reply_markup=refresh_markup(chain, position_id))
+
+
+async def refresh_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Re-fetch one position on its known chain and update its card in place"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    chain, position_id = parse_position_button(query.data)
+    
+    # A refresh is one call on one chain, so it uses a fraction of a query
+    limiter = get_rate_limiter()
+    is_allowed, _, _ = limiter.try_acquire(user_id, 'refresh', f"{chain}:{position_id}")
+    if not is_allowed:
+        await query.answer(f"Daily limit of {QUERIES_PER_DAY} queries reached", show_alert=True)
+        return
+    
+    # Within one block the cached copy is as fresh as a new call
+    client = get_fluid_client()
+    pos, chain_name = await asyncio.to_thread(
+        client.get_position_by_id, position_id, chain, max_age=get_cache_ttl(chain)
+    )
+    if pos is None:
+        limiter.refund(user_id, 'refresh', f"{chain}:{position_id}")
+        await query.answer("Position not found", show_alert=True)
+        return
+    
+    fetched = datetime.fromtimestamp(pos.get('fetched_at', time.time()), tz=timezone.utc)
+    msg = format_position(pos, chain_name, show_alerts=True)
+    msg += f"🔄 Updated {fetched.strftime('%H:%M:%S')} UTC"
+    
+    await query.answer()
+    try:
+        await query.edit_message_text(msg, parse_mode='Markdown',
+                                      reply_markup=refresh_markup(chain, position_id))
+    except BadRequest as e:
+        # "Message is not modified": refreshed twice within the same second
+        logger.debug("Refresh of #%s left the message unchanged: %s", position_id, e)
+
+
+async def portfolio_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Handle /portfolio command
+    
+    One message with totals, weighted HF, worst position and token exposure
+    across chains. Chains recently confirmed empty for the address are
+    skipped and lists fetched within the last block are reused.
+    """
+    if not context.args:
+        msg = """
+💼 *Portfolio Summary*
+
+Usage: `/portfolio <address>`
+
+*Example:*
+• `/portfolio 0x1247739ac8e238D21574D18dEAce064675546cfC`
+
+Shows collateral, debt and debt-weighted health factor per debt
+token, your worst position and exposure per token across all chains.
+"""
+        await update.message.reply_text(msg, parse_mode='Markdown')
+        return
+    
+    address = context.args[0].strip()
+    if not address.startswith('0x') or len(address) != 42:
+        await update.message.reply_text("❌ Invalid address format")
+        return
+    
+    try:
+        if not await check_rate_limit(update, 'portfolio', address):
+            return
+        
+        loading_msg = await update.message.reply_text("💼 Building portfolio...")
+        
+        client = get_fluid_client()
+        chains = monitor.presence.chains_to_check(address) if monitor is not None else get_all_chains()
+        
+        async def fetch(chain: str):
+            try:
+                found, _ = await asyncio.to_thread(
+                    client.get_user_positions, address, chain,
+                    raise_errors=True, max_age=get_cache_ttl(chain)
+                )
+                return chain, found, None
+            except Exception as e:
+                return chain, [], e
+        
+        positions = []
+        unavailable = []
+        for chain, found, error in await asyncio.gather(*(fetch(chain) for chain in chains)):
+            if error is not None:
+                logger.warning("Failed to get positions for %s on %s: %s", address, chain, error)
+                unavailable.append(chain)
+                continue
+            positions.extend(found)
+            if monitor is not None and not any(p.get('stale') for p in found):
+                monitor.presence.record(address, chain, bool(found))
+        
+        if not positions:
+            get_rate_limiter().refund(update.effective_user.id, 'portfolio', address)
+            msg = "❌ No positions found for this address on any chain"
+            if unavailable:
+                msg += f"\n⚠️ Unavailable: {', '.join(get_chain_name(c) for c in unavailable)}"
+            await loading_msg.edit_text(msg)
+            return
+        
+        stale = any(p.get('stale') for p in positions)
+        await loading_msg.edit_text(format_portfolio(address, summarize(positions), unavailable, stale),
+                                    parse_mode='Markdown')
+        
+    except Exception as e:
+        logger.error("Failed to build portfolio: %s", e)
+        await update.message.reply_text(f"❌ Query failed: {str(e)}")
+
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Admin-only profiling control
+    
+    /perf                             span percentiles, RPC budget, monitor cycles and log counters
+    /perf reset                       clear span statistics
+    /perf cprofile start|stop [N]     event-loop cProfile, top N by cumulative time
+    /perf tracemalloc start|stop [N]  allocation growth, top N lines
+    
+    Reports are also written to PROFILE_DIR.
+    """
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        return
+    
+    args = [a.lower() for a in context.args]
+    top_n = int(args[2]) if len(args) > 2 and args[2].isdigit() else DEFAULT_TOP_N
+    
+    if not args:
+        lines = [format_spans(get_spans().report()), ""]
+        for chain, b in get_budget().snapshot().items():
+            lines.append(f"{chain:<10} {b['tokens']:>7.0f}/{b['capacity']:.0f} CU  "
+                         f"spent {b['spent']:.0f}  denied {b['denied']:.0f}")
+        if monitor is not None:
+            lines.append(f"\nmonitor: {summarize_scheduler(monitor.scheduler.metrics)}")
+        logs = get_log_stats()
+        lines.append(f"\nlogs: {logs['passed']} written, {logs['suppressed']} sampled out, "
+                     f"{logs['dropped']} dropped, {logs['queued']} queued")
+        text = "\n".join(lines)
+    elif args == ['reset']:
+        get_spans().reset()
+        text = "Span statistics cleared"
+    elif len(args) >= 2 and args[0] in ('cprofile', 'tracemalloc') and args[1] in ('start', 'stop'):
+        kind, action = args[0], args[1]
+        if action == 'start':
+            started = getattr(profile_session, f"start_{kind}")()
+            text = f"{kind} started" if started else f"{kind} already running"
+        elif kind == 'cprofile':
+            # cProfile hooks the thread that enabled it: disable it here on the
+            # event loop, then write the report off it
+            stopped = profile_session.disable_cprofile()
+            if stopped is None:
+                text = "cprofile not running"
+            else:
+                path, summary = await asyncio.to_thread(profile_session.write_cprofile, *stopped, top_n)
+                text = f"Written to {path}\n\n{summary}"
+        else:
+            result = await asyncio.to_thread(profile_session.stop_tracemalloc, top_n)
+            text = f"{kind} not running" if result is None else f"Written to {result[0]}\n\n{result[1]}"
+    else:
+        text = ("Usage: /perf [reset | cprofile start|stop [N] | tracemalloc start|stop [N]]")
+    
+    for chunk in split_text(text, 4000):
+        await update.message.reply_text(f"<pre>{html.escape(chunk)}</pre>", parse_mode='HTML')
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle regular messages"""
     text = update.message.text.strip()
@@ -488,31 +1025,134 @@ async def start_monitor_task(application: Application):
     asyncio.create_task(monitor.start_monitoring())
 
 
-def main():
-    """Start the bot"""
-    logger.info("Starting Fluid Position Monitor Bot...")
+async def compact_query_log(deadline: float) -> int:
+    """Delete raw query rows already counted in the daily rollups and fold old rollups"""
+    limiter = get_async_rate_limiter()
+    await limiter.fold_old_rollups()
+    
+    total = 0
+    while True:
+        # Each batch is its own storage call, so other queries run in between
+        deleted = await limiter.cleanup_old_records()
+        total += deleted
+        if deleted < CLEANUP_BATCH:
+            break
+    
+    if total:
+        logger.info("Compacted %s query records", total)
+    return 0
+
+
+async def start_background_tasks(application: Application):
+    """Start the position monitor and the query log compaction job"""
+    # One worker thread per concurrent update for blocking RPC calls (asyncio.to_thread)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPDATES, thread_name_prefix='rpc')
+    )
+    
+    await start_monitor_task(application)
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    compaction = CycleScheduler(COMPACTION_INTERVAL, compact_query_log, name='query-log-compaction')
+    asyncio.create_task(compaction.run())
     
+    # SIGUSR1 toggles cProfile, SIGUSR2 toggles tracemalloc (reports go to PROFILE_DIR)
+    loop = asyncio.get_running_loop()
+    for name, toggle in (('SIGUSR1', profile_session.toggle_cprofile),
+                         ('SIGUSR2', profile_session.toggle_tracemalloc)):
+        try:
+            loop.add_signal_handler(getattr(signal, name), toggle)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            logger.debug("%s profiling toggle not available on this platform", name)
+
+
+async def stop_storage(application: Application):
+    """Flush pending storage writes on shutdown"""
+    logger.info("Flushing storage queue...")
+    await asyncio.to_thread(stop_executor)
+
+
+def add_handlers(application: Application):
+    """Register every command, button and message handler"""
     # Add command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("chains", chains_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("monitor", monitor_command))
-    application.add_handler(CommandHandler("unmonitor", unmonitor_command))
-    application.add_handler(CommandHandler("mymonitors", mymonitors_command))
+    application.add_handler(CommandHandler("start", serialized_per_user(start)))
+    application.add_handler(CommandHandler("help", serialized_per_user(help_command)))
+    application.add_handler(CommandHandler("chains", serialized_per_user(chains_command)))
+    application.add_handler(CommandHandler("stats", serialized_per_user(stats_command)))
+    application.add_handler(CommandHandler("monitor", serialized_per_user(monitor_command)))
+    application.add_handler(CommandHandler("unmonitor", serialized_per_user(unmonitor_command)))
+    application.add_handler(CommandHandler("mymonitors", serialized_per_user(mymonitors_command)))
+    application.add_handler(CommandHandler("stress", serialized_per_user(stress_command)))
+    application.add_handler(CommandHandler("portfolio", serialized_per_user(portfolio_command)))
+    application.add_handler(CommandHandler("perf", perf_command))
+    
+    # Add button handlers
+    application.add_handler(CallbackQueryHandler(serialized_per_user(expand_callback),
+                                                 pattern=f"^{EXPAND_PREFIX}:"))
+    application.add_handler(CallbackQueryHandler(serialized_per_user(refresh_callback),
+                                                 pattern=f"^{REFRESH_PREFIX}:"))
     
     # Add message handler
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(MessageHandler(filters.Document.FileExtension("csv"),
+                                           serialized_per_user(monitor_csv)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,
+                                           serialized_per_user(handle_message)))
+
+
+def main():
+    """Start the bot"""
+    # Log through a background writer thread (LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_LIMIT)
+    setup_logging()
+    logger.info("Starting Fluid Position Monitor Bot...")
+    
+    # Handle updates concurrently; handlers serialize per user. Bot API calls
+    # are timed per method (pool size as PTB's default)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(MAX_CONCURRENT_UPDATES)
+        .request(TimedRequest(connection_pool_size=256))
+        .build()
+    )
+    
+    add_handlers(application)
     
     logger.info("Bot started and waiting for messages...")
     logger.info("Position monitor will start shortly...")
     
     # Start monitor task after event loop is running
-    application.post_init = start_monitor_task
+    application.post_init = start_background_tasks
+    application.post_shutdown = stop_storage
+    
+    if BOT_MODE == 'webhook':
+        run_webhook(application)
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+def run_webhook(application: Application):
+    """
+    Serve updates from Telegram on an embedded HTTP server
+    
+    Telegram sends every request with the secret token header; requests
+    without it are rejected with 403. SIGINT/SIGTERM stop the server,
+    finish in-flight updates and run post_shutdown.
+    """
+    if not WEBHOOK_URL:
+        raise SystemExit("BOT_MODE=webhook requires WEBHOOK_URL (public https base URL)")
+    
+    secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    webhook_url = f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}"
+    logger.info("Webhook mode: listening on %s:%s/%s, registered as %s",
+                WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, webhook_url)
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=webhook_url,
+        secret_token=secret_token,
+        allowed_updates=Update.ALL_TYPES,
+    )
 
 
 if __name__ == '__main__':
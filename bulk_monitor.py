@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Bulk monitor import
+Parses and validates address lists from /monitor arguments or an uploaded CSV
+"""
+
+import csv
+import io
+from typing import List, Optional, Tuple
+
+from web3 import Web3
+
+# Default health factor thresholds for new monitors
+DEFAULT_ALERT_THRESHOLD = 1.15
+DEFAULT_CRITICAL_THRESHOLD = 1.05
+
+# Most addresses accepted in one import
+MAX_BULK_ADDRESSES = 200
+
+# Largest CSV upload accepted (bytes)
+MAX_CSV_BYTES = 64 * 1024
+
+# (checksum address, alert_threshold, critical_threshold)
+Entry = Tuple[str, float, float]
+
+
+def validate_address(text: str) -> Optional[str]:
+    """
+    Checksum an address
+
+    All-lowercase and all-uppercase hex is accepted; mixed case must carry
+    a valid EIP-55 checksum (a typo in a checksummed address is rejected).
+
+    Returns:
+        Checksum address, or None if invalid
+    """
+    text = text.strip()
+    if not text.lower().startswith('0x') or not Web3.is_address(text):
+        return None
+    digits = text[2:]
+    if digits != digits.lower() and digits != digits.upper() and not Web3.is_checksum_address(text):
+        return None
+    return Web3.to_checksum_address(text)
+
+
+def _add(entries: List[Entry], invalid: List[str], seen: set, text: str,
+         alert: float, critical: float):
+    """Validate one address and append it unless seen before"""
+    address = validate_address(text)
+    if address is None:
+        invalid.append(text)
+    elif address not in seen:
+        seen.add(address)
+        entries.append((address, alert, critical))
+
+
+def parse_args(args: List[str]) -> Tuple[List[Entry], List[str]]:
+    """
+    Parse /monitor arguments: addresses, then optional thresholds for all
+
+    Addresses may be separated by spaces, commas or newlines, e.g.
+    `/monitor 0xabc… 0xdef… 1.2 1.05`.
+
+    Returns:
+        (entries, invalid) where invalid holds the rejected inputs
+
+    Raises:
+        ValueError: If a threshold is not a number
+    """
+    tokens = [t for arg in args for t in arg.replace(',', ' ').split()]
+    addresses = [t for t in tokens if t.lower().startswith('0x')]
+    numbers = [t for t in tokens if not t.lower().startswith('0x')]
+
+    alert = float(numbers[0]) if len(numbers) > 0 else DEFAULT_ALERT_THRESHOLD
+    critical = float(numbers[1]) if len(numbers) > 1 else DEFAULT_CRITICAL_THRESHOLD
+
+    entries, invalid, seen = [], [], set()
+    for text in addresses:
+        _add(entries, invalid, seen, text, alert, critical)
+    invalid.extend(numbers[2:])
+    return entries, invalid
+
+
+def parse_csv(data: bytes) -> Tuple[List[Entry], List[str]]:
+    """
+    Parse a CSV of address[,alert_threshold[,critical_threshold]] rows
+
+    A header row and blank lines are skipped; missing thresholds use the
+    defaults.
+
+    Returns:
+        (entries, invalid) where invalid holds the rejected rows' first cell
+    """
+    text = data.decode('utf-8-sig', errors='replace')
+    entries, invalid, seen = [], [], set()
+
+    for i, row in enumerate(csv.reader(io.StringIO(text))):
+        cells = [c.strip() for c in row]
+        if not cells or not cells[0]:
+            continue
+        if i == 0 and not cells[0].lower().startswith('0x'):
+            continue  # Header
+
+        try:
+            alert = float(cells[1]) if len(cells) > 1 and cells[1] else DEFAULT_ALERT_THRESHOLD
+            critical = float(cells[2]) if len(cells) > 2 and cells[2] else DEFAULT_CRITICAL_THRESHOLD
+        except ValueError:
+            invalid.append(cells[0])
+            continue
+        _add(entries, invalid, seen, cells[0], alert, critical)
+
+    return entries, invalid
+
+
+if __name__ == '__main__':
+    sample = (b"address,alert,critical\n"
+              b"0x1247739ac8e238D21574D18dEAce064675546cfC,1.2,1.1\n"
+              b"0x1247739ac8e238d21574d18deace064675546cfc\n"
+              b"0x1247739AC8e238D21574D18dEAce064675546cfC\n"
+              b"not-an-address\n")
+    entries, invalid = parse_csv(sample)
+    print(f"Valid: {entries}")
+    print(f"Invalid: {invalid}")
@@ -2,8 +2,38 @@
 """
 Multi-chain configuration for Fluid Protocol
 Supports: ETH, BASE, ARBITRUM, PLASMA, POLYGON
+
+Each chain carries its own performance tuning (DEFAULT_TUNING); settings
+can be overridden or chains added from a JSON file and the environment,
+see load_chain_config().
 """
 
+import json
+import os
+
+# Per-chain performance knobs and their defaults
+DEFAULT_TUNING = {
+    'max_concurrency': 16,    # RPC requests in flight to the chain at once
+    'multicall_batch': 100,   # Addresses per Multicall3 eth_call
+    'timeout': 10.0,          # HTTP timeout per RPC request (s)
+    'cache_ttl': None,        # Serve cached lookups younger than this (s); None: one block
+    'cu_per_second': 60.0,    # RPC budget refill rate (compute units per second)
+}
+
+# Types of numeric settings, for validating overrides
+SETTING_TYPES = {
+    'chain_id': int,
+    'block_time': float,
+    'max_concurrency': int,
+    'multicall_batch': int,
+    'timeout': float,
+    'cache_ttl': float,
+    'cu_per_second': float,
+}
+
+# Fields a chain added from a config file must define
+REQUIRED_FIELDS = ('name', 'chain_id', 'rpc_url', 'vault_resolver', 'explorer', 'block_time')
+
 # Chain configurations
 CHAINS = {
     'eth': {
@@ -12,6 +42,8 @@ CHAINS = {
         'rpc_url': 'https://eth-mainnet.g.alchemy.com/v2/2-zA_FKx0g4_IltX8wwnu',
         'vault_resolver': '0x394Ce45678e0019c0045194a561E2bEd0FCc6Cf0',
         'explorer': 'https://etherscan.io',
+        'block_time': 12.0,
+        **DEFAULT_TUNING,
     },
     'base': {
         'name': 'Base',
@@ -19,6 +51,8 @@ CHAINS = {
         'rpc_url': 'https://base-mainnet.g.alchemy.com/v2/2-zA_FKx0g4_IltX8wwnu',
         'vault_resolver': '0x394Ce45678e0019c0045194a561E2bEd0FCc6Cf0',
         'explorer': 'https://basescan.org',
+        'block_time': 2.0,
+        **DEFAULT_TUNING,
     },
     'arbitrum': {
         'name': 'Arbitrum',
@@ -26,6 +60,9 @@ CHAINS = {
         'rpc_url': 'https://arb-mainnet.g.alchemy.com/v2/2-zA_FKx0g4_IltX8wwnu',
         'vault_resolver': '0x394Ce45678e0019c0045194a561E2bEd0FCc6Cf0',
         'explorer': 'https://arbiscan.io',
+        'block_time': 0.25,
+        **DEFAULT_TUNING,
+        'cache_ttl': 1.0,  # Four blocks: per-block freshness would defeat the cache
     },
     'polygon': {
         'name': 'Polygon',
@@ -33,6 +70,8 @@ CHAINS = {
         'rpc_url': 'https://polygon-mainnet.g.alchemy.com/v2/2-zA_FKx0g4_IltX8wwnu',
         'vault_resolver': '0x394Ce45678e0019c0045194a561E2bEd0FCc6Cf0',
         'explorer': 'https://polygonscan.com',
+        'block_time': 2.0,
+        **DEFAULT_TUNING,
     },
     'plasma': {
         'name': 'Plasma',
@@ -40,6 +79,8 @@ CHAINS = {
         'rpc_url': 'https://plasma-mainnet.g.alchemy.com/v2/2-zA_FKx0g4_IltX8wwnu',
         'vault_resolver': '0x394Ce45678e0019c0045194a561E2bEd0FCc6Cf0',
         'explorer': 'https://explorer.plasma.org',
+        'block_time': 1.0,
+        **DEFAULT_TUNING,
     },
 }
 
@@ -60,6 +101,87 @@ CHAIN_ALIASES = {
 # Default chain
 DEFAULT_CHAIN = 'eth'
 
+# Any accepted identifier (key, alias, chain ID as text) -> chain key
+_LOOKUP = {}
+
+
+def _build_lookup():
+    """Precompute identifier -> chain key for get_chain_config"""
+    lookup = {}
+    for chain_key, config in CHAINS.items():
+        lookup[str(config['chain_id'])] = chain_key
+    for alias, chain_key in CHAIN_ALIASES.items():
+        lookup[alias] = chain_key
+    for chain_key in CHAINS:
+        lookup[chain_key] = chain_key
+    _LOOKUP.clear()
+    _LOOKUP.update(lookup)
+
+
+def _coerce(chain_key: str, field: str, value):
+    """Validate one setting from a file or the environment"""
+    kind = SETTING_TYPES.get(field)
+    if kind is None or value is None:
+        return value
+    try:
+        value = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{chain_key}.{field} must be a number, got {value!r}")
+    if value <= 0:
+        raise ValueError(f"{chain_key}.{field} must be positive, got {value!r}")
+    return value
+
+
+def load_chain_config(path: str = None, environ: dict = None):
+    """
+    Apply chain settings from a JSON file and the environment
+    
+    The file maps chain keys to settings; unknown keys add a chain (which
+    must define REQUIRED_FIELDS) and an 'aliases' list adds lookup names:
+    
+        {"eth": {"max_concurrency": 16, "cu_per_second": 300},
+         "optimism": {"name": "Optimism", "chain_id": 10, ..., "aliases": ["op"]}}
+    
+    Environment variables CHAIN_<KEY>_<SETTING> (e.g. CHAIN_ETH_TIMEOUT=5)
+    override single settings after the file. RPC_URL_<CHAIN> is read by
+    get_rpc_url() on every call instead.
+    
+    Args:
+        path: JSON file (default: $CHAIN_CONFIG, if set)
+        environ: Environment to read (default: os.environ)
+    
+    Raises:
+        ValueError: If a setting is invalid or a new chain is incomplete
+    """
+    environ = os.environ if environ is None else environ
+    path = path or environ.get('CHAIN_CONFIG')
+    
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        for chain_key, settings in overrides.items():
+            chain_key = chain_key.lower()
+            settings = dict(settings)
+            aliases = settings.pop('aliases', [])
+            if chain_key not in CHAINS:
+                missing = [field for field in REQUIRED_FIELDS if field not in settings]
+                if missing:
+                    raise ValueError(f"New chain {chain_key} in {path} is missing {', '.join(missing)}")
+                CHAINS[chain_key] = dict(DEFAULT_TUNING)
+            for field, value in settings.items():
+                CHAINS[chain_key][field] = _coerce(chain_key, field, value)
+            for alias in aliases:
+                CHAIN_ALIASES[alias.lower()] = chain_key
+    
+    for chain_key, config in CHAINS.items():
+        prefix = f"CHAIN_{chain_key.upper()}_"
+        for field in SETTING_TYPES:
+            value = environ.get(prefix + field.upper())
+            if value is not None:
+                config[field] = _coerce(chain_key, field, value)
+    
+    _build_lookup()
+
 
 def get_chain_config(chain_identifier: str) -> dict:
     """
@@ -71,29 +193,20 @@ def get_chain_config(chain_identifier: str) -> dict:
     Returns:
         Chain configuration dictionary
     """
-    # Normalize input
-    identifier = str(chain_identifier).lower().strip()
+    # Internal callers pass chain keys: one dict lookup
+    config = CHAINS.get(chain_identifier)
+    if config is not None:
+        return config
     
-    # Try direct match
-    if identifier in CHAINS:
-        return CHAINS[identifier]
-    
-    # Try alias
-    if identifier in CHAIN_ALIASES:
-        chain_key = CHAIN_ALIASES[identifier]
-        return CHAINS[chain_key]
-    
-    # Try chain ID
-    try:
-        chain_id = int(identifier)
-        for chain_key, config in CHAINS.items():
-            if config['chain_id'] == chain_id:
-                return config
-    except ValueError:
-        pass
-    
-    # Default to ETH
-    return CHAINS[DEFAULT_CHAIN]
+    # Name, alias or chain ID from user input; unknown defaults to ETH
+    return CHAINS[get_chain_key(chain_identifier)]
+
+
+def get_chain_key(chain_identifier) -> str:
+    """Resolve a chain name, alias or chain ID to its key (DEFAULT_CHAIN if unknown)"""
+    if chain_identifier in CHAINS:
+        return chain_identifier
+    return _LOOKUP.get(str(chain_identifier).lower().strip(), DEFAULT_CHAIN)
 
 
 def get_all_chains() -> list:
@@ -108,9 +221,14 @@ def get_chain_name(chain_identifier: str) -> str:
 
 
 def get_rpc_url(chain_identifier: str) -> str:
-    """Get RPC URL for a chain"""
-    config = get_chain_config(chain_identifier)
-    return config['rpc_url']
+    """
+    Get RPC URL for a chain
+    
+    RPC_URL_<CHAIN> in the environment (e.g. RPC_URL_ETH) overrides the
+    configured endpoint, for a private node or a local mock.
+    """
+    chain_key = get_chain_key(chain_identifier)
+    return os.environ.get(f"RPC_URL_{chain_key.upper()}", CHAINS[chain_key]['rpc_url'])
 
 
 def get_vault_resolver(chain_identifier: str) -> str:
@@ -119,6 +237,39 @@ def get_vault_resolver(chain_identifier: str) -> str:
     return config['vault_resolver']
 
 
+def get_block_time(chain_identifier: str) -> float:
+    """Get average block time for a chain (seconds)"""
+    config = get_chain_config(chain_identifier)
+    return config['block_time']
+
+
+def get_max_concurrency(chain_identifier: str) -> int:
+    """Get the number of RPC requests allowed in flight to a chain"""
+    return get_chain_config(chain_identifier)['max_concurrency']
+
+
+def get_multicall_batch(chain_identifier: str) -> int:
+    """Get addresses per Multicall3 call on a chain"""
+    return get_chain_config(chain_identifier)['multicall_batch']
+
+
+def get_rpc_timeout(chain_identifier: str) -> float:
+    """Get the HTTP timeout for one RPC request to a chain (seconds)"""
+    return get_chain_config(chain_identifier)['timeout']
+
+
+def get_cache_ttl(chain_identifier: str) -> float:
+    """Get how long a cached lookup may be served on a chain (seconds, default one block)"""
+    config = get_chain_config(chain_identifier)
+    ttl = config['cache_ttl']
+    return config['block_time'] if ttl is None else ttl
+
+
+def get_budget_rates() -> dict:
+    """Get {chain: RPC budget compute units per second} for every chain"""
+    return {chain_key: config['cu_per_second'] for chain_key, config in CHAINS.items()}
+
+
 def get_explorer_url(chain_identifier: str, address: str = None) -> str:
     """Get explorer URL for a chain"""
     config = get_chain_config(chain_identifier)
@@ -129,6 +280,9 @@ def get_explorer_url(chain_identifier: str, address: str = None) -> str:
     return base_url
 
 
+load_chain_config()
+
+
 if __name__ == '__main__':
     # Test configuration
     print("Supported Chains:")
@@ -138,6 +292,9 @@ if __name__ == '__main__':
         print(f"  Chain ID: {config['chain_id']}")
         print(f"  VaultResolver: {config['vault_resolver']}")
         print(f"  Explorer: {config['explorer']}")
+        print(f"  Tuning: block {config['block_time']}s, cache {get_cache_ttl(chain_key)}s, "
+              f"{config['max_concurrency']} in flight, multicall {config['multicall_batch']}, "
+              f"timeout {config['timeout']}s, {config['cu_per_second']} CU/s")
     
     # Test chain lookup
     print("\n\nChain Lookup Tests:")
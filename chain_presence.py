@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Per-address chain presence cache
+Remembers which chains an address has positions on, so the monitor can skip
+chains that were recently confirmed empty
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional
+from chain_config import get_all_chains
+from database import Database
+from async_storage import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Re-probe chains confirmed empty after this long (seconds)
+EMPTY_REPROBE_INTERVAL = 6 * 3600
+
+
+class ChainPresence:
+    """Which chains each address has positions on, backed by the database"""
+
+    def __init__(self, db: Database, reprobe_interval: int = EMPTY_REPROBE_INTERVAL):
+        """
+        Initialize presence cache
+
+        Args:
+            db: Database instance
+            reprobe_interval: Seconds before an empty chain is probed again
+        """
+        self.db = db
+        self.reprobe_interval = reprobe_interval
+        self._presence = {}  # address -> {chain: (has_positions, checked_at)}
+
+        for address, chain, has_positions, checked_at in db.get_chain_presence():
+            self._presence.setdefault(address, {})[chain] = (bool(has_positions), checked_at)
+
+        logger.info("Loaded chain presence for %s address(es)", len(self._presence))
+
+    def chains_to_check(self, address: str, now: Optional[float] = None) -> List[str]:
+        """
+        Get the chains that should be queried for an address this cycle
+
+        Chains with known positions are always checked; chains confirmed empty
+        are only re-probed once reprobe_interval has passed. Chains with no
+        record yet are always probed.
+        """
+        now = now if now is not None else time.time()
+        records = self._presence.get(address.lower(), {})
+        chains = []
+
+        for chain in get_all_chains():
+            record = records.get(chain)
+            if record is None:
+                chains.append(chain)
+                continue
+
+            has_positions, checked_at = record
+            if has_positions or now - checked_at >= self.reprobe_interval:
+                chains.append(chain)
+
+        return chains
+
+    def record(self, address: str, chain: str, has_positions: bool,
+               now: Optional[float] = None):
+        """Record the outcome of a successful query"""
+        now = int(now if now is not None else time.time())
+        address = address.lower()
+        records = self._presence.setdefault(address, {})
+
+        # Only persist state changes and refreshed empty confirmations
+        previous = records.get(chain)
+        records[chain] = (has_positions, now)
+        if previous is None or previous[0] != has_positions or not has_positions:
+            get_executor().defer(self.db.set_chain_presence, address, chain, has_positions, now,
+                                 backend=self.db.storage)
+
+    def mark_activity(self, address: str, chain: Optional[str] = None):
+        """
+        Force a re-probe on the next cycle
+
+        Args:
+            address: Address that showed activity
+            chain: Chain the activity was seen on (None = all chains)
+        """
+        records = self._presence.get(address.lower())
+        if not records:
+            return
+
+        for key in ([chain] if chain else list(records)):
+            if key in records and not records[key][0]:
+                records[key] = (False, 0)
+
+    def summary(self, address: str) -> Dict[str, bool]:
+        """Get {chain: has_positions} for chains with a record"""
+        return {chain: has for chain, (has, _) in self._presence.get(address.lower(), {}).items()}
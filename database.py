@@ -3,10 +3,14 @@
 Database module for storing monitored addresses and alerts
 """
 
-import sqlite3
 import logging
 from typing import List, Tuple, Optional
+import time
 from datetime import datetime
+from storage import StorageBackend, get_backend, DEFAULT_DB_PATH
+from migrations import migrate, DATABASE_MIGRATIONS
+from chain_config import get_all_chains
+from position_history import PositionHistoryStore
 
 logger = logging.getLogger(__name__)
 
@@ -14,234 +18,249 @@ logger = logging.getLogger(__name__)
 class Database:
     """SQLite database for managing monitored addresses and alerts"""
     
-    def __init__(self, db_path: str = 'fluid_bot.db'):
-        """Initialize database"""
-        self.db_path = db_path
+    # Methods that modify the database (batched by async_storage)
+    WRITE_METHODS = frozenset({
+        'add_monitored_address', 'add_monitored_addresses', 'remove_monitored_address',
+        'remove_all_monitored_addresses', 'add_alert', 'add_position_snapshot',
+        'set_chain_presence',
+    })
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, storage: StorageBackend = None):
+        """
+        Initialize database
+        
+        Args:
+            db_path: Path to SQLite database (ignored if storage is given)
+            storage: Storage backend to use (shared with RateLimiter)
+        """
+        self.storage = storage or get_backend(db_path)
+        self.db_path = self.storage.db_path
         self.init_db()
+        self.history = PositionHistoryStore(storage=self.storage)
     
     def init_db(self):
-        """Initialize database tables"""
+        """Initialize database tables (applies pending schema migrations)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Table for monitored addresses
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS monitored_addresses (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    address TEXT NOT NULL,
-                    alert_threshold REAL DEFAULT 1.1,
-                    critical_threshold REAL DEFAULT 1.05,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, address)
-                )
-            ''')
-            
-            # Table for alert history
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS alert_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    position_id INTEGER NOT NULL,
-                    health_factor REAL NOT NULL,
-                    alert_type TEXT NOT NULL,
-                    message TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Table for position snapshots
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS position_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    position_id INTEGER NOT NULL,
-                    owner_address TEXT NOT NULL,
-                    health_factor REAL NOT NULL,
-                    ratio REAL NOT NULL,
-                    supply_usd REAL NOT NULL,
-                    borrow_usd REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Database initialized at {self.db_path}")
+            version = migrate(self.storage, DATABASE_MIGRATIONS)
+            logger.info("Database initialized at %s (schema v%s)", self.db_path, version)
             
         except Exception as e:
-            logger.error(f"Failed to initialize database: {e}")
+            logger.error("Failed to initialize database: %s", e)
     
     def add_monitored_address(self, user_id: int, address: str, 
                              alert_threshold: float = 1.1, 
                              critical_threshold: float = 1.05) -> bool:
         """Add an address to monitor"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO monitored_addresses 
-                (user_id, address, alert_threshold, critical_threshold)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, address.lower(), alert_threshold, critical_threshold))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Added monitored address {address} for user {user_id}")
+                cursor.execute('''
+                    INSERT OR REPLACE INTO monitored_addresses 
+                    (user_id, address, alert_threshold, critical_threshold, created_ts)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, address.lower(), alert_threshold, critical_threshold, int(time.time())))
+            logger.info("Added monitored address %s for user %s", address, user_id)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to add monitored address: {e}")
+            logger.error("Failed to add monitored address: %s", e)
             return False
     
+    def add_monitored_addresses(self, user_id: int,
+                                entries: List[Tuple[str, float, float]]) -> int:
+        """
+        Add many addresses to monitor in one transaction
+        
+        Args:
+            user_id: Telegram user ID
+            entries: (address, alert_threshold, critical_threshold) per address
+        
+        Returns:
+            Number of addresses added or updated (0 on failure)
+        """
+        try:
+            now = int(time.time())
+            with self.storage.transaction() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO monitored_addresses 
+                    (user_id, address, alert_threshold, critical_threshold, created_ts)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(user_id, address.lower(), alert, critical, now)
+                      for address, alert, critical in entries])
+            logger.info("Added %s monitored address(es) for user %s", len(entries), user_id)
+            return len(entries)
+            
+        except Exception as e:
+            logger.error("Failed to add monitored addresses: %s", e)
+            return 0
+    
     def remove_monitored_address(self, user_id: int, address: str) -> bool:
         """Remove an address from monitoring"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('''
-                DELETE FROM monitored_addresses 
-                WHERE user_id = ? AND address = ?
-            ''', (user_id, address.lower()))
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Removed monitored address {address} for user {user_id}")
+                cursor.execute('''
+                    DELETE FROM monitored_addresses 
+                    WHERE user_id = ? AND address = ?
+                ''', (user_id, address.lower()))
+            logger.info("Removed monitored address %s for user %s", address, user_id)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to remove monitored address: {e}")
+            logger.error("Failed to remove monitored address: %s", e)
             return False
     
+    def remove_all_monitored_addresses(self, user_id: int) -> int:
+        """Stop monitoring every address of a user, returning how many were removed"""
+        try:
+            with self.storage.transaction() as conn:
+                cursor = conn.execute('''
+                    DELETE FROM monitored_addresses WHERE user_id = ?
+                ''', (user_id,))
+            logger.info("Removed %s monitored address(es) for user %s", cursor.rowcount, user_id)
+            return cursor.rowcount
+            
+        except Exception as e:
+            logger.error("Failed to remove monitored addresses: %s", e)
+            return 0
+    
     def get_monitored_addresses(self, user_id: int) -> List[Tuple]:
         """Get all monitored addresses for a user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.storage.connection()
             cursor = conn.cursor()
             
             cursor.execute('''
                 SELECT id, address, alert_threshold, critical_threshold 
                 FROM monitored_addresses 
                 WHERE user_id = ?
-                ORDER BY created_at DESC
+                ORDER BY created_ts DESC
             ''', (user_id,))
             
             results = cursor.fetchall()
-            conn.close()
             return results
             
         except Exception as e:
-            logger.error(f"Failed to get monitored addresses: {e}")
+            logger.error("Failed to get monitored addresses: %s", e)
             return []
     
     def get_all_monitored_addresses(self) -> List[Tuple]:
         """Get all monitored addresses across all users"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.storage.connection()
             cursor = conn.cursor()
             
             cursor.execute('''
                 SELECT user_id, address, alert_threshold, critical_threshold 
                 FROM monitored_addresses
-                ORDER BY created_at DESC
+                ORDER BY created_ts DESC
             ''')
             
             results = cursor.fetchall()
-            conn.close()
             return results
             
         except Exception as e:
-            logger.error(f"Failed to get all monitored addresses: {e}")
+            logger.error("Failed to get all monitored addresses: %s", e)
             return []
     
     def add_alert(self, user_id: int, position_id: int, health_factor: float, 
-                  alert_type: str, message: str = None) -> bool:
+                  alert_type: str, message: str = None, chain: str = '') -> bool:
         """Record an alert"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO alert_history 
-                (user_id, position_id, health_factor, alert_type, message)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, position_id, health_factor, alert_type, message))
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
             
-            conn.commit()
-            conn.close()
-            logger.info(f"Alert recorded: user={user_id}, position={position_id}, type={alert_type}")
+                cursor.execute('''
+                    INSERT INTO alert_history 
+                    (user_id, position_id, health_factor, alert_type, message, chain, created_ts)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, position_id, health_factor, alert_type, message, chain, int(time.time())))
+            logger.info("Alert recorded: user=%s, position=%s, type=%s", user_id, position_id, alert_type)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to add alert: {e}")
+            logger.error("Failed to add alert: %s", e)
             return False
     
     def get_recent_alerts(self, user_id: int, hours: int = 24) -> List[Tuple]:
-        """Get recent alerts for a user"""
+        """Get recent alerts for a user as (position_id, hf, type, message, created_ts)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.storage.connection()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT position_id, health_factor, alert_type, message, created_at
+                SELECT position_id, health_factor, alert_type, message, created_ts
                 FROM alert_history
-                WHERE user_id = ? AND created_at > datetime('now', '-' || ? || ' hours')
-                ORDER BY created_at DESC
-            ''', (user_id, hours))
+                WHERE user_id = ? AND created_ts > ?
+                ORDER BY created_ts DESC
+            ''', (user_id, int(time.time()) - hours * 3600))
             
             results = cursor.fetchall()
-            conn.close()
             return results
             
         except Exception as e:
-            logger.error(f"Failed to get recent alerts: {e}")
+            logger.error("Failed to get recent alerts: %s", e)
             return []
     
-    def add_position_snapshot(self, position_id: int, owner_address: str, 
-                             health_factor: float, ratio: float, 
-                             supply_usd: float, borrow_usd: float) -> bool:
-        """Record a position snapshot"""
+    def set_chain_presence(self, address: str, chain: str, 
+                           has_positions: bool, checked_at: int) -> bool:
+        """Record whether an address had positions on a chain"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('''
-                INSERT INTO position_snapshots 
-                (position_id, owner_address, health_factor, ratio, supply_usd, borrow_usd)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (position_id, owner_address.lower(), health_factor, ratio, supply_usd, borrow_usd))
-            
-            conn.commit()
-            conn.close()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO address_chain_presence 
+                    (address, chain, has_positions, checked_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (address.lower(), chain, int(has_positions), checked_at))
             return True
             
         except Exception as e:
-            logger.error(f"Failed to add position snapshot: {e}")
+            logger.error("Failed to set chain presence: %s", e)
             return False
     
-    def get_position_history(self, position_id: int, limit: int = 100) -> List[Tuple]:
-        """Get historical data for a position"""
+    def get_chain_presence(self) -> List[Tuple]:
+        """Get chain presence records for all addresses"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self.storage.connection()
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT health_factor, ratio, supply_usd, borrow_usd, created_at
-                FROM position_snapshots
-                WHERE position_id = ?
-                ORDER BY created_at DESC
-                LIMIT ?
-            ''', (position_id, limit))
+                SELECT address, chain, has_positions, checked_at
+                FROM address_chain_presence
+            ''')
             
             results = cursor.fetchall()
-            conn.close()
             return results
             
         except Exception as e:
-            logger.error(f"Failed to get position history: {e}")
+            logger.error("Failed to get chain presence: %s", e)
             return []
+    
+    def add_position_snapshot(self, position_id: int, owner_address: str, 
+                             health_factor: float, ratio: float, 
+                             supply_usd: float, borrow_usd: float,
+                             chain: str = 'eth') -> bool:
+        """Record a position snapshot"""
+        return self.history.record(
+            chain, position_id, owner_address,
+            health_factor, ratio, supply_usd, borrow_usd
+        )
+    
+    def get_position_history(self, position_id: int, limit: int = 100,
+                             chain: Optional[str] = None) -> List[Tuple]:
+        """Get recent raw snapshots for a position"""
+        # '' holds snapshots migrated from before chains were recorded
+        chains = [chain] if chain else get_all_chains() + ['']
+        rows = self.history.get_history(chains, position_id, limit=limit)
+        return [
+            (last_hf, ratio, supply_usd, borrow_usd,
+             datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'))
+            for ts, _min_hf, _max_hf, last_hf, ratio, supply_usd, borrow_usd in rows
+        ]
 
 
 if __name__ == '__main__':
@@ -7,8 +7,16 @@ Supports: ETH, BASE, ARBITRUM, PLASMA, POLYGON
 from web3 import Web3
 import json
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Optional, Union, Tuple
-from chain_config import get_chain_config, get_rpc_url, get_vault_resolver, get_chain_name
+from chain_config import (get_chain_config, get_rpc_url, get_vault_resolver, get_chain_name,
+                          get_max_concurrency, get_multicall_batch, get_rpc_timeout)
+from rpc_budget import RpcBudget, BudgetExceeded, get_budget, CU_COSTS, PRIORITY_USER
+from rpc_recorder import FixtureStore, RecordingProvider, ReplayProvider
+from profiling import span, timed
 
 logger = logging.getLogger(__name__)
 
@@ -28,36 +36,90 @@ KNOWN_TOKENS = {
     "0xdac17f958d2ee523a2206206994597c13d831ec7": ("USDT", 6),
 }
 
+# Multicall3 is deployed at the same address on every supported chain
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI = [
+    {"inputs": [{"components": [{"name": "target", "type": "address"},
+                                {"name": "allowFailure", "type": "bool"},
+                                {"name": "callData", "type": "bytes"}],
+                 "name": "calls", "type": "tuple[]"}],
+     "name": "aggregate3",
+     "outputs": [{"components": [{"name": "success", "type": "bool"},
+                                 {"name": "returnData", "type": "bytes"}],
+                  "name": "returnData", "type": "tuple[]"}],
+     "stateMutability": "payable", "type": "function"}
+]
+
+# Last good results kept for serving when the RPC budget runs out
+RESULT_CACHE_SIZE = 10000
+
+# Fixture directories for recording RPC traffic or replaying it offline
+RPC_RECORD_DIR = os.environ.get('RPC_RECORD_DIR')
+RPC_REPLAY_DIR = os.environ.get('RPC_REPLAY_DIR')
+
 
 class MultiChainFluidClient:
     """Multi-chain Fluid Protocol data client"""
     
-    def __init__(self, abi_path: str = None):
-        """Initialize multi-chain client"""
+    def __init__(self, abi_path: str = None, budget: RpcBudget = None,
+                 record_dir: str = RPC_RECORD_DIR, replay_dir: str = RPC_REPLAY_DIR):
+        """
+        Initialize multi-chain client
+        
+        Args:
+            abi_path: Path to the VaultResolver ABI (default: bundled file)
+            budget: RPC budget to spend from (default: the shared one)
+            record_dir: Record every RPC exchange to this fixture directory
+            replay_dir: Answer RPC calls from this fixture directory (no network)
+        """
         self.clients = {}
+        self.record_dir = record_dir
+        self.replay_dir = replay_dir
         self._token_cache = {k.lower(): v for k, v in KNOWN_TOKENS.items()}
+        self.budget = budget or get_budget()
+        self._results = OrderedDict()  # (chain, kind, key) -> (result, fetched_at)
+        self._slots = {}  # chain -> semaphore bounding requests in flight
+        self._lock = threading.Lock()  # Calls arrive from worker threads
         
         # Load ABI
         if abi_path:
             with open(abi_path, 'r') as f:
                 self.abi = json.load(f)
         else:
-            import os
             default_abi_path = os.path.join(os.path.dirname(__file__), 'FluidVaultResolver.json')
             with open(default_abi_path, 'r') as f:
                 self.abi = json.load(f)
     
+    def _provider(self, chain: str):
+        """HTTP provider for a chain, or a recording/replaying one"""
+        if self.replay_dir:
+            return ReplayProvider(FixtureStore(self.replay_dir, chain))
+        request_kwargs = {'timeout': get_rpc_timeout(chain)}
+        if self.record_dir:
+            return RecordingProvider(get_rpc_url(chain), FixtureStore(self.record_dir, chain),
+                                     request_kwargs=request_kwargs)
+        return Web3.HTTPProvider(get_rpc_url(chain), request_kwargs=request_kwargs)
+    
+    def _slot(self, chain: str) -> threading.BoundedSemaphore:
+        """Semaphore limiting a chain to its max_concurrency requests in flight"""
+        slot = self._slots.get(chain)
+        if slot is None:
+            with self._lock:
+                slot = self._slots.setdefault(chain, threading.BoundedSemaphore(get_max_concurrency(chain)))
+        return slot
+    
     def _get_client(self, chain: str):
         """Get or create client for a chain"""
         if chain not in self.clients:
             try:
-                rpc_url = get_rpc_url(chain)
-                w3 = Web3(Web3.HTTPProvider(rpc_url))
+                w3 = Web3(self._provider(chain))
                 
                 # Verify connection
                 try:
+                    self.budget.charge(chain, CU_COSTS['eth_blockNumber'])
                     block = w3.eth.block_number
-                    logger.info(f"Connected to {get_chain_name(chain)}, block: {block}")
+                    logger.info("Connected to %s, block: %s", get_chain_name(chain), block)
                 except Exception as e:
                     raise ConnectionError(f"Failed to connect to {get_chain_name(chain)}: {e}")
                 
@@ -67,13 +129,19 @@ class MultiChainFluidClient:
                     abi=self.abi
                 )
                 
+                multicall = w3.eth.contract(
+                    address=w3.to_checksum_address(MULTICALL3_ADDRESS),
+                    abi=MULTICALL3_ABI
+                )
+                
                 self.clients[chain] = {
                     'w3': w3,
                     'resolver': resolver,
+                    'multicall': multicall,
                     'chain_name': get_chain_name(chain),
                 }
             except Exception as e:
-                logger.error(f"Failed to initialize client for {chain}: {e}")
+                logger.error("Failed to initialize client for %s: %s", chain, e)
                 raise
         
         return self.clients[chain]
@@ -97,52 +165,132 @@ class MultiChainFluidClient:
                 address=w3.to_checksum_address(token_address),
                 abi=ERC20_ABI
             )
-            symbol = token.functions.symbol().call()
-            decimals = token.functions.decimals().call()
+            self.budget.charge(chain, 2 * CU_COSTS['eth_call'])
+            with self._slot(chain), span('rpc.erc20'):
+                symbol = token.functions.symbol().call()
+                decimals = token.functions.decimals().call()
             self._token_cache[addr_lower] = (symbol, decimals)
             return symbol, decimals
         except Exception as e:
-            logger.warning(f"Failed to get token info for {token_address} on {chain}: {e}")
+            logger.warning("Failed to get token info for %s on %s: %s", token_address, chain, e)
             return "Unknown", 18
     
-    def get_position_by_id(self, position_id: Union[int, str], chain: str = 'eth') -> Tuple[Optional[Dict], str]:
+    def _remember(self, key: tuple, result):
+        """Keep the latest good result for a lookup"""
+        with self._lock:
+            self._results[key] = (result, time.time())
+            self._results.move_to_end(key)
+            if len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+    
+    def _cached(self, key: tuple) -> Tuple[Optional[object], Optional[float]]:
+        """Get (result, fetched_at) for a lookup, or (None, None)"""
+        with self._lock:
+            return self._results.get(key, (None, None))
+    
+    def get_cached_position(self, position_id: int, chain: str) -> Optional[Dict]:
+        """
+        Get the last fetched copy of a position without any RPC call
+        
+        Returns:
+            Position dict with 'fetched_at' set, or None if never fetched
+        """
+        position, fetched_at = self._cached((chain, 'position', int(position_id)))
+        if position is None:
+            return None
+        return {**position, 'fetched_at': fetched_at}
+    
+    @staticmethod
+    def _mark_stale(position: Dict, fetched_at: float) -> Dict:
+        """Copy of a cached position flagged as stale"""
+        return {**position, 'stale': True, 'fetched_at': fetched_at}
+    
+    def get_position_by_id(self, position_id: Union[int, str], chain: str = 'eth',
+                           priority: int = PRIORITY_USER,
+                           max_age: Optional[float] = None) -> Tuple[Optional[Dict], str]:
         """
         Get position by ID
         
+        Args:
+            position_id: Position NFT ID
+            chain: Chain key
+            priority: RPC budget priority class
+            max_age: Serve a cached copy younger than this many seconds
+                (e.g. one block time) without an RPC call
+        
         Returns:
-            Tuple of (position_data, chain_name)
+            Tuple of (position_data, chain_name). If the RPC budget is used up,
+            the last known position is returned with 'stale': True.
         """
         try:
             position_id = int(str(position_id).strip())
-            logger.info(f"Fetching Position #{position_id} on {get_chain_name(chain)}")
             
+            if max_age is not None:
+                position, fetched_at = self._cached((chain, 'position', position_id))
+                if position is not None and time.time() - fetched_at < max_age:
+                    return {**position, 'fetched_at': fetched_at}, get_chain_name(chain)
+            
+            logger.debug("Fetching Position #%s on %s", position_id, get_chain_name(chain))
+            
+            self.budget.acquire(chain, CU_COSTS['eth_call'], priority)
             client = self._get_client(chain)
-            result = client['resolver'].functions.positionByNftId(position_id).call()
+            with self._slot(chain), span('rpc.positionByNftId'):
+                result = client['resolver'].functions.positionByNftId(position_id).call()
             
             position = self._parse_position_data(result[0], result[1], chain)
             
             if position:
+                self._remember((chain, 'position', position_id), position)
                 return position, client['chain_name']
             return None, client['chain_name']
             
+        except BudgetExceeded as e:
+            logger.warning("RPC budget exhausted, serving cached position #%s: %s", position_id, e)
+            position, fetched_at = self._cached((chain, 'position', position_id))
+            if position:
+                return self._mark_stale(position, fetched_at), get_chain_name(chain)
+            return None, get_chain_name(chain)
+            
         except Exception as e:
-            logger.error(f"Failed to get position #{position_id}: {e}")
+            logger.error("Failed to get position #%s: %s", position_id, e)
             return None, get_chain_name(chain)
     
-    def get_user_positions(self, address: str, chain: str = 'eth') -> Tuple[List[Dict], str]:
+    def get_user_positions(self, address: str, chain: str = 'eth', 
+                           raise_errors: bool = False,
+                           priority: int = PRIORITY_USER,
+                           max_age: Optional[float] = None) -> Tuple[List[Dict], str]:
         """
         Get all positions for a user
         
+        Args:
+            address: Wallet address
+            chain: Chain key
+            raise_errors: Raise on RPC failure instead of returning no positions
+            priority: RPC budget priority class
+            max_age: Serve a cached list younger than this many seconds
+                without an RPC call
+        
         Returns:
-            Tuple of (positions_list, chain_name)
+            Tuple of (positions_list, chain_name). If the RPC budget is used up,
+            the last known positions are returned with 'stale': True; with
+            nothing cached, BudgetExceeded is raised if raise_errors is set.
         """
+        cache_key = (chain, 'user', address.strip().lower())
+        
+        if max_age is not None:
+            positions, fetched_at = self._cached(cache_key)
+            if positions is not None and time.time() - fetched_at < max_age:
+                return positions, get_chain_name(chain)
+        
         try:
+            self.budget.acquire(chain, CU_COSTS['eth_call'], priority)
             client = self._get_client(chain)
             w3 = client['w3']
             address = w3.to_checksum_address(address.strip())
-            logger.info(f"Fetching positions for {address} on {get_chain_name(chain)}")
+            logger.debug("Fetching positions for %s on %s", address, get_chain_name(chain))
             
-            result = client['resolver'].functions.positionsByUser(address).call()
+            with self._slot(chain), span('rpc.positionsByUser'):
+                result = client['resolver'].functions.positionsByUser(address).call()
             
             user_positions = result[0]
             vaults_data = result[1]
@@ -153,14 +301,92 @@ class MultiChainFluidClient:
                 if position:
                     positions.append(position)
             
-            logger.info(f"Found {len(positions)} positions on {get_chain_name(chain)}")
+            logger.debug("Found %s positions on %s", len(positions), get_chain_name(chain))
+            self._remember(cache_key, positions)
+            for position in positions:
+                self._remember((chain, 'position', position['nftId']), position)
             return positions, client['chain_name']
             
+        except BudgetExceeded as e:
+            positions, fetched_at = self._cached(cache_key)
+            if positions is not None:
+                logger.warning("RPC budget exhausted, serving cached positions for %s: %s", address, e)
+                return [self._mark_stale(p, fetched_at) for p in positions], get_chain_name(chain)
+            logger.warning("RPC budget exhausted for %s: %s", address, e)
+            if raise_errors:
+                raise
+            return [], get_chain_name(chain)
+            
         except Exception as e:
-            logger.error(f"Failed to get user positions: {e}")
+            logger.error("Failed to get user positions: %s", e)
+            if raise_errors:
+                raise
             return [], get_chain_name(chain)
     
-    def search_position_across_chains(self, position_id: Union[int, str]) -> List[Tuple[Dict, str]]:
+    def count_user_positions(self, addresses: List[str], chain: str = 'eth',
+                             priority: int = PRIORITY_USER) -> Dict[str, int]:
+        """
+        Count positions of many addresses on one chain
+        
+        Batches positionsNftIdOfUser lookups through Multicall3, one eth_call
+        per multicall_batch addresses (chain_config); falls back to one call per address if
+        the multicall itself fails.
+        
+        Args:
+            addresses: Wallet addresses
+            chain: Chain key
+            priority: RPC budget priority class
+        
+        Returns:
+            {address (lowercase): position count}; addresses whose lookup
+            failed are left out
+        
+        Raises:
+            BudgetExceeded: If the RPC budget runs out
+        """
+        client = self._get_client(chain)
+        w3 = client['w3']
+        resolver = client['resolver']
+        counts = {}
+        batch_size = get_multicall_batch(chain)
+        
+        for start in range(0, len(addresses), batch_size):
+            batch = [w3.to_checksum_address(a.strip()) for a in addresses[start:start + batch_size]]
+            self.budget.acquire(chain, CU_COSTS['eth_call'], priority)
+            
+            try:
+                calls = [
+                    (resolver.address, True,
+                     resolver.encodeABI(fn_name='positionsNftIdOfUser', args=[address]))
+                    for address in batch
+                ]
+                with self._slot(chain), span('rpc.multicall'):
+                    results = client['multicall'].functions.aggregate3(calls).call()
+                for address, (success, data) in zip(batch, results):
+                    if success:
+                        counts[address.lower()] = len(w3.codec.decode(['uint256[]'], data)[0])
+                        
+            except BudgetExceeded:
+                raise
+            except Exception as e:
+                logger.warning("Multicall failed on %s, probing one by one: %s", get_chain_name(chain), e)
+                for address in batch:
+                    try:
+                        self.budget.acquire(chain, CU_COSTS['eth_call'], priority)
+                        with self._slot(chain):
+                            nft_ids = resolver.functions.positionsNftIdOfUser(address).call()
+                        counts[address.lower()] = len(nft_ids)
+                    except BudgetExceeded:
+                        raise
+                    except Exception as e:
+                        logger.debug("Failed to count positions for %s on %s: %s", address, chain, e)
+        
+        logger.info("Counted positions for %s/%s address(es) on %s",
+                    len(counts), len(addresses), get_chain_name(chain))
+        return counts
+    
+    def search_position_across_chains(self, position_id: Union[int, str],
+                                      priority: int = PRIORITY_USER) -> List[Tuple[Dict, str]]:
         """
         Search for a position across all chains
         
@@ -174,15 +400,16 @@ class MultiChainFluidClient:
         
         for chain in get_all_chains():
             try:
-                position, chain_name = self.get_position_by_id(position_id, chain)
+                position, chain_name = self.get_position_by_id(position_id, chain, priority)
                 if position:
                     results.append((position, chain_name))
             except Exception as e:
-                logger.debug(f"Position #{position_id} not found on {chain}: {e}")
+                logger.debug("Position #%s not found on %s: %s", position_id, chain, e)
         
         return results
     
-    def search_address_across_chains(self, address: str) -> List[Tuple[List[Dict], str]]:
+    def search_address_across_chains(self, address: str,
+                                     priority: int = PRIORITY_USER) -> List[Tuple[List[Dict], str]]:
         """
         Search for positions across all chains for an address
         
@@ -195,14 +422,15 @@ class MultiChainFluidClient:
         
         for chain in get_all_chains():
             try:
-                positions, chain_name = self.get_user_positions(address, chain)
+                positions, chain_name = self.get_user_positions(address, chain, priority=priority)
                 if positions:
                     results.append((positions, chain_name))
             except Exception as e:
-                logger.debug(f"Failed to get positions for {address} on {chain}: {e}")
+                logger.debug("Failed to get positions for %s on %s: %s", address, chain, e)
         
         return results
     
+    @timed('parse.position')
     def _parse_position_data(self, user_position: tuple, vault_data: tuple, chain: str) -> Optional[Dict]:
         """Parse position data"""
         try:
@@ -237,6 +465,9 @@ class MultiChainFluidClient:
             supply_usd = supply_value_in_borrow
             borrow_usd = borrow_amount
             
+            # Collateral price in debt token units
+            collateral_price = oracle_price * (10 ** supply_decimals) / (10 ** 27) / (10 ** borrow_decimals)
+            
             # Calculate collateral ratio
             if supply_usd > 0:
                 ratio = (borrow_usd / supply_usd) * 100
@@ -269,12 +500,16 @@ class MultiChainFluidClient:
                 'ratio': ratio,
                 'collateral_factor': collateral_factor / 100,
                 'liquidation_threshold': liquidation_threshold_pct,
+                'oracle_price': collateral_price,
+                'oracle_price_raw': oracle_price,
+                'supply_raw': supply_raw,
+                'borrow_raw': borrow_raw,
                 'is_liquidated': is_liquidated,
                 'chain': chain,
             }
             
         except Exception as e:
-            logger.error(f"Failed to parse position data: {e}")
+            logger.error("Failed to parse position data: %s", e)
             return None
 
 
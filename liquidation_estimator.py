@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Time-to-liquidation estimator
+Tracks health factor drift per position incrementally (no history rescan)
+"""
+
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Health factor at which a position becomes liquidatable
+LIQUIDATION_HF = 1.0
+
+# Smoothing factors for level and trend (Holt's linear method)
+LEVEL_ALPHA = 0.5
+TREND_BETA = 0.3
+
+# Shortest check interval the estimator will ever recommend (seconds)
+MIN_CHECK_INTERVAL = 120
+
+# Samples closer than this to the last one folded in only refresh the
+# latest HF; a tiny dt would turn rounding noise into a huge slope
+MIN_SAMPLE_INTERVAL = MIN_CHECK_INTERVAL / 2
+
+
+class LiquidationEstimator:
+    """Per-position HF trend and distance-to-liquidation estimates"""
+
+    def __init__(self, alpha: float = LEVEL_ALPHA, beta: float = TREND_BETA):
+        """
+        Initialize estimator
+
+        Args:
+            alpha: Level smoothing factor (0-1, higher = react faster)
+            beta: Trend smoothing factor (0-1, higher = react faster)
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self._state = {}  # (chain, position_id) -> state dict
+
+    def update(self, key: Tuple, health_factor: float, oracle_price: float = None,
+               ts: float = None) -> Dict:
+        """
+        Fold a new snapshot into the position's estimate
+
+        Args:
+            key: (chain, position_id)
+            health_factor: Current health factor
+            oracle_price: Collateral price in debt token units
+            ts: Snapshot time (epoch seconds), default: now
+
+        Returns:
+            Current estimate (see estimate())
+        """
+        ts = ts if ts is not None else time.time()
+        state = self._state.get(key)
+
+        # No debt: nothing to liquidate, reset the trend
+        if health_factor == float('inf'):
+            self._state[key] = {
+                'ts': ts, 'level': health_factor, 'trend': 0.0,
+                'health_factor': health_factor, 'oracle_price': oracle_price,
+            }
+            return self.estimate(key)
+
+        if state is None or state['level'] == float('inf'):
+            state = {'ts': ts, 'level': health_factor, 'trend': 0.0}
+        else:
+            dt = ts - state['ts']
+            if dt < MIN_SAMPLE_INTERVAL:
+                # Near-duplicate snapshot (e.g. two users watching one position
+                # in the same cycle): keep the trend, show the latest HF
+                state['health_factor'] = health_factor
+                state['oracle_price'] = oracle_price
+                return self.estimate(key)
+
+            predicted = state['level'] + state['trend'] * dt
+            level = self.alpha * health_factor + (1 - self.alpha) * predicted
+            slope = (level - state['level']) / dt
+            state['trend'] = self.beta * slope + (1 - self.beta) * state['trend']
+            state['level'] = level
+            state['ts'] = ts
+
+        state['health_factor'] = health_factor
+        state['oracle_price'] = oracle_price
+        self._state[key] = state
+        return self.estimate(key)
+
+    def estimate(self, key: Tuple, thresholds: Tuple[float, ...] = ()) -> Dict:
+        """
+        Get the current estimate for a position
+
+        Args:
+            key: (chain, position_id)
+            thresholds: Extra HF thresholds to project time-to-threshold for
+
+        Returns:
+            Dict with:
+                health_factor: Last observed HF
+                hf_per_hour: Smoothed HF drift per hour
+                price_drop_pct: Collateral price drop (%) that triggers liquidation
+                liquidation_price: Collateral price at liquidation (debt token units)
+                seconds_to_liquidation: Projected time until HF reaches 1.0 (None if not falling)
+                seconds_to: {threshold: seconds} for each requested threshold
+        """
+        state = self._state.get(key)
+        if state is None:
+            return {}
+
+        health_factor = state['health_factor']
+        oracle_price = state.get('oracle_price')
+
+        # HF scales linearly with the collateral price, so liquidation sits
+        # at price / HF
+        if health_factor == float('inf'):
+            price_drop_pct = 100.0
+            liquidation_price = 0.0
+        else:
+            price_drop_pct = max(0.0, (1 - LIQUIDATION_HF / health_factor) * 100)
+            liquidation_price = oracle_price / health_factor if oracle_price else None
+
+        return {
+            'health_factor': health_factor,
+            'hf_per_hour': state['trend'] * 3600,
+            'price_drop_pct': price_drop_pct,
+            'liquidation_price': liquidation_price,
+            'seconds_to_liquidation': self._seconds_to(state, LIQUIDATION_HF),
+            'seconds_to': {t: self._seconds_to(state, t) for t in thresholds},
+        }
+
+    @staticmethod
+    def _seconds_to(state: Dict, threshold: float) -> Optional[float]:
+        """Project seconds until the smoothed HF crosses threshold"""
+        if state['level'] <= threshold:
+            return 0.0
+        if state['trend'] >= 0:
+            return None
+        return (state['level'] - threshold) / -state['trend']
+
+    def recommended_interval(self, key: Tuple, base_interval: float,
+                             critical_threshold: float) -> float:
+        """
+        Suggest how soon a position should be checked again
+
+        Positions trending toward the critical threshold, or close to it in
+        price terms, are checked more often than base_interval.
+        """
+        state = self._state.get(key)
+        if state is None:
+            return base_interval
+
+        interval = base_interval
+
+        eta = self._seconds_to(state, critical_threshold)
+        if eta is not None:
+            # Aim for several checks before the projected crossing
+            interval = min(interval, eta / 4)
+
+        estimate = self.estimate(key)
+        if estimate['price_drop_pct'] < 5:
+            interval = min(interval, base_interval / 4)
+        elif estimate['price_drop_pct'] < 10:
+            interval = min(interval, base_interval / 2)
+
+        return max(MIN_CHECK_INTERVAL, min(interval, base_interval))
+
+    def forget(self, key: Tuple):
+        """Drop state for a position that is no longer monitored"""
+        self._state.pop(key, None)
+
+
+if __name__ == '__main__':
+    # Test estimator with a position drifting down 0.01 HF per hour
+    estimator = LiquidationEstimator()
+    key = ('eth', 9540)
+    start = time.time()
+
+    for i in range(12):
+        estimate = estimator.update(key, 1.20 - i * 0.01, oracle_price=3000.0,
+                                    ts=start + i * 3600)
+
+    estimate = estimator.estimate(key, thresholds=(1.1, 1.05))
+    print(f"HF: {estimate['health_factor']:.4f}")
+    print(f"Drift: {estimate['hf_per_hour']:+.4f}/h")
+    print(f"Price drop to liquidation: {estimate['price_drop_pct']:.2f}%")
+    print(f"Liquidation price: {estimate['liquidation_price']:.2f}")
+    for threshold, seconds in estimate['seconds_to'].items():
+        print(f"Time to HF {threshold}: {seconds / 3600:.1f}h" if seconds is not None else f"Time to HF {threshold}: n/a")
+    print(f"Recommended interval: {estimator.recommended_interval(key, 1800, 1.05):.0f}s")
+
+    # Repeats within the same second must not move the trend
+    drift = estimate['hf_per_hour']
+    last = start + 11 * 3600
+    for i in range(5):
+        estimator.update(key, 1.09 - i * 0.0001, oracle_price=3000.0, ts=last + 0.1 * (i + 1))
+    repeated = estimator.estimate(key)
+    assert repeated['hf_per_hour'] == drift, (drift, repeated['hf_per_hour'])
+    assert repeated['health_factor'] == 1.09 - 4 * 0.0001
+    print("Same-second repeats ignored: OK")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Logging setup
+Records go through a queue to a background thread that formats and writes
+them, so a handler or monitor cycle never blocks on stdout/journald. Below
+ERROR, each message template is rate limited per time window; suppressed
+repeats are counted on the next record that gets through.
+
+Messages are sampled by their unformatted template, so hot-path log calls
+use lazy %-formatting (logger.info("Found %s", n)), never f-strings.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()  # 'text' or 'json'
+
+# Records let through per message template per window (0 disables sampling)
+LOG_SAMPLE_LIMIT = int(os.environ.get('LOG_SAMPLE_LIMIT', '20'))
+LOG_SAMPLE_WINDOW = float(os.environ.get('LOG_SAMPLE_WINDOW', '60'))
+
+# Queued records before new ones are dropped (the writer is falling behind)
+LOG_QUEUE_SIZE = 10000
+
+# Message templates tracked by the sampler before it starts over
+MAX_TEMPLATES = 5000
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Log call arguments copied when queued (others are formatted as they are
+# when the writer gets to them)
+_MUTABLE_ARGS = (list, dict, set, bytearray)
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class SamplingFilter(logging.Filter):
+    """Let at most limit records per (logger, template) through per window"""
+
+    def __init__(self, limit: int = LOG_SAMPLE_LIMIT, window: float = LOG_SAMPLE_WINDOW,
+                 always_level: int = logging.ERROR):
+        """
+        Initialize sampler
+
+        Args:
+            limit: Records per template per window (0 lets everything through)
+            window: Window length in seconds
+            always_level: Records at or above this level are never dropped
+        """
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.always_level = always_level
+        self.passed = 0
+        self.suppressed = 0
+        self._windows: Dict[tuple, list] = {}  # key -> [window start, count, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.limit or record.levelno >= self.always_level:
+            self.passed += 1
+            return True
+
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None:
+                if len(self._windows) >= MAX_TEMPLATES:
+                    self._windows.clear()
+                state = self._windows[key] = [now, 0, 0]
+            elif now - state[0] >= self.window:
+                if state[2]:
+                    record.suppressed = state[2]
+                state[:] = [now, 0, 0]
+
+            state[1] += 1
+            if state[1] > self.limit:
+                state[2] += 1
+                self.suppressed += 1
+                return False
+            self.passed += 1
+            return True
+
+
+class TextFormatter(logging.Formatter):
+    """Classic one-line format, noting repeats the sampler suppressed"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" [+{suppressed} similar suppressed]"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, template, extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.args:
+            entry['template'] = record.msg
+        for field, value in vars(record).items():
+            if field not in _RECORD_FIELDS:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that counts records dropped when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting (message, timestamps, JSON, tracebacks) happens on the
+        # writer thread; only containers in args are copied here, so a caller
+        # mutating them afterwards cannot change what gets written
+        record = copy.copy(record)
+        if isinstance(record.args, dict):
+            record.args = dict(record.args)
+        elif record.args:
+            record.args = tuple(copy.copy(arg) if isinstance(arg, _MUTABLE_ARGS) else arg
+                                for arg in record.args)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[_DroppingQueueHandler] = None
+_sampler: Optional[SamplingFilter] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None,
+                  sample_limit: int = LOG_SAMPLE_LIMIT, sample_window: float = LOG_SAMPLE_WINDOW):
+    """
+    Route the root logger through a queue to a background writer thread
+
+    Replaces any existing root handlers. Safe to call again (reconfigures).
+
+    Args:
+        level: Root log level name
+        fmt: 'text' or 'json'
+        stream: Output stream (default stderr)
+        sample_limit: Records per message template per window (0 disables)
+        sample_window: Sampling window in seconds
+    """
+    global _listener, _queue_handler, _sampler
+    stop_logging()
+
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter(TEXT_FORMAT))
+
+    _sampler = SamplingFilter(sample_limit, sample_window)
+    _queue_handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(_sampler)  # Dropped records are never formatted
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, writer, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+
+
+atexit.register(stop_logging)
+
+
+def get_log_stats() -> Dict[str, int]:
+    """Get {passed, suppressed, dropped, queued} since the last setup_logging()"""
+    if _queue_handler is None or _sampler is None:
+        return {'passed': 0, 'suppressed': 0, 'dropped': 0, 'queued': 0}
+    return {
+        'passed': _sampler.passed,
+        'suppressed': _sampler.suppressed,
+        'dropped': _queue_handler.dropped,
+        'queued': _queue_handler.queue.qsize(),
+    }
+
+
+if __name__ == '__main__':
+    # Flood one template and show what gets through
+    setup_logging(fmt=sys.argv[1] if len(sys.argv) > 1 else 'text', sample_limit=3, sample_window=0.5)
+    demo = logging.getLogger('demo')
+    for i in range(10):
+        demo.info("Checked address %s", i)
+    time.sleep(0.6)
+    demo.info("Checked address %s", 10)
+    demo.error("Errors are never sampled: %s", 'rpc timeout')
+    stop_logging()
+    print(get_log_stats())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Pack multi-position replies into as few Telegram messages as possible
+A compact summary table with inline "expand" buttons replaces one message
+per position
+"""
+
+from typing import Dict, List, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Telegram limit on message text length
+MAX_MESSAGE_LENGTH = 4096
+
+# Telegram limit on inline buttons per message
+MAX_BUTTONS = 100
+
+# Expand buttons per keyboard row
+BUTTONS_PER_ROW = 4
+
+# Callback data prefixes for position buttons: "<prefix>:<chain>:<nftId>"
+EXPAND_PREFIX = 'expand'
+REFRESH_PREFIX = 'refresh'
+
+
+def status_emoji(pos: Dict) -> str:
+    """Traffic light for a position's health factor"""
+    if pos['is_liquidated']:
+        return "⚫"
+    hf = pos['health_factor']
+    if hf < 1.05:
+        return "🔴"
+    if hf < 1.15:
+        return "🟠"
+    if hf < 1.25:
+        return "🟡"
+    return "🟢"
+
+
+def summary_line(pos: Dict) -> str:
+    """One table row for a position"""
+    hf = pos['health_factor']
+    hf_text = "∞" if hf == float('inf') else f"{hf:.3f}"
+    stale = " ⏳" if pos.get('stale') else ""
+    return (f"{status_emoji(pos)} #{pos['nftId']} {pos['supply_token']}/{pos['borrow_token']} "
+            f"HF {hf_text} · {pos['ratio']:.1f}% · ${pos['borrow_usd']:,.0f} debt{stale}")
+
+
+def expand_data(chain: str, nft_id: int) -> str:
+    """Callback data for a position's expand button"""
+    return f"{EXPAND_PREFIX}:{chain}:{nft_id}"
+
+
+def refresh_markup(chain: str, nft_id: int) -> InlineKeyboardMarkup:
+    """Refresh button for a full position card"""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔄 Refresh", callback_data=f"{REFRESH_PREFIX}:{chain}:{nft_id}")
+    ]])
+
+
+def parse_position_button(data: str) -> Tuple[str, int]:
+    """Get (chain, nftId) back from expand or refresh callback data"""
+    _, chain, nft_id = data.split(':', 2)
+    return chain, int(nft_id)
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Split text into chunks of at most limit characters, at line breaks where possible"""
+    chunks = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            # A single line longer than a message: hard split
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = candidate
+
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+
+def pack(header: str, rows: List[Tuple[str, str, int]],
+         limit: int = MAX_MESSAGE_LENGTH) -> List[Tuple[str, InlineKeyboardMarkup]]:
+    """
+    Pack a header and table rows into messages with expand buttons
+
+    Args:
+        header: Text at the top of the first message
+        rows: (line, chain, nftId) per row; rows with nftId None get no button
+        limit: Maximum characters per message
+
+    Returns:
+        List of (text, reply_markup) per message; reply_markup may be None
+    """
+    messages = []
+    text = header
+    buttons = []
+
+    def close():
+        markup = None
+        if buttons:
+            markup = InlineKeyboardMarkup(
+                [buttons[i:i + BUTTONS_PER_ROW] for i in range(0, len(buttons), BUTTONS_PER_ROW)]
+            )
+        chunks = split_text(text, limit)
+        messages.extend((chunk, None) for chunk in chunks[:-1])
+        messages.append((chunks[-1], markup))
+
+    for line, chain, nft_id in rows:
+        candidate = f"{text}\n{line}" if text else line
+        has_button = nft_id is not None
+        if text and (len(candidate) > limit or (has_button and len(buttons) >= MAX_BUTTONS)):
+            close()
+            text, buttons = line, []
+        else:
+            text = candidate
+
+        if has_button:
+            buttons.append(InlineKeyboardButton(f"#{nft_id}", callback_data=expand_data(chain, nft_id)))
+
+    close()
+    return messages
+
+
+if __name__ == '__main__':
+    # Pack 300 fake positions and show message sizes
+    fake = {
+        'is_liquidated': False, 'health_factor': 1.18, 'ratio': 76.3, 'borrow_usd': 12500.0,
+        'supply_token': 'wstETH', 'borrow_token': 'USDC',
+    }
+    rows = [(summary_line({**fake, 'nftId': 1000 + i}), 'eth', 1000 + i) for i in range(300)]
+    messages = pack("📋 Found 300 position(s) across 1 chain(s)\n", rows)
+
+    print(f"{len(rows)} positions → {len(messages)} message(s)")
+    for text, markup in messages:
+        n_buttons = sum(len(row) for row in markup.inline_keyboard) if markup else 0
+        print(f"  {len(text):>5} chars, {n_buttons:>3} buttons")
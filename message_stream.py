@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Progressive message updates for Telegram
+Edits a status message as results arrive, throttled to stay within
+Telegram's edit rate limits
+"""
+
+import asyncio
+import logging
+from typing import Optional
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between edits of one message (seconds)
+EDIT_INTERVAL = 1.0
+
+
+class ThrottledEditor:
+    """
+    Edit one message at most once per interval
+
+    update() never waits: intermediate texts may be skipped, but the
+    latest text is always sent, and flush() sends it immediately.
+    """
+
+    def __init__(self, message: Message, min_interval: float = EDIT_INTERVAL,
+                 parse_mode: Optional[str] = None):
+        """
+        Initialize editor
+
+        Args:
+            message: Message to edit (usually the loading message)
+            min_interval: Minimum seconds between edits
+            parse_mode: Telegram parse mode for the edits
+        """
+        self.message = message
+        self.min_interval = min_interval
+        self.parse_mode = parse_mode
+        self.edits = 0
+        self._sent = (message.text, None)
+        self._pending = None  # (text, reply_markup)
+        self._last_edit = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Show text now if allowed, otherwise as soon as the interval passes"""
+        self._pending = (text, reply_markup)
+        loop = asyncio.get_running_loop()
+        wait = self._last_edit + self.min_interval - loop.time()
+
+        if wait <= 0:
+            await self._send()
+        elif self._timer is None:
+            self._timer = loop.call_later(wait, lambda: asyncio.ensure_future(self._send()))
+
+    async def flush(self):
+        """Send the latest text immediately, ignoring the interval"""
+        if self._timer is not None:
+            self._timer.cancel()
+        await self._send()
+
+    async def _send(self):
+        """Edit the message to the latest pending text"""
+        async with self._lock:
+            self._timer = None
+            pending, self._pending = self._pending, None
+            if pending is None or pending == self._sent:
+                return
+
+            text, reply_markup = pending
+            try:
+                await self.message.edit_text(text, parse_mode=self.parse_mode,
+                                             reply_markup=reply_markup)
+                self._sent = pending
+                self.edits += 1
+            except RetryAfter as e:
+                # Flood control: keep the text and try again when allowed
+                logger.warning("Edit throttled by Telegram for %ss", e.retry_after)
+                self._pending = self._pending or pending
+                loop = asyncio.get_running_loop()
+                self._last_edit = loop.time() + e.retry_after - self.min_interval
+                self._timer = loop.call_later(e.retry_after, lambda: asyncio.ensure_future(self._send()))
+                return
+            except BadRequest as e:
+                logger.warning("Failed to edit message: %s", e)
+
+            self._last_edit = asyncio.get_running_loop().time()
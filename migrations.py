@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations
+Each database file tracks its schema version in PRAGMA user_version
+"""
+
+import os
+import sqlite3
+import logging
+import sys
+import time
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    """Check whether a table exists"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """Check whether a table has a column"""
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """Add a column unless it is already there"""
+    if not _column_exists(conn, table, column):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+# ---------------------------------------------------------------------------
+# fluid_bot.db
+# ---------------------------------------------------------------------------
+
+def _bot_baseline(conn: sqlite3.Connection):
+    """Tables as they existed before versioning"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitored_addresses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            address TEXT NOT NULL,
+            alert_threshold REAL DEFAULT 1.1,
+            critical_threshold REAL DEFAULT 1.05,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, address)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            position_id INTEGER NOT NULL,
+            health_factor REAL NOT NULL,
+            alert_type TEXT NOT NULL,
+            message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS address_chain_presence (
+            address TEXT NOT NULL,
+            chain TEXT NOT NULL,
+            has_positions INTEGER NOT NULL,
+            checked_at INTEGER NOT NULL,
+            PRIMARY KEY (address, chain)
+        ) WITHOUT ROWID
+    ''')
+
+    # Tiered position history
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS position_history_raw (
+            chain TEXT NOT NULL,
+            position_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            owner_address TEXT NOT NULL,
+            health_factor REAL NOT NULL,
+            ratio REAL NOT NULL,
+            supply_usd REAL NOT NULL,
+            borrow_usd REAL NOT NULL,
+            PRIMARY KEY (chain, position_id, ts)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_history_raw_ts
+        ON position_history_raw(ts)
+    ''')
+
+    for table in ('position_history_5m', 'position_history_1h'):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                chain TEXT NOT NULL,
+                position_id INTEGER NOT NULL,
+                bucket_ts INTEGER NOT NULL,
+                min_hf REAL NOT NULL,
+                max_hf REAL NOT NULL,
+                last_hf REAL NOT NULL,
+                last_ratio REAL NOT NULL,
+                last_supply_usd REAL NOT NULL,
+                last_borrow_usd REAL NOT NULL,
+                last_ts INTEGER NOT NULL,
+                samples INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (chain, position_id, bucket_ts)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_bucket
+            ON {table}(bucket_ts)
+        ''')
+
+
+def _bot_chain_columns(conn: sqlite3.Connection):
+    """Store the chain on alerts and fold legacy snapshots into the history tiers"""
+    _add_column(conn, 'alert_history', 'chain', "TEXT NOT NULL DEFAULT ''")
+
+    if not _table_exists(conn, 'position_snapshots'):
+        return
+
+    # Legacy snapshots never recorded a chain; keep them under ''
+    from position_history import PositionHistoryStore, ROLLUP_TABLES
+
+    cursor = conn.cursor()
+    rows = conn.execute('''
+        SELECT position_id, owner_address, health_factor, ratio, supply_usd, borrow_usd,
+               CAST(strftime('%s', created_at) AS INTEGER)
+        FROM position_snapshots
+        ORDER BY created_at
+    ''').fetchall()
+
+    for position_id, owner, health_factor, ratio, supply_usd, borrow_usd, ts in rows:
+        cursor.execute('''
+            INSERT OR IGNORE INTO position_history_raw
+            (chain, position_id, ts, owner_address, health_factor, ratio, supply_usd, borrow_usd)
+            VALUES ('', ?, ?, ?, ?, ?, ?, ?)
+        ''', (position_id, ts, owner, health_factor, ratio, supply_usd, borrow_usd))
+        if cursor.rowcount:
+            for bucket, table in ROLLUP_TABLES.items():
+                PositionHistoryStore._upsert_rollup(cursor, table, bucket, '', position_id, ts,
+                                                    health_factor, ratio, supply_usd, borrow_usd)
+
+    conn.execute('DROP TABLE position_snapshots')
+    logger.info("Migrated %s legacy position snapshots into history tiers", len(rows))
+
+
+def _bot_epoch_timestamps(conn: sqlite3.Connection):
+    """Integer epoch timestamps alongside the legacy text datetimes"""
+    for table in ('monitored_addresses', 'alert_history'):
+        _add_column(conn, table, 'created_ts', 'INTEGER')
+        conn.execute(f'''
+            UPDATE {table}
+            SET created_ts = CAST(strftime('%s', created_at) AS INTEGER)
+            WHERE created_ts IS NULL
+        ''')
+
+
+def _bot_query_indexes(conn: sqlite3.Connection):
+    """Composite indexes for every hot query path"""
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_monitored_user_created
+        ON monitored_addresses(user_id, created_ts)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_monitored_created
+        ON monitored_addresses(created_ts)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alert_user_created
+        ON alert_history(user_id, created_ts)
+    ''')
+
+
+def _bot_user_queries(conn: sqlite3.Connection):
+    """Rate limiter query log, moved here from rate_limit.db"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_queries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            query_type TEXT NOT NULL,
+            query_value TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_ts INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_queries_user_created
+        ON user_queries(user_id, created_ts)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_user_queries_created
+        ON user_queries(created_ts)
+    ''')
+
+
+def _rollup_user_queries(conn: sqlite3.Connection, source: str):
+    """Add the rows of a user_queries table to the daily rollups"""
+    conn.execute(f'''
+        INSERT INTO user_query_daily (user_id, day, query_type, count)
+        SELECT user_id, created_ts / 86400, query_type, COUNT(*)
+        FROM {source}
+        WHERE created_ts IS NOT NULL
+        GROUP BY user_id, created_ts / 86400, query_type
+        ON CONFLICT(user_id, day, query_type) DO UPDATE SET count = count + excluded.count
+    ''')
+
+
+def _bot_query_rollups(conn: sqlite3.Connection):
+    """Per-user daily query counters, so stats never scan the query log"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_query_daily (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            query_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, query_type)
+        ) WITHOUT ROWID
+    ''')
+    _rollup_user_queries(conn, 'user_queries')
+
+
+DATABASE_MIGRATIONS: List[Migration] = [
+    (1, 'baseline schema', _bot_baseline),
+    (2, 'chain columns and legacy snapshot import', _bot_chain_columns),
+    (3, 'integer epoch timestamps', _bot_epoch_timestamps),
+    (4, 'hot-path indexes', _bot_query_indexes),
+    (5, 'rate limiter query log', _bot_user_queries),
+    (6, 'daily query rollups', _bot_query_rollups),
+]
+
+
+def import_legacy_rate_limit_db(storage, legacy_path: str) -> int:
+    """
+    Copy query history from a standalone rate_limit.db into the shared database
+
+    The legacy file is renamed to <name>.migrated afterwards so the import
+    runs once.
+
+    Returns:
+        Number of rows imported
+    """
+    conn = storage.connection()
+    conn.execute('ATTACH DATABASE ? AS legacy', (legacy_path,))
+    try:
+        with storage.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO user_queries (user_id, query_type, query_value, timestamp, created_ts)
+                SELECT user_id, query_type, query_value, timestamp,
+                       CAST(strftime('%s', timestamp) AS INTEGER)
+                FROM legacy.user_queries
+            ''')
+            imported = cursor.rowcount
+            _rollup_user_queries(conn, """(
+                SELECT user_id, query_type, CAST(strftime('%s', timestamp) AS INTEGER) AS created_ts
+                FROM legacy.user_queries
+            )""")
+    finally:
+        conn.execute('DETACH DATABASE legacy')
+
+    os.replace(legacy_path, f"{legacy_path}.migrated")
+    logger.info("Imported %s query records from %s", imported, legacy_path)
+    return imported
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Get the schema version of a database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(storage, migrations: List[Migration]) -> int:
+    """
+    Apply pending migrations in order
+
+    Args:
+        storage: SQLiteBackend for the database file
+        migrations: Ordered (version, name, fn) list
+
+    Returns:
+        Schema version after migrating
+    """
+    conn = storage.connection()
+    version = get_version(conn)
+
+    for target, name, fn in migrations:
+        if target <= version:
+            continue
+
+        started = time.perf_counter()
+        # Schema changes and the version bump commit together or not at all
+        # (transaction() opens with an explicit BEGIN, so DDL is included)
+        with storage.transaction() as conn:
+            fn(conn)
+            conn.execute(f'PRAGMA user_version = {int(target)}')
+        version = target
+
+        logger.info("Migrated %s to v%s (%s) in %.2fs",
+                    storage.db_path, target, name, time.perf_counter() - started)
+
+    return version
+
+
+# Hot query paths and the index each must use
+QUERY_PLANS = [
+    ('get_monitored_addresses',
+     'SELECT id, address, alert_threshold, critical_threshold FROM monitored_addresses '
+     'WHERE user_id = ? ORDER BY created_ts DESC', (1,),
+     'idx_monitored_user_created'),
+    ('get_all_monitored_addresses',
+     'SELECT user_id, address, alert_threshold, critical_threshold FROM monitored_addresses '
+     'ORDER BY created_ts DESC', (),
+     'idx_monitored_created'),
+    ('get_recent_alerts',
+     'SELECT position_id, health_factor, alert_type, message, created_ts FROM alert_history '
+     'WHERE user_id = ? AND created_ts > ? ORDER BY created_ts DESC', (1, 0),
+     'idx_alert_user_created'),
+    ('get_position_history',
+     'SELECT ts FROM position_history_raw '
+     'WHERE chain IN (?, ?) AND position_id = ? AND ts BETWEEN ? AND ? ORDER BY ts DESC', ('eth', 'base', 1, 0, 1),
+     'PRIMARY KEY'),
+    ('prune_position_history',
+     'DELETE FROM position_history_raw WHERE ts < ?', (0,),
+     'idx_history_raw_ts'),
+    ('load_windows',
+     'SELECT user_id, created_ts, query_type FROM user_queries WHERE created_ts > ? ORDER BY created_ts', (0,),
+     'idx_user_queries_created'),
+    ('get_user_stats',
+     'SELECT day, query_type, count FROM user_query_daily WHERE user_id = ?', (1,),
+     'PRIMARY KEY'),
+    ('cleanup_old_records',
+     'SELECT id FROM user_queries WHERE created_ts < ? LIMIT ?', (0, 1),
+     'idx_user_queries_created'),
+]
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> str:
+    """Get the EXPLAIN QUERY PLAN output for a statement as one string"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return '; '.join(row[-1] for row in rows)
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[str]:
+    """
+    Verify each hot query uses its expected index
+
+    Returns:
+        List of problems (empty if every plan is as expected)
+    """
+    problems = []
+    for name, sql, params, index in QUERY_PLANS:
+        plan = explain(conn, sql, params)
+        if index not in plan:
+            problems.append(f"{name}: expected {index}, got: {plan}")
+    return problems
+
+
+if __name__ == '__main__':
+    # Migrate a scratch database and verify query plans; exits 1 on any
+    # problem so it can gate deploys
+    import tempfile
+    from storage import SQLiteBackend
+
+    logging.basicConfig(level=logging.INFO)
+
+    def _broken(conn: sqlite3.Connection):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError('migration failed halfway')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteBackend(os.path.join(tmp, 'fluid_bot.db'))
+        version = migrate(storage, DATABASE_MIGRATIONS)
+        print(f"\nSchema v{version}")
+
+        conn = storage.connection()
+        for name, sql, params, index in QUERY_PLANS:
+            print(f"  {name}: {explain(conn, sql, params)}")
+
+        problems = check_query_plans(conn)
+
+        # A failing migration must leave neither its DDL nor the version bump
+        try:
+            migrate(storage, DATABASE_MIGRATIONS + [(version + 1, 'broken', _broken)])
+        except RuntimeError:
+            pass
+        if _table_exists(conn, 'half_done') or get_version(conn) != version:
+            problems.append("failed migration was not rolled back")
+
+        print("  ✅ All query plans use their indexes, failed migrations roll back" if not problems else
+              "\n".join(f"  ❌ {p}" for p in problems))
+        storage.close()
+
+    sys.exit(1 if problems else 0)
@@ -11,9 +11,22 @@ from typing import Dict, List
 from telegram import Bot
 from fluid_client_multichain import MultiChainFluidClient
 from database import Database
+from liquidation_estimator import LiquidationEstimator
+from stress import PositionBook
+from chain_presence import ChainPresence
+from scheduler import CycleScheduler, run_spread, stable_order
+from async_storage import AsyncProxy, get_executor
+from rpc_budget import BudgetExceeded, PRIORITY_CRITICAL, PRIORITY_BACKGROUND
+from chain_config import get_cache_ttl
 
 logger = logging.getLogger(__name__)
 
+# Send an early warning when the critical threshold is projected within this window
+EARLY_WARNING_HORIZON = 6 * 3600
+
+# Retry an address this soon when the RPC budget turned it away (seconds)
+BUDGET_RETRY_DELAY = 60
+
 
 class PositionMonitor:
     """Monitor positions and send alerts"""
@@ -29,69 +42,157 @@ class PositionMonitor:
         """
         self.bot = bot
         self.db = db
+        self.async_db = AsyncProxy(db, get_executor())  # Non-blocking access from the loop
         self.check_interval = check_interval
         self.fluid_client = MultiChainFluidClient()
         self.last_alerts = {}  # Track last alert time to avoid spam
+        self.estimator = LiquidationEstimator()
+        self.carry_over = []  # (user_id, address) keys not reached last cycle
+        self.scheduler = CycleScheduler(check_interval, self.check_all_positions, name='monitor')
+        self.position_book = PositionBook()  # Cached raw positions for /stress
+        self.presence = ChainPresence(db)  # Which chains each address uses
+        self.urgent = set()  # (user_id, address) keys re-checked at critical RPC priority
         
-    async def check_all_positions(self):
-        """Check all monitored positions and send alerts if needed"""
+    async def check_all_positions(self, deadline: float = None) -> int:
+        """
+        Check all monitored positions and send alerts if needed
+        
+        Args:
+            deadline: Event loop time by which the cycle must finish. Checks are
+                spread evenly up to the deadline; addresses not reached are
+                carried over to the front of the next cycle. None checks
+                everything immediately.
+        
+        Returns:
+            Number of addresses carried over to the next cycle
+        """
         logger.info("Starting position check cycle...")
         
         try:
             # Get all monitored addresses
-            monitored = self.db.get_all_monitored_addresses()
+            monitored = await self.async_db.get_all_monitored_addresses()
             
             if not monitored:
                 logger.info("No monitored addresses found")
-                return
+                self.carry_over = []
+                return 0
+            
+            logger.info("Checking %s monitored address(es)", len(monitored))
+            
+            # Forget state for addresses that are no longer monitored
+            current = {(user_id, address): (alert, critical)
+                       for user_id, address, alert, critical in monitored}
+            self.position_book.retain_watchers({(u, a.lower()) for u, a in current})
+            self.urgent &= set(current)
             
-            logger.info(f"Checking {len(monitored)} monitored address(es)")
+            # Carried-over addresses first, then the rest in stable slot order
+            carried = [key for key in self.carry_over if key in current]
+            rest = stable_order([key for key in current if key not in set(carried)])
+            items = [(key, current[key]) for key in carried + rest]
             
-            for user_id, address, alert_threshold, critical_threshold in monitored:
-                try:
-                    await self.check_address_positions(
-                        user_id, address, alert_threshold, critical_threshold
-                    )
-                except Exception as e:
-                    logger.error(f"Error checking address {address} for user {user_id}: {e}")
+            if deadline is None:
+                for key, thresholds in items:
+                    await self._check_monitored(key, thresholds)
+                self.carry_over = []
+                return 0
+            
+            leftover = await run_spread(items, self._check_monitored, deadline)
+            self.carry_over = [key for key, _ in leftover]
+            if self.carry_over:
+                logger.warning("Cycle deadline reached, carrying over %s address(es)", len(self.carry_over))
+            return len(self.carry_over)
                     
         except Exception as e:
-            logger.error(f"Error in check_all_positions: {e}")
+            logger.error("Error in check_all_positions: %s", e)
+            return 0
+    
+    async def _check_monitored(self, key: tuple, thresholds: tuple) -> float:
+        """Check one monitored address, returning seconds until it is due again"""
+        user_id, address = key
+        alert_threshold, critical_threshold = thresholds
+        priority = PRIORITY_CRITICAL if key in self.urgent else PRIORITY_BACKGROUND
+        try:
+            return await self.check_address_positions(
+                user_id, address, alert_threshold, critical_threshold, priority
+            )
+        except Exception as e:
+            logger.error("Error checking address %s for user %s: %s", address, user_id, e)
+            return self.check_interval
     
     async def check_address_positions(self, user_id: int, address: str, 
-                                     alert_threshold: float, critical_threshold: float):
-        """Check all positions for a specific address"""
-        logger.info(f"Checking positions for address {address} (user {user_id})")
+                                     alert_threshold: float, critical_threshold: float,
+                                     priority: int = PRIORITY_BACKGROUND) -> float:
+        """
+        Check all positions for a specific address
+        
+        Args:
+            priority: RPC budget priority class for the lookups
         
-        # Get all positions for this address across all chains
+        Returns:
+            Seconds until this address should be checked again
+        """
+        logger.debug("Checking positions for address %s (user %s)", address, user_id)
+        
+        # Get positions on chains known to be active (plus due re-probes). A
+        # lookup younger than the chain's cache TTL (another user monitoring
+        # the same address, or an interactive query) is reused
         all_positions = []
+        out_of_budget = False
         
-        for chain_key in ['eth', 'base', 'arbitrum', 'polygon']:
+        for chain_key in self.presence.chains_to_check(address):
             try:
-                result = self.fluid_client.get_user_positions(address, chain_key)
-                if result:
-                    positions, chain_name = result
-                    if positions:
-                        for pos in positions:
-                            pos['chain'] = chain_key
-                            all_positions.append(pos)
+                positions, chain_name = await asyncio.to_thread(
+                    self.fluid_client.get_user_positions,
+                    address, chain_key, raise_errors=True, priority=priority,
+                    max_age=get_cache_ttl(chain_key)
+                )
+                # Cached positions say nothing new; retry once budget frees up
+                if any(pos.get('stale') for pos in positions):
+                    out_of_budget = True
+                    continue
+                self.presence.record(address, chain_key, bool(positions))
+                self.position_book.retain_positions(chain_key, address, [pos['nftId'] for pos in positions])
+                for pos in positions:
+                    pos['chain'] = chain_key
+                    all_positions.append(pos)
+            except BudgetExceeded as e:
+                logger.warning("Deferring %s on %s: %s", address, chain_key, e)
+                out_of_budget = True
             except Exception as e:
-                logger.error(f"Error fetching positions on {chain_key}: {e}")
+                logger.error("Error fetching positions on %s: %s", chain_key, e)
         
         if not all_positions:
-            logger.info(f"No positions found for address {address}")
-            return
+            logger.debug("No positions found for address %s", address)
+            if out_of_budget:
+                return BUDGET_RETRY_DELAY
+            self.urgent.discard((user_id, address))
+            return self.check_interval
         
-        logger.info(f"Found {len(all_positions)} position(s) for address {address}")
+        logger.debug("Found %s position(s) for address %s", len(all_positions), address)
         
         # Check each position
+        interval = self.check_interval
         for pos in all_positions:
             try:
+                self.position_book.watch(user_id, pos, alert_threshold, critical_threshold)
                 await self.check_position_health(
                     user_id, pos, alert_threshold, critical_threshold
                 )
+                interval = min(interval, self.estimator.recommended_interval(
+                    (pos['chain'], pos['nftId']), self.check_interval, critical_threshold
+                ))
             except Exception as e:
-                logger.error(f"Error checking position {pos.get('nftId')}: {e}")
+                logger.error("Error checking position %s: %s", pos.get('nftId'), e)
+        
+        # Addresses due again within the cycle are near liquidation
+        if interval < self.check_interval:
+            self.urgent.add((user_id, address))
+        else:
+            self.urgent.discard((user_id, address))
+        
+        if out_of_budget:
+            interval = min(interval, BUDGET_RETRY_DELAY)
+        return interval
     
     async def check_position_health(self, user_id: int, position: Dict, 
                                    alert_threshold: float, critical_threshold: float):
@@ -100,6 +201,19 @@ class PositionMonitor:
         health_factor = position['health_factor']
         chain = position.get('chain', 'unknown')
         
+        # Record position snapshot on every check so history has no gaps
+        get_executor().defer(
+            self.db.add_position_snapshot,
+            position_id, position['owner'], health_factor, 
+            position['ratio'], position['supply_usd'], position['borrow_usd'],
+            chain=chain, backend=self.db.storage
+        )
+        
+        # Update HF trend estimate
+        self.estimator.update((chain, position_id), health_factor, position.get('oracle_price'))
+        estimate = self.estimator.estimate((chain, position_id), thresholds=(critical_threshold,))
+        eta_critical = estimate['seconds_to'][critical_threshold]
+        
         # Create alert key to track last alert time
         alert_key = f"{user_id}_{position_id}"
         
@@ -113,6 +227,9 @@ class PositionMonitor:
         elif health_factor < alert_threshold:
             alert_type = "WARNING"
             alert_emoji = "🟠"
+        elif eta_critical is not None and eta_critical < EARLY_WARNING_HORIZON:
+            alert_type = "TREND"
+            alert_emoji = "📉"
         
         if not alert_type:
             # Position is healthy, no alert needed
@@ -124,29 +241,24 @@ class PositionMonitor:
         last_alert_time = self.last_alerts.get(alert_key, 0)
         
         if current_time - last_alert_time < 3600:  # 1 hour cooldown
-            logger.info(f"Skipping alert for position {position_id} (cooldown)")
+            logger.debug("Skipping alert for position %s (cooldown)", position_id)
             return
         
         # Update last alert time
         self.last_alerts[alert_key] = current_time
         
         # Record alert in database
-        self.db.add_alert(
+        await self.async_db.add_alert(
             user_id, position_id, health_factor, alert_type,
-            f"Health factor: {health_factor:.6f}"
-        )
-        
-        # Record position snapshot
-        self.db.add_position_snapshot(
-            position_id, position['owner'], health_factor, 
-            position['ratio'], position['supply_usd'], position['borrow_usd']
+            f"Health factor: {health_factor:.6f}", chain=chain
         )
         
         # Send Telegram alert
-        await self.send_alert(user_id, position, alert_type, alert_emoji, chain)
+        await self.send_alert(user_id, position, alert_type, alert_emoji, chain, estimate)
     
     async def send_alert(self, user_id: int, position: Dict, 
-                        alert_type: str, alert_emoji: str, chain: str):
+                        alert_type: str, alert_emoji: str, chain: str,
+                        estimate: Dict = None):
         """Send Telegram alert to user"""
         try:
             from chain_config import get_chain_name
@@ -180,6 +292,16 @@ class PositionMonitor:
 ━━━━━━━━━━━━━━━━━━━━━
 """
             
+            if estimate:
+                message += f"\n📉 Price drop to liquidation: {estimate['price_drop_pct']:.2f}%\n"
+                if estimate.get('liquidation_price'):
+                    message += f"   Liquidation price: {estimate['liquidation_price']:,.4f} {position['borrow_token']}\n"
+                if estimate['hf_per_hour'] < 0:
+                    message += f"   HF trend: {estimate['hf_per_hour']:+.4f}/h\n"
+                eta = estimate.get('seconds_to_liquidation')
+                if eta:
+                    message += f"   Projected liquidation in ~{eta / 3600:.1f}h at current trend\n"
+            
             if alert_type == "CRITICAL":
                 message += "\n🚨 *IMMEDIATE ACTION REQUIRED!*\n"
                 message += "Your position is at high risk of liquidation.\n"
@@ -190,6 +312,10 @@ class PositionMonitor:
                 message += "\n⚠️ *Action Recommended*\n"
                 message += "Your position is approaching liquidation risk.\n"
                 message += "Monitor closely or adjust your position.\n"
+            elif alert_type == "TREND":
+                message += "\n📉 *Early Warning*\n"
+                message += "Health factor is falling toward your critical threshold.\n"
+                message += "Consider acting before it gets there.\n"
             
             # Send message
             await self.bot.send_message(
@@ -198,24 +324,18 @@ class PositionMonitor:
                 parse_mode='Markdown'
             )
             
-            logger.info(f"Alert sent to user {user_id} for position {position_id}")
+            logger.info("Alert sent to user %s for position %s", user_id, position_id)
             
         except Exception as e:
-            logger.error(f"Failed to send alert to user {user_id}: {e}")
+            logger.error("Failed to send alert to user %s: %s", user_id, e)
     
     async def start_monitoring(self):
         """Start the monitoring loop"""
-        logger.info(f"Starting position monitor (check interval: {self.check_interval}s)")
+        logger.info("Starting position monitor (check interval: %ss)", self.check_interval)
         
-        while True:
-            try:
-                await self.check_all_positions()
-            except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}")
-            
-            # Wait for next check
-            logger.info(f"Next check in {self.check_interval} seconds")
-            await asyncio.sleep(self.check_interval)
+        # Cycles start on a fixed grid; at-risk addresses get extra checks
+        # inside a cycle via the scheduler's reschedule
+        await self.scheduler.run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Cross-chain portfolio aggregation
+Rolls an address's positions on every chain up into one risk summary
+(no RPC: works on already fetched positions)
+"""
+
+from typing import Dict, List, Optional
+
+from chain_config import get_chain_name
+from message_packer import status_emoji
+
+
+def summarize(positions: List[Dict]) -> Dict:
+    """
+    Aggregate positions into portfolio totals
+
+    A position's supply_usd/borrow_usd are valued in its debt token (the
+    vault oracle prices collateral in it), so totals are only summed within
+    positions sharing a debt token, never across them.
+
+    Args:
+        positions: Parsed positions from any number of chains
+
+    Returns:
+        Dict with position counts, per debt token totals
+        ({token: {'positions', 'collateral', 'debt', 'ltv', 'weighted_hf'}},
+        values in that token), the worst open position and per-token
+        exposure in native amounts ({token: {'supplied', 'borrowed'}})
+    """
+    open_positions = [p for p in positions if not p['is_liquidated']]
+
+    by_debt_token = {}
+    for p in open_positions:
+        group = by_debt_token.setdefault(p['borrow_token'], {
+            'positions': 0, 'collateral': 0.0, 'debt': 0.0, 'hf_debt': 0.0,
+        })
+        group['positions'] += 1
+        group['collateral'] += p['supply_usd']
+        group['debt'] += p['borrow_usd']
+        # Positions are isolated, so weight each HF by the debt it protects
+        if p['borrow_usd'] > 0:
+            group['hf_debt'] += p['health_factor'] * p['borrow_usd']
+
+    for group in by_debt_token.values():
+        hf_debt = group.pop('hf_debt')
+        group['ltv'] = group['debt'] / group['collateral'] * 100 if group['collateral'] > 0 else 0.0
+        group['weighted_hf'] = hf_debt / group['debt'] if group['debt'] > 0 else float('inf')
+
+    indebted = [p for p in open_positions if p['borrow_usd'] > 0]
+    worst = min(indebted, key=lambda p: p['health_factor'], default=None)
+
+    exposure = {}
+    for p in open_positions:
+        supply = exposure.setdefault(p['supply_token'], {'supplied': 0.0, 'borrowed': 0.0})
+        supply['supplied'] += p['supply_amount']
+        borrow = exposure.setdefault(p['borrow_token'], {'supplied': 0.0, 'borrowed': 0.0})
+        borrow['borrowed'] += p['borrow_amount']
+
+    return {
+        'positions': len(positions),
+        'open': len(open_positions),
+        'liquidated': len(positions) - len(open_positions),
+        'chains': sorted({p['chain'] for p in positions}),
+        'by_debt_token': by_debt_token,
+        'worst': worst,
+        'exposure': exposure,
+    }
+
+
+def _format_amount(amount: float) -> str:
+    """Token amount with precision suited to its size"""
+    if amount == 0:
+        return "0"
+    if amount >= 1000:
+        return f"{amount:,.0f}"
+    if amount >= 1:
+        return f"{amount:,.2f}"
+    return f"{amount:.4f}"
+
+
+def format_portfolio(address: str, summary: Dict, unavailable: Optional[List[str]] = None,
+                     stale: bool = False) -> str:
+    """
+    Compact Markdown message for a portfolio summary
+
+    Args:
+        address: Wallet address the summary is for
+        summary: Result of summarize()
+        unavailable: Chain keys that could not be queried
+        stale: Whether any position came from an old cached copy
+    """
+    short = f"{address[:6]}…{address[-4:]}"
+    chains = ", ".join(get_chain_name(c) for c in summary['chains'])
+
+    msg = f"💼 *Portfolio {short}*\n"
+    msg += f"{summary['open']} open position(s) on {chains}\n"
+    if summary['liquidated']:
+        msg += f"⚫ {summary['liquidated']} liquidated\n"
+
+    if summary['by_debt_token']:
+        msg += "\n*By debt token* (values in that token):\n"
+        by_debt = sorted(summary['by_debt_token'].items(), key=lambda item: -item[1]['positions'])
+        for token, g in by_debt:
+            hf = g['weighted_hf']
+            hf_text = "∞" if hf == float('inf') else f"{hf:.3f}"
+            msg += (f"• {token}: collateral {_format_amount(g['collateral'])}, "
+                    f"debt {_format_amount(g['debt'])} ({g['ltv']:.1f}% LTV), HF {hf_text}\n")
+
+    worst = summary['worst']
+    if worst is not None:
+        msg += (f"*Worst:* {status_emoji(worst)} #{worst['nftId']} ({get_chain_name(worst['chain'])}) "
+                f"{worst['supply_token']}/{worst['borrow_token']} HF {worst['health_factor']:.3f}\n")
+
+    if summary['exposure']:
+        msg += "\n*Exposure by token:*\n"
+        for token, e in sorted(summary['exposure'].items()):
+            parts = []
+            if e['supplied']:
+                parts.append(f"+{_format_amount(e['supplied'])}")
+            if e['borrowed']:
+                parts.append(f"−{_format_amount(e['borrowed'])}")
+            if parts:
+                msg += f"• {token}: {' / '.join(parts)}\n"
+
+    if unavailable:
+        msg += f"\n⚠️ Unavailable: {', '.join(get_chain_name(c) for c in unavailable)}\n"
+    if stale:
+        msg += "⏳ Some values are from cache (RPC budget exhausted)\n"
+
+    return msg
+
+
+if __name__ == '__main__':
+    # Aggregate four fake positions on two chains, one with ETH debt
+    base = {'is_liquidated': False, 'liquidation_threshold': 92.0}
+    positions = [
+        {**base, 'nftId': 9540, 'chain': 'eth', 'supply_token': 'wstETH', 'supply_amount': 10.0,
+         'supply_usd': 38000.0, 'borrow_token': 'USDC', 'borrow_amount': 25000.0,
+         'borrow_usd': 25000.0, 'health_factor': 1.398, 'ratio': 65.8},
+        {**base, 'nftId': 120, 'chain': 'base', 'supply_token': 'ETH', 'supply_amount': 2.5,
+         'supply_usd': 8500.0, 'borrow_token': 'USDC', 'borrow_amount': 7400.0,
+         'borrow_usd': 7400.0, 'health_factor': 1.057, 'ratio': 87.1},
+        {**base, 'nftId': 121, 'chain': 'base', 'supply_token': 'USDC', 'supply_amount': 5000.0,
+         'supply_usd': 5000.0, 'borrow_token': 'USDT', 'borrow_amount': 0.0,
+         'borrow_usd': 0.0, 'health_factor': float('inf'), 'ratio': 0.0},
+        {**base, 'nftId': 9612, 'chain': 'eth', 'supply_token': 'wstETH', 'supply_amount': 20.0,
+         'supply_usd': 23.6, 'borrow_token': 'ETH', 'borrow_amount': 18.0,
+         'borrow_usd': 18.0, 'health_factor': 1.206, 'ratio': 76.3},
+    ]
+    print(format_portfolio("0x1247739ac8e238D21574D18dEAce064675546cfC", summarize(positions)))
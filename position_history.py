@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Tiered time-series storage for position history
+Raw snapshots for 48h, 5-minute rollups for 30 days, hourly rollups beyond
+"""
+
+import logging
+import time
+from typing import List, Tuple, Optional, Iterable
+from storage import StorageBackend, get_backend, DEFAULT_DB_PATH
+from migrations import migrate, DATABASE_MIGRATIONS
+
+logger = logging.getLogger(__name__)
+
+# Retention per tier (seconds)
+RAW_RETENTION = 48 * 3600
+ROLLUP_5M_RETENTION = 30 * 86400
+ROLLUP_1H_RETENTION = 365 * 86400
+
+# Rollup bucket sizes (seconds)
+BUCKET_5M = 300
+BUCKET_1H = 3600
+
+# How often record() triggers an automatic prune
+PRUNE_INTERVAL = 600
+
+ROLLUP_TABLES = {
+    BUCKET_5M: 'position_history_5m',
+    BUCKET_1H: 'position_history_1h',
+}
+
+
+class PositionHistoryStore:
+    """Health factor / ratio / USD history with incremental rollups"""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH,
+                 raw_retention: int = RAW_RETENTION,
+                 rollup_5m_retention: int = ROLLUP_5M_RETENTION,
+                 rollup_1h_retention: Optional[int] = ROLLUP_1H_RETENTION,
+                 storage: StorageBackend = None):
+        """
+        Initialize history store
+
+        Args:
+            db_path: Path to SQLite database (ignored if storage is given)
+            raw_retention: Seconds to keep raw snapshots
+            rollup_5m_retention: Seconds to keep 5-minute rollups
+            rollup_1h_retention: Seconds to keep hourly rollups (None = forever)
+            storage: Storage backend to use
+        """
+        self.storage = storage or get_backend(db_path)
+        self.db_path = self.storage.db_path
+        self.raw_retention = raw_retention
+        self.rollup_5m_retention = rollup_5m_retention
+        self.rollup_1h_retention = rollup_1h_retention
+        self._last_prune = 0.0
+        self.init_db()
+
+    def init_db(self):
+        """Initialize history tables and indexes"""
+        try:
+            migrate(self.storage, DATABASE_MIGRATIONS)
+
+        except Exception as e:
+            logger.error("Failed to initialize position history: %s", e)
+
+    def record(self, chain: str, position_id: int, owner_address: str,
+               health_factor: float, ratio: float,
+               supply_usd: float, borrow_usd: float,
+               ts: Optional[int] = None) -> bool:
+        """
+        Record a snapshot and fold it into the rollup tiers
+
+        Returns:
+            True if recorded successfully
+        """
+        ts = int(ts if ts is not None else time.time())
+
+        try:
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                    INSERT OR IGNORE INTO position_history_raw
+                    (chain, position_id, ts, owner_address, health_factor, ratio, supply_usd, borrow_usd)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (chain, position_id, ts, owner_address.lower(),
+                      health_factor, ratio, supply_usd, borrow_usd))
+
+                # Same position, same second: already counted
+                if cursor.rowcount:
+                    for bucket, table in ROLLUP_TABLES.items():
+                        self._upsert_rollup(cursor, table, bucket, chain, position_id, ts,
+                                            health_factor, ratio, supply_usd, borrow_usd)
+
+        except Exception as e:
+            logger.error("Failed to record position history: %s", e)
+            return False
+
+        if time.time() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
+
+        return True
+
+    @staticmethod
+    def _upsert_rollup(cursor, table: str, bucket: int, chain: str, position_id: int,
+                       ts: int, health_factor: float, ratio: float,
+                       supply_usd: float, borrow_usd: float):
+        """Merge one sample into its rollup bucket"""
+        bucket_ts = ts - (ts % bucket)
+        cursor.execute(f'''
+            INSERT INTO {table}
+            (chain, position_id, bucket_ts, min_hf, max_hf, last_hf,
+             last_ratio, last_supply_usd, last_borrow_usd, last_ts, samples)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(chain, position_id, bucket_ts) DO UPDATE SET
+                min_hf = MIN(min_hf, excluded.min_hf),
+                max_hf = MAX(max_hf, excluded.max_hf),
+                last_hf = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_hf ELSE last_hf END,
+                last_ratio = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_ratio ELSE last_ratio END,
+                last_supply_usd = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_supply_usd ELSE last_supply_usd END,
+                last_borrow_usd = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_borrow_usd ELSE last_borrow_usd END,
+                last_ts = MAX(last_ts, excluded.last_ts),
+                samples = samples + 1
+        ''', (chain, position_id, bucket_ts, health_factor, health_factor, health_factor,
+              ratio, supply_usd, borrow_usd, ts))
+
+    def prune(self, now: Optional[int] = None) -> int:
+        """
+        Drop rows that have aged out of their tier
+
+        Returns:
+            Number of rows deleted
+        """
+        now = int(now if now is not None else time.time())
+        self._last_prune = time.time()
+
+        try:
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
+                deleted = 0
+
+                cursor.execute('DELETE FROM position_history_raw WHERE ts < ?',
+                               (now - self.raw_retention,))
+                deleted += cursor.rowcount
+
+                cursor.execute(f'DELETE FROM {ROLLUP_TABLES[BUCKET_5M]} WHERE bucket_ts < ?',
+                               (now - self.rollup_5m_retention,))
+                deleted += cursor.rowcount
+
+                if self.rollup_1h_retention is not None:
+                    cursor.execute(f'DELETE FROM {ROLLUP_TABLES[BUCKET_1H]} WHERE bucket_ts < ?',
+                                   (now - self.rollup_1h_retention,))
+                    deleted += cursor.rowcount
+
+            if deleted:
+                logger.info("Pruned %s position history rows", deleted)
+            return deleted
+
+        except Exception as e:
+            logger.error("Failed to prune position history: %s", e)
+            return 0
+
+    def get_history(self, chains: Iterable[str], position_id: int,
+                    since: Optional[int] = None, until: Optional[int] = None,
+                    limit: int = 100) -> List[Tuple]:
+        """
+        Get history for a position from the finest tier that covers `since`
+
+        Args:
+            chains: Chain keys to search (usually one)
+            position_id: Position NFT ID
+            since: Start of range (epoch seconds), default: raw retention window
+            until: End of range (epoch seconds), default: now
+            limit: Maximum rows, newest first
+
+        Returns:
+            List of (ts, min_hf, max_hf, last_hf, ratio, supply_usd, borrow_usd) tuples
+        """
+        now = int(time.time())
+        until = int(until if until is not None else now)
+        since = int(since if since is not None else now - self.raw_retention)
+        chains = list(chains)
+        placeholders = ','.join('?' * len(chains))
+
+        if since >= now - self.raw_retention:
+            query = f'''
+                SELECT ts, health_factor, health_factor, health_factor,
+                       ratio, supply_usd, borrow_usd
+                FROM position_history_raw
+                WHERE chain IN ({placeholders}) AND position_id = ? AND ts BETWEEN ? AND ?
+                ORDER BY ts DESC
+                LIMIT ?
+            '''
+        else:
+            table = ROLLUP_TABLES[BUCKET_5M if since >= now - self.rollup_5m_retention else BUCKET_1H]
+            query = f'''
+                SELECT bucket_ts, min_hf, max_hf, last_hf,
+                       last_ratio, last_supply_usd, last_borrow_usd
+                FROM {table}
+                WHERE chain IN ({placeholders}) AND position_id = ? AND bucket_ts BETWEEN ? AND ?
+                ORDER BY bucket_ts DESC
+                LIMIT ?
+            '''
+
+        try:
+            conn = self.storage.connection()
+            cursor = conn.cursor()
+            cursor.execute(query, (*chains, position_id, since, until, limit))
+            results = cursor.fetchall()
+            return results
+
+        except Exception as e:
+            logger.error("Failed to get position history: %s", e)
+            return []
+
+
+if __name__ == '__main__':
+    # Test history store
+    logging.basicConfig(level=logging.INFO)
+
+    store = PositionHistoryStore('history_test.db')
+    now = int(time.time())
+
+    for i in range(24):
+        store.record('eth', 9540, '0x1247739ac8e238D21574D18dEAce064675546cfC',
+                     1.20 - i * 0.005, 75.0 + i * 0.3, 10000.0, 7500.0 + i * 30,
+                     ts=now - (23 - i) * 60)
+
+    print("Raw tier:")
+    for row in store.get_history(['eth'], 9540, limit=5):
+        print(f"  {row}")
+
+    print("5m rollups:")
+    for row in store.get_history(['eth'], 9540, since=now - 7 * 86400, limit=5):
+        print(f"  {row}")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Built-in profiling
+Lightweight timing spans aggregated into percentiles, plus on-demand
+cProfile and tracemalloc sessions that dump top-N reports to disk
+"""
+
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Recent durations kept per span for percentiles
+SPAN_SAMPLES = 2048
+
+# Where profile reports are written
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Lines per report
+DEFAULT_TOP_N = 30
+
+# Stack depth recorded per allocation by tracemalloc
+TRACEMALLOC_FRAMES = 10
+
+
+class SpanStats:
+    """Durations per span name, aggregated into counts and percentiles"""
+
+    def __init__(self, samples: int = SPAN_SAMPLES, enabled: bool = True):
+        """
+        Initialize span statistics
+
+        Args:
+            samples: Recent durations kept per span
+            enabled: Record spans (when False, span() and timed() cost one check)
+        """
+        self.enabled = enabled
+        self.samples = samples
+        self._recent: Dict[str, deque] = {}
+        self._totals: Dict[str, list] = {}  # name -> [count, seconds, max]
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        """Record one duration"""
+        with self._lock:
+            recent = self._recent.get(name)
+            if recent is None:
+                recent = self._recent[name] = deque(maxlen=self.samples)
+                self._totals[name] = [0, 0.0, 0.0]
+            recent.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """Get {name: {count, total_s, p50_ms, p90_ms, p99_ms, max_ms}}, busiest first"""
+        with self._lock:
+            items = [(name, sorted(self._recent[name]), list(self._totals[name])) for name in self._recent]
+
+        result = {}
+        for name, recent, (count, total, longest) in sorted(items, key=lambda item: -item[2][1]):
+            pick = lambda q: recent[min(len(recent) - 1, int(len(recent) * q))] * 1000
+            result[name] = {
+                'count': count, 'total_s': total,
+                'p50_ms': pick(0.5), 'p90_ms': pick(0.9), 'p99_ms': pick(0.99),
+                'max_ms': longest * 1000,
+            }
+        return result
+
+    def reset(self):
+        """Forget all recorded spans"""
+        with self._lock:
+            self._recent.clear()
+            self._totals.clear()
+
+
+_spans = SpanStats(enabled=os.environ.get('PROFILE_SPANS', '1') != '0')
+
+
+def get_spans() -> SpanStats:
+    """Get the process-wide span statistics"""
+    return _spans
+
+
+@contextmanager
+def span(name: str):
+    """Time a block under a span name"""
+    if not _spans.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _spans.add(name, time.perf_counter() - start)
+
+
+def timed(name: Optional[str] = None):
+    """Decorator timing every call of a function or coroutine function"""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _spans.enabled:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _spans.add(label, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _spans.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _spans.add(label, time.perf_counter() - start)
+        return wrapper
+
+    return decorate
+
+
+def format_spans(report: Dict[str, Dict[str, float]], limit: int = DEFAULT_TOP_N) -> str:
+    """Fixed-width span table for logs or admin output"""
+    lines = [f"{'span (ms)':<32} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"]
+    for name, s in list(report.items())[:limit]:
+        lines.append(f"{name[:32]:<32} {s['count']:>7} {s['p50_ms']:>8.1f} {s['p90_ms']:>8.1f} "
+                     f"{s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+    return "\n".join(lines)
+
+
+class ProfileSession:
+    """
+    On-demand cProfile and tracemalloc sessions
+
+    cProfile only sees the thread that started it, so start it from the
+    event loop to profile handlers and the monitor; blocking RPC calls on
+    worker threads show up as time spent awaiting them.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR):
+        """
+        Initialize session control
+
+        Args:
+            directory: Where reports are written
+        """
+        self.directory = directory
+        self._profiler: Optional[cProfile.Profile] = None
+        self._profile_started = 0.0
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._trace_started = 0.0
+
+    @property
+    def cprofile_running(self) -> bool:
+        return self._profiler is not None
+
+    @property
+    def tracemalloc_running(self) -> bool:
+        return self._baseline is not None
+
+    def _path(self, kind: str, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}{suffix}")
+
+    def start_cprofile(self) -> bool:
+        """Start profiling the calling thread; False if already running"""
+        if self._profiler is not None:
+            return False
+        self._profiler = cProfile.Profile()
+        self._profile_started = time.time()
+        self._profiler.enable()
+        logger.info("cProfile session started")
+        return True
+
+    def disable_cprofile(self) -> Optional[Tuple[cProfile.Profile, float]]:
+        """
+        Stop profiling without writing anything (call from the profiled thread)
+
+        Returns:
+            (profiler, session seconds) for write_cprofile(), or None if not running
+        """
+        if self._profiler is None:
+            return None
+        profiler, self._profiler = self._profiler, None
+        profiler.disable()
+        return profiler, time.time() - self._profile_started
+
+    def write_cprofile(self, profiler: cProfile.Profile, seconds: float,
+                       top_n: int = DEFAULT_TOP_N) -> Tuple[str, str]:
+        """
+        Write <dir>/cprofile-<time>.prof plus a .txt report (safe from any thread)
+
+        Returns:
+            (report path, top-N by cumulative time)
+        """
+        path = self._path('cprofile', '.prof')
+        profiler.dump_stats(path)
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(top_n)
+        summary = f"{seconds:.0f}s session\n{out.getvalue()}"
+        with open(path[:-5] + '.txt', 'w') as f:
+            f.write(summary)
+
+        logger.info("cProfile session written to %s", path)
+        return path, summary
+
+    def stop_cprofile(self, top_n: int = DEFAULT_TOP_N) -> Optional[Tuple[str, str]]:
+        """
+        Stop profiling and write the report (see write_cprofile)
+
+        Returns:
+            (report path, top-N by cumulative time) or None if not running
+        """
+        stopped = self.disable_cprofile()
+        if stopped is None:
+            return None
+        return self.write_cprofile(*stopped, top_n)
+
+    def start_tracemalloc(self, frames: int = TRACEMALLOC_FRAMES) -> bool:
+        """Start tracing allocations; False if already running"""
+        if self._baseline is not None:
+            return False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = tracemalloc.take_snapshot()
+        self._trace_started = time.time()
+        logger.info("tracemalloc session started")
+        return True
+
+    def stop_tracemalloc(self, top_n: int = DEFAULT_TOP_N) -> Optional[Tuple[str, str]]:
+        """
+        Stop tracing and write <dir>/tracemalloc-<time>.txt
+
+        The report lists the largest growth since the session started and
+        the largest live allocations, by source line.
+
+        Returns:
+            (report path, report text) or None if not running
+        """
+        if self._baseline is None:
+            return None
+        baseline, self._baseline = self._baseline, None
+
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        lines = [f"{time.time() - self._trace_started:.0f}s session, "
+                 f"traced {current / 2 ** 20:.1f} MiB now, {peak / 2 ** 20:.1f} MiB peak",
+                 "", f"Top {top_n} growth since start:"]
+        lines += [str(stat) for stat in snapshot.compare_to(baseline.filter_traces(ignore), 'lineno')[:top_n]]
+        lines += ["", f"Top {top_n} live allocations:"]
+        lines += [str(stat) for stat in snapshot.statistics('lineno')[:top_n]]
+        report = "\n".join(lines)
+
+        path = self._path('tracemalloc', '.txt')
+        with open(path, 'w') as f:
+            f.write(report)
+
+        logger.info("tracemalloc session written to %s", path)
+        return path, report
+
+    def toggle_cprofile(self):
+        """Start or stop cProfile (signal handler)"""
+        if not self.start_cprofile():
+            self.stop_cprofile()
+
+    def toggle_tracemalloc(self):
+        """Start or stop tracemalloc (signal handler)"""
+        if not self.start_tracemalloc():
+            self.stop_tracemalloc()
+
+
+if __name__ == '__main__':
+    # Time a few spans and show the report
+    @timed('demo.sleep')
+    def nap(seconds: float):
+        time.sleep(seconds)
+
+    for i in range(50):
+        nap(0.001 * (i % 5))
+        with span('demo.sum'):
+            sum(range(10000))
+
+    print(format_spans(get_spans().report()))
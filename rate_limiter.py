@@ -2,209 +2,400 @@
 """
 Rate limiter for Telegram Bot
 Limits queries per user per day
+
+Recent query timestamps are kept in a per-user ring buffer, so checks never
+touch the disk. Query records are written behind on the storage thread and
+the buffers are rebuilt from the database on startup.
 """
 
-import sqlite3
+import os
+import math
 import logging
-from datetime import datetime, timedelta
-from typing import Tuple
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from storage import StorageBackend, get_backend, DEFAULT_DB_PATH, MEMORY_PATH
+from migrations import migrate, import_legacy_rate_limit_db, DATABASE_MIGRATIONS
+from async_storage import get_executor, stop_executor
 
 logger = logging.getLogger(__name__)
 
+# Rate limit data lived in its own file before sharing the bot database
+LEGACY_DB_PATH = 'rate_limit.db'
+
+# Sliding window length (seconds)
+WINDOW_SECONDS = 24 * 3600
+
+# Raw query rows kept after they are counted in the daily rollups (days)
+RAW_RETENTION_DAYS = 7
+
+# Raw rows deleted per cleanup call, so compaction never holds the write lock long
+CLEANUP_BATCH = 5000
+
+# Daily rollups older than this are folded into the all-time row (days)
+ROLLUP_RETENTION_DAYS = 8
+
+# Rollup day that holds all folded history
+ALL_TIME_DAY = 0
+
+# Share of the daily quota each query type uses (unlisted types cost 1)
+QUERY_COSTS = {
+    'refresh': 0.25,  # Single position on a known chain, often served from cache
+}
+
 
 class RateLimiter:
     """Rate limiter for bot queries"""
     
-    def __init__(self, db_path: str = 'rate_limit.db', queries_per_day: int = 10):
+    # Methods that modify the database (batched by async_storage)
+    WRITE_METHODS = frozenset({'cleanup_old_records', 'fold_old_rollups'})
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, queries_per_day: int = 10,
+                 storage: StorageBackend = None, legacy_db_path: str = LEGACY_DB_PATH):
         """
         Initialize rate limiter
         
         Args:
-            db_path: Path to SQLite database
+            db_path: Path to SQLite database (ignored if storage is given)
             queries_per_day: Maximum queries allowed per user per day
+            storage: Storage backend to use (shared with Database)
+            legacy_db_path: Standalone rate limit database to import once, if present
         """
-        self.db_path = db_path
+        self.storage = storage or get_backend(db_path)
+        self.db_path = self.storage.db_path
         self.queries_per_day = queries_per_day
-        self.init_db()
+        self._windows: Dict[int, deque] = {}  # user_id -> recent (created_ts, query_type)
+        self._usage: Dict[int, float] = {}  # user_id -> summed cost of the window
+        # Most entries a window needs: a full quota of the cheapest query type
+        self._window_size = math.ceil(queries_per_day / min([1.0, *QUERY_COSTS.values()]))
+        self._lock = threading.Lock()
+        self.init_db(legacy_db_path)
+        self.load_windows()
+    
+    def init_db(self, legacy_db_path: str = None):
+        """Initialize database (applies pending schema migrations)"""
+        try:
+            version = migrate(self.storage, DATABASE_MIGRATIONS)
+            logger.info("Rate limiter database initialized at %s (schema v%s)", self.db_path, version)
+            
+            if (legacy_db_path and self.db_path != MEMORY_PATH and os.path.exists(legacy_db_path)
+                    and os.path.abspath(legacy_db_path) != os.path.abspath(self.db_path)):
+                import_legacy_rate_limit_db(self.storage, legacy_db_path)
+            
+        except Exception as e:
+            logger.error("Failed to initialize rate limiter database: %s", e)
     
-    def init_db(self):
-        """Initialize database"""
+    def load_windows(self, now: Optional[float] = None):
+        """Rebuild the in-memory windows from the last 24h of query records"""
+        now = now if now is not None else time.time()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS user_queries (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    query_type TEXT NOT NULL,
-                    query_value TEXT,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create index for faster queries
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_user_timestamp 
-                ON user_queries(user_id, timestamp)
-            ''')
-            
-            conn.commit()
-            conn.close()
-            logger.info(f"Rate limiter database initialized at {self.db_path}")
+            cursor = self.storage.execute('''
+                SELECT user_id, created_ts, query_type FROM user_queries
+                WHERE created_ts > ?
+                ORDER BY created_ts
+            ''', (int(now) - WINDOW_SECONDS,))
+            
+            with self._lock:
+                self._windows = {}
+                self._usage = {}
+                for user_id, created_ts, query_type in cursor:
+                    self._append(user_id, created_ts, query_type)
+            
+            logger.info("Loaded rate limit windows for %s user(s)", len(self._windows))
             
         except Exception as e:
-            logger.error(f"Failed to initialize rate limiter database: {e}")
+            logger.error("Failed to load rate limit windows: %s", e)
+    
+    @staticmethod
+    def query_cost(query_type: str) -> float:
+        """Share of the daily quota one query of this type uses"""
+        return QUERY_COSTS.get(query_type, 1.0)
     
-    def check_rate_limit(self, user_id: int) -> Tuple[bool, int, int]:
+    def _append(self, user_id: int, created_ts: int, query_type: str):
+        """Add a query to a user's ring buffer (caller holds the lock)"""
+        window = self._windows.get(user_id)
+        if window is None:
+            # Only the newest queries that fit in the quota can decide a check
+            window = deque()
+            self._windows[user_id] = window
+            self._usage[user_id] = 0.0
+        
+        if len(window) >= self._window_size:
+            _, dropped_type = window.popleft()
+            self._usage[user_id] -= self.query_cost(dropped_type)
+        window.append((created_ts, query_type))
+        self._usage[user_id] += self.query_cost(query_type)
+    
+    def _used(self, user_id: int, now: float) -> float:
+        """Quota used in the current window, dropping expired queries (caller holds the lock)"""
+        window = self._windows.get(user_id)
+        if window is None:
+            return 0.0
+        
+        cutoff = int(now) - WINDOW_SECONDS
+        while window and window[0][0] <= cutoff:
+            _, query_type = window.popleft()
+            self._usage[user_id] -= self.query_cost(query_type)
+        if not window:
+            del self._windows[user_id]
+            del self._usage[user_id]
+            return 0.0
+        return self._usage[user_id]
+    
+    def _remaining(self, used: float) -> int:
+        """Whole queries left in the quota"""
+        return max(0, math.floor(self.queries_per_day - used + 1e-9))
+    
+    def check_rate_limit(self, user_id: int, now: Optional[float] = None) -> Tuple[bool, float, int]:
         """
         Check if user has exceeded rate limit
         
         Args:
             user_id: Telegram user ID
+            now: Current time (defaults to time.time())
         
         Returns:
             Tuple of (is_allowed, queries_used, queries_remaining)
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Calculate time 24 hours ago
-            time_limit = datetime.now() - timedelta(hours=24)
-            
-            # Count queries in last 24 hours
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_queries 
-                WHERE user_id = ? AND timestamp > ?
-            ''', (user_id, time_limit))
-            
-            queries_used = cursor.fetchone()[0]
-            conn.close()
-            
-            queries_remaining = max(0, self.queries_per_day - queries_used)
-            is_allowed = queries_used < self.queries_per_day
-            
-            return is_allowed, queries_used, queries_remaining
+        now = now if now is not None else time.time()
+        with self._lock:
+            queries_used = self._used(user_id, now)
+        
+        queries_remaining = self._remaining(queries_used)
+        is_allowed = queries_remaining > 0
+        
+        return is_allowed, queries_used, queries_remaining
+    
+    def try_acquire(self, user_id: int, query_type: str, query_value: str = None,
+                    now: Optional[float] = None) -> Tuple[bool, float, int]:
+        """
+        Check the limit and record the query as one atomic step
+        
+        Concurrent requests from the same user cannot both take the last
+        remaining query. Use refund() if the query turns out not to count.
+        Cheap query types (see QUERY_COSTS) use a fraction of a query.
+        
+        Args:
+            user_id: Telegram user ID
+            query_type: Type of query ('position', 'address', 'monitor')
+            query_value: The query value (position ID or address)
+            now: Current time (defaults to time.time())
+        
+        Returns:
+            Tuple of (is_allowed, queries_used, queries_remaining) after the query
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            queries_used = self._used(user_id, now)
+            if queries_used + self.query_cost(query_type) > self.queries_per_day + 1e-9:
+                return False, queries_used, self._remaining(queries_used)
             
-        except Exception as e:
-            logger.error(f"Failed to check rate limit: {e}")
-            return True, 0, self.queries_per_day  # Allow on error
+            created_ts = int(now)
+            self._append(user_id, created_ts, query_type)
+            queries_used = self._usage[user_id]
+        
+        self._persist(user_id, query_type, query_value, created_ts)
+        return True, queries_used, self._remaining(queries_used)
     
-    def record_query(self, user_id: int, query_type: str, query_value: str = None) -> bool:
+    def record_query(self, user_id: int, query_type: str, query_value: str = None,
+                     now: Optional[float] = None) -> bool:
         """
         Record a query for rate limiting
         
+        The window is updated immediately; the database row is written
+        behind on the storage thread.
+        
         Args:
             user_id: Telegram user ID
             query_type: Type of query ('position', 'address', 'monitor')
             query_value: The query value (position ID or address)
+            now: Current time (defaults to time.time())
         
         Returns:
             True if recorded successfully
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO user_queries (user_id, query_type, query_value)
-                VALUES (?, ?, ?)
-            ''', (user_id, query_type, query_value))
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Recorded query for user {user_id}: {query_type}")
-            return True
+        created_ts = int(now if now is not None else time.time())
+        with self._lock:
+            self._append(user_id, created_ts, query_type)
+        
+        self._persist(user_id, query_type, query_value, created_ts)
+        return True
+    
+    def refund(self, user_id: int, query_type: str, query_value: str = None):
+        """Give back the user's most recent query (e.g. nothing was found)"""
+        with self._lock:
+            window = self._windows.get(user_id)
+            if not window:
+                return
+            # Newest query of this type, falling back to the newest overall
+            for i in range(len(window) - 1, -1, -1):
+                if window[i][1] == query_type:
+                    break
+            else:
+                i = len(window) - 1
+            _, refunded_type = window[i]
+            del window[i]
+            self._usage[user_id] -= self.query_cost(refunded_type)
+        
+        get_executor().defer(self._delete_query, user_id, query_type, query_value,
+                             backend=self.storage)
+    
+    def _persist(self, user_id: int, query_type: str, query_value: Optional[str], created_ts: int):
+        """Queue the query row for the next storage write batch"""
+        get_executor().defer(self._insert_query, user_id, query_type, query_value, created_ts,
+                             backend=self.storage)
+    
+    def _insert_query(self, user_id: int, query_type: str, query_value: Optional[str],
+                      created_ts: int):
+        """Write one query row and count it in the daily rollup (runs on the storage thread)"""
+        with self.storage.transaction() as conn:
+            conn.execute('''
+                INSERT INTO user_queries (user_id, query_type, query_value, created_ts)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, query_type, query_value, created_ts))
+            self._add_to_rollup(conn, user_id, created_ts // 86400, query_type, 1)
+        
+        logger.debug("Recorded query for user %s: %s", user_id, query_type)
+    
+    def _delete_query(self, user_id: int, query_type: str, query_value: Optional[str]):
+        """Remove one refunded query row (runs on the storage thread)"""
+        with self.storage.transaction() as conn:
+            row = conn.execute('''
+                SELECT id, created_ts FROM user_queries
+                WHERE user_id = ? AND query_type = ? AND query_value IS ?
+                ORDER BY id DESC LIMIT 1
+            ''', (user_id, query_type, query_value)).fetchone()
+            if row is None:
+                return
             
-        except Exception as e:
-            logger.error(f"Failed to record query: {e}")
-            return False
+            conn.execute('DELETE FROM user_queries WHERE id = ?', (row[0],))
+            self._add_to_rollup(conn, user_id, row[1] // 86400, query_type, -1)
     
-    def get_user_stats(self, user_id: int) -> dict:
-        """Get query statistics for a user"""
+    @staticmethod
+    def _add_to_rollup(conn, user_id: int, day: int, query_type: str, delta: int):
+        """Adjust a user's daily counter for one query type"""
+        conn.execute('''
+            INSERT INTO user_query_daily (user_id, day, query_type, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, day, query_type) DO UPDATE SET count = count + excluded.count
+        ''', (user_id, day, query_type, delta))
+    
+    def get_user_stats(self, user_id: int, now: Optional[float] = None) -> dict:
+        """
+        Get query statistics for a user
+        
+        The last 24h come from the in-memory window; 7-day and all-time
+        counts come from the daily rollups in one indexed read of at most
+        ROLLUP_RETENTION_DAYS days plus the all-time row per query type.
+        """
+        now = now if now is not None else time.time()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Last 24 hours
-            time_limit_24h = datetime.now() - timedelta(hours=24)
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_queries 
-                WHERE user_id = ? AND timestamp > ?
-            ''', (user_id, time_limit_24h))
-            queries_24h = cursor.fetchone()[0]
-            
-            # Last 7 days
-            time_limit_7d = datetime.now() - timedelta(days=7)
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_queries 
-                WHERE user_id = ? AND timestamp > ?
-            ''', (user_id, time_limit_7d))
-            queries_7d = cursor.fetchone()[0]
-            
-            # Total
-            cursor.execute('''
-                SELECT COUNT(*) FROM user_queries 
+            with self._lock:
+                used = self._used(user_id, now)
+                recent = list(self._windows.get(user_id, ()))
+            
+            query_types = {}
+            for _, query_type in recent:
+                query_types[query_type] = query_types.get(query_type, 0) + 1
+            
+            cursor = self.storage.execute('''
+                SELECT day, query_type, count FROM user_query_daily
                 WHERE user_id = ?
             ''', (user_id,))
-            queries_total = cursor.fetchone()[0]
-            
-            # Query types
-            cursor.execute('''
-                SELECT query_type, COUNT(*) FROM user_queries 
-                WHERE user_id = ? AND timestamp > ?
-                GROUP BY query_type
-            ''', (user_id, time_limit_24h))
-            query_types = dict(cursor.fetchall())
             
-            conn.close()
+            # Last 7 calendar days (UTC), today included
+            first_day_7d = int(now) // 86400 - 6
+            queries_7d = 0
+            queries_total = 0
+            for day, _, count in cursor:
+                queries_total += count
+                if day >= first_day_7d:
+                    queries_7d += count
             
             return {
-                'queries_24h': queries_24h,
+                'queries_24h': used,
                 'queries_7d': queries_7d,
                 'queries_total': queries_total,
                 'query_types': query_types,
-                'remaining_today': max(0, self.queries_per_day - queries_24h),
+                'remaining_today': self._remaining(used),
             }
             
         except Exception as e:
-            logger.error(f"Failed to get user stats: {e}")
+            logger.error("Failed to get user stats: %s", e)
             return {}
     
-    def cleanup_old_records(self, days: int = 30) -> int:
+    def cleanup_old_records(self, days: int = RAW_RETENTION_DAYS,
+                            batch_size: int = CLEANUP_BATCH) -> int:
         """
-        Clean up old query records
+        Compact the query log: delete raw rows already counted in the rollups
+        
+        Deletes at most batch_size rows per call; callers repeat until fewer
+        than batch_size come back.
         
         Args:
             days: Delete records older than this many days
+            batch_size: Maximum rows to delete in this call
         
         Returns:
             Number of records deleted
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.storage.transaction() as conn:
+                cursor = conn.cursor()
             
-            cutoff_time = datetime.now() - timedelta(days=days)
+                cutoff_time = int(time.time()) - days * 86400
             
-            cursor.execute('''
-                DELETE FROM user_queries 
-                WHERE timestamp < ?
-            ''', (cutoff_time,))
+                cursor.execute('''
+                    DELETE FROM user_queries WHERE id IN (
+                        SELECT id FROM user_queries
+                        WHERE created_ts < ?
+                        LIMIT ?
+                    )
+                ''', (cutoff_time, batch_size))
             
-            deleted = cursor.rowcount
-            conn.commit()
-            conn.close()
+                deleted = cursor.rowcount
             
-            logger.info(f"Cleaned up {deleted} old query records")
+            if deleted:
+                logger.info("Cleaned up %s old query records", deleted)
             return deleted
             
         except Exception as e:
-            logger.error(f"Failed to cleanup old records: {e}")
+            logger.error("Failed to cleanup old records: %s", e)
+            return 0
+    
+    def fold_old_rollups(self, days: int = ROLLUP_RETENTION_DAYS,
+                         now: Optional[float] = None) -> int:
+        """
+        Fold daily rollups older than `days` into each user's all-time row
+        
+        Returns:
+            Number of daily rows folded
+        """
+        now = now if now is not None else time.time()
+        cutoff_day = int(now) // 86400 - days
+        try:
+            with self.storage.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO user_query_daily (user_id, day, query_type, count)
+                    SELECT user_id, ?, query_type, SUM(count) FROM user_query_daily
+                    WHERE day > ? AND day < ?
+                    GROUP BY user_id, query_type
+                    ON CONFLICT(user_id, day, query_type) DO UPDATE SET count = count + excluded.count
+                ''', (ALL_TIME_DAY, ALL_TIME_DAY, cutoff_day))
+                
+                cursor = conn.execute('''
+                    DELETE FROM user_query_daily WHERE day > ? AND day < ?
+                ''', (ALL_TIME_DAY, cutoff_day))
+                folded = cursor.rowcount
+            
+            if folded:
+                logger.info("Folded %s daily query rollups", folded)
+            return folded
+            
+        except Exception as e:
+            logger.error("Failed to fold query rollups: %s", e)
             return 0
-
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
@@ -230,6 +421,15 @@ if __name__ == '__main__':
     print(f"  Used: {used}/10")
     print(f"  Remaining: {remaining}")
     
+    # Atomic check + record
+    print("\nAcquiring 6 more queries...")
+    for i in range(6):
+        is_allowed, used, remaining = limiter.try_acquire(user_id, 'address', f'0x{i:040x}')
+        print(f"  Allowed: {is_allowed} ({used} used, {remaining} left)")
+    
+    # Wait for the write-behind queue before reading stats from the database
+    stop_executor()
+    
     # Get stats
     print("\nUser statistics:")
     stats = limiter.get_user_stats(user_id)
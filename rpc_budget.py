@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Shared RPC budget
+Per-chain token buckets in compute units (CU) protecting the RPC key from
+bursts, with priority classes and bounded waits
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from chain_config import get_budget_rates
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower value = more important)
+PRIORITY_CRITICAL = 0    # Monitor re-checks of positions near liquidation
+PRIORITY_USER = 1        # Interactive Telegram queries
+PRIORITY_BACKGROUND = 2  # Regular monitor scans
+
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: 'critical',
+    PRIORITY_USER: 'user',
+    PRIORITY_BACKGROUND: 'background',
+}
+
+# Compute unit cost per JSON-RPC method (Alchemy pricing)
+CU_COSTS = {
+    'eth_blockNumber': 10,
+    'eth_call': 26,
+}
+
+# Sustained budget for chains without a rate (CU per second); the shared
+# budget takes each chain's cu_per_second from chain_config
+DEFAULT_CU_PER_SECOND = 60.0
+
+# Bucket size, in seconds of sustained budget
+DEFAULT_BURST_SECONDS = 10.0
+
+# Share of each bucket a priority class may not spend (kept for higher classes)
+RESERVE_FRACTION = {
+    PRIORITY_CRITICAL: 0.0,
+    PRIORITY_USER: 0.2,
+    PRIORITY_BACKGROUND: 0.5,
+}
+
+# Longest a call may queue for budget before degrading (seconds)
+MAX_WAIT = {
+    PRIORITY_CRITICAL: 10.0,
+    PRIORITY_USER: 3.0,
+    PRIORITY_BACKGROUND: 0.0,
+}
+
+
+class BudgetExceeded(Exception):
+    """Raised when a call cannot get RPC budget before its deadline"""
+
+
+class TokenBucket:
+    """Compute units that refill at a fixed rate up to a capacity"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        """
+        Initialize a full bucket
+
+        Args:
+            rate: Refill rate in CU per second
+            capacity: Maximum CU held
+            now: Current clock reading
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        """Add the CU accrued since the last update"""
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, cost: float, floor: float) -> float:
+        """Seconds until cost can be taken without dropping below floor"""
+        missing = cost + floor - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+class RpcBudget:
+    """Per-chain CU budget shared by every client in the process"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None,
+                 default_rate: float = DEFAULT_CU_PER_SECOND,
+                 burst_seconds: float = DEFAULT_BURST_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize budget
+
+        Args:
+            rates: CU per second for specific chains
+            default_rate: CU per second for chains not in rates
+            burst_seconds: Bucket capacity in seconds of sustained rate
+            clock: Monotonic time source
+        """
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self.burst_seconds = burst_seconds
+        self.clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiting: Dict[str, Dict[int, int]] = {}  # chain -> {priority: waiters}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._cond = threading.Condition()
+
+    def _bucket(self, chain: str) -> TokenBucket:
+        """Get a chain's bucket (caller holds the lock)"""
+        bucket = self._buckets.get(chain)
+        if bucket is None:
+            rate = self.rates.get(chain, self.default_rate)
+            bucket = TokenBucket(rate, rate * self.burst_seconds, self.clock())
+            self._buckets[chain] = bucket
+            self._waiting[chain] = {p: 0 for p in PRIORITY_NAMES}
+            self._stats[chain] = {'spent': 0.0, 'waited': 0.0, 'denied': 0}
+        return bucket
+
+    def _outranked(self, chain: str, priority: int) -> bool:
+        """Whether a more important call is queued on this chain"""
+        return any(n for p, n in self._waiting[chain].items() if p < priority)
+
+    def acquire(self, chain: str, cost: float, priority: int = PRIORITY_USER,
+                timeout: Optional[float] = None):
+        """
+        Take cost CU from a chain's budget, queueing until it is available
+
+        A call never spends into the reserve kept for higher classes and
+        yields to higher-priority calls already queued on the chain.
+
+        Args:
+            chain: Chain key
+            cost: Compute units needed
+            priority: PRIORITY_CRITICAL, PRIORITY_USER or PRIORITY_BACKGROUND
+            timeout: Longest wait in seconds (default: MAX_WAIT for the priority)
+
+        Raises:
+            BudgetExceeded: If the budget is not available before the deadline
+        """
+        timeout = MAX_WAIT[priority] if timeout is None else timeout
+        deadline = self.clock() + timeout
+
+        with self._cond:
+            bucket = self._bucket(chain)
+            floor = bucket.capacity * RESERVE_FRACTION[priority]
+            started = self.clock()
+            queued = False
+
+            try:
+                while True:
+                    now = self.clock()
+                    bucket.refill(now)
+                    wait = bucket.wait_time(cost, floor)
+
+                    if wait == 0.0 and not self._outranked(chain, priority):
+                        bucket.tokens -= cost
+                        self._stats[chain]['spent'] += cost
+                        self._stats[chain]['waited'] += now - started
+                        return
+
+                    if now >= deadline or now + wait > deadline:
+                        self._stats[chain]['denied'] += 1
+                        raise BudgetExceeded(
+                            f"{chain}: no budget for {cost:.0f} CU at "
+                            f"{PRIORITY_NAMES[priority]} priority "
+                            f"({bucket.tokens:.0f}/{bucket.capacity:.0f} CU left)"
+                        )
+
+                    if not queued:
+                        self._waiting[chain][priority] += 1
+                        queued = True
+                    # Re-check when more budget accrues or a higher class leaves the queue
+                    self._cond.wait(min(max(wait, 0.01), deadline - now))
+            finally:
+                if queued:
+                    self._waiting[chain][priority] -= 1
+                    self._cond.notify_all()
+
+    def charge(self, chain: str, cost: float):
+        """
+        Debit CU for a call that was already admitted (e.g. follow-up lookups)
+
+        Never waits; the bucket may go negative, which delays later calls.
+        """
+        with self._cond:
+            bucket = self._bucket(chain)
+            bucket.refill(self.clock())
+            bucket.tokens -= cost
+            self._stats[chain]['spent'] += cost
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Get {chain: {tokens, capacity, spent, waited, denied}} for logs or admin output"""
+        with self._cond:
+            now = self.clock()
+            result = {}
+            for chain, bucket in self._buckets.items():
+                bucket.refill(now)
+                result[chain] = {'tokens': bucket.tokens, 'capacity': bucket.capacity,
+                                 **self._stats[chain]}
+            return result
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget() -> RpcBudget:
+    """Get the RPC budget shared by the bot and the monitor (rates from chain_config)"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = RpcBudget(rates=get_budget_rates())
+        return _budget
+
+
+if __name__ == '__main__':
+    # Drain one chain and show each class degrading in priority order
+    budget = RpcBudget(default_rate=100, burst_seconds=2)
+    cost = CU_COSTS['eth_call']
+
+    print("Spending a 200 CU bucket on eth")
+    for priority in (PRIORITY_BACKGROUND, PRIORITY_USER, PRIORITY_CRITICAL):
+        calls = 0
+        try:
+            while True:
+                budget.acquire('eth', cost, priority, timeout=0)
+                calls += 1
+        except BudgetExceeded as e:
+            print(f"  {PRIORITY_NAMES[priority]:<10} {calls} call(s), then: {e}")
+
+    start = time.monotonic()
+    budget.acquire('eth', cost, PRIORITY_CRITICAL)
+    print(f"  critical call queued {time.monotonic() - start:.2f}s for refill")
+    print(f"\n{budget.snapshot()}")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+RPC record/replay
+Captures JSON-RPC request/response pairs per chain to a fixture store and
+serves them back without network, for deterministic performance tests on
+production-shaped data
+
+Store layout: one file per chain in a directory. Recording appends to
+<chain>.jsonl; `python rpc_recorder.py compact <dir>` dedupes each chain
+into <chain>.jsonl.gz. Replay reads both.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from web3 import HTTPProvider
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+# Methods whose answer does not depend on their params (or is read at "latest")
+PARAMLESS_METHODS = frozenset({'eth_blockNumber', 'eth_chainId', 'net_version', 'eth_gasPrice'})
+
+
+def request_key(method: str, params: Any) -> str:
+    """
+    Canonical lookup key for a request
+
+    eth_call is keyed on the call object only, so a recording made at
+    "latest" replays for any block identifier.
+    """
+    if method in PARAMLESS_METHODS:
+        params = []
+    elif method == 'eth_call' and params:
+        call = params[0]
+        params = [{'to': str(call.get('to', '')).lower(), 'data': str(call.get('data', '')).lower()}]
+    return json.dumps([method, params], sort_keys=True, separators=(',', ':'), default=str)
+
+
+class FixtureStore:
+    """Recorded responses for one chain, backed by a directory"""
+
+    def __init__(self, directory: str, chain: str):
+        """
+        Initialize store and load any existing recordings
+
+        Args:
+            directory: Fixture directory
+            chain: Chain key (file name stem)
+        """
+        self.directory = directory
+        self.chain = chain
+        self.responses: Dict[str, Dict] = {}  # request key -> {'result': …} or {'error': …}
+        self._file = None
+        self._lock = threading.Lock()
+
+        for path in (self.compact_path, self.log_path):
+            if os.path.exists(path):
+                self._load(path)
+        if self.responses:
+            logger.info("Loaded %s recorded response(s) for %s", len(self.responses), chain)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, f"{self.chain}.jsonl")
+
+    @property
+    def compact_path(self) -> str:
+        return os.path.join(self.directory, f"{self.chain}.jsonl.gz")
+
+    def _load(self, path: str):
+        """Read a .jsonl or .jsonl.gz file; later entries win"""
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping truncated line in %s", path)
+                    continue
+                self.responses[entry['key']] = entry['response']
+
+    def get(self, method: str, params: Any) -> Optional[Dict]:
+        """Recorded {'result'} or {'error'} for a request, or None"""
+        return self.responses.get(request_key(method, params))
+
+    def record(self, method: str, params: Any, response: Dict):
+        """Store a response and append it to the chain's log file"""
+        key = request_key(method, params)
+        stored = {'error': response['error']} if 'error' in response else {'result': response.get('result')}
+        line = json.dumps({'key': key, 'response': stored}, separators=(',', ':'), default=str)
+
+        with self._lock:
+            self.responses[key] = stored
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.log_path, 'a', buffering=1)  # Line buffered: survives crashes
+            self._file.write(line + '\n')
+
+    def compact(self) -> int:
+        """
+        Rewrite the store as one deduplicated gzip file
+
+        Returns:
+            Number of responses kept
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.compact_path + '.tmp'
+            with gzip.open(tmp_path, 'wt', compresslevel=9) as f:
+                for key, response in self.responses.items():
+                    f.write(json.dumps({'key': key, 'response': response}, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self.compact_path)
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            return len(self.responses)
+
+    def close(self):
+        """Close the log file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RecordingProvider(HTTPProvider):
+    """HTTP provider that records every exchange (results and JSON-RPC errors)"""
+
+    def __init__(self, endpoint_uri: str, store: FixtureStore, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.store = store
+
+    def make_request(self, method, params):
+        response = super().make_request(method, params)
+        self.store.record(method, params, response)
+        return response
+
+
+class ReplayProvider(JSONBaseProvider):
+    """Provider answering from a fixture store only (no network)"""
+
+    def __init__(self, store: FixtureStore):
+        super().__init__()
+        self.store = store
+        self.misses = 0
+        self._request_id = 0
+
+    def make_request(self, method, params):
+        self._request_id += 1
+        response = {'jsonrpc': '2.0', 'id': self._request_id}
+        recorded = self.store.get(method, params)
+        if recorded is None:
+            self.misses += 1
+            response['error'] = {'code': -32000, 'message': f"Not recorded: {method}"}
+        else:
+            response.update(recorded)
+        return response
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def compact_directory(directory: str) -> Dict[str, int]:
+    """Compact every chain in a fixture directory, returning {chain: responses}"""
+    chains = {name.split('.')[0] for name in os.listdir(directory)
+              if name.endswith('.jsonl') or name.endswith('.jsonl.gz')}
+    return {chain: FixtureStore(directory, chain).compact() for chain in sorted(chains)}
+
+
+if __name__ == '__main__':
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) != 3 or sys.argv[1] not in ('compact', 'info'):
+        print("Usage: python rpc_recorder.py compact|info <fixture_dir>")
+        sys.exit(1)
+
+    command, directory = sys.argv[1], sys.argv[2]
+    if command == 'compact':
+        for chain, count in compact_directory(directory).items():
+            size = os.path.getsize(os.path.join(directory, f"{chain}.jsonl.gz"))
+            print(f"  {chain:<10} {count:>7} response(s)  {size / 1024:,.1f} KB")
+    else:
+        chains = sorted({name.split('.')[0] for name in os.listdir(directory) if '.jsonl' in name})
+        for chain in chains:
+            methods = {}
+            for key in FixtureStore(directory, chain).responses:
+                method = json.loads(key)[0]
+                methods[method] = methods.get(method, 0) + 1
+            print(f"  {chain:<10} {methods}")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Fixed-cadence cycle scheduler
+Starts cycles on a drift-free grid, never overlaps them, and spreads work
+items across the interval with jitter
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import zlib
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the interval used to spread work; the rest is slack for overruns
+SPREAD_FRACTION = 0.8
+
+# Jitter applied to each slot, as a fraction of the slot width
+JITTER_FRACTION = 0.5
+
+
+class CycleScheduler:
+    """Run a cycle function every `interval` seconds on a fixed grid"""
+
+    def __init__(self, interval: float, run_cycle: Callable[[float], Awaitable[Optional[int]]],
+                 name: str = 'cycle'):
+        """
+        Initialize scheduler
+
+        Args:
+            interval: Cycle period in seconds
+            run_cycle: Coroutine function called with the cycle deadline (loop time),
+                returning the number of work items carried over to the next cycle
+            name: Name used in logs
+        """
+        self.interval = interval
+        self.run_cycle = run_cycle
+        self.name = name
+        self.metrics = {
+            'cycles': 0,
+            'skipped_cycles': 0,
+            'overruns': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0,
+            'last_duration': 0.0,
+            'last_overrun': 0.0,
+            'carried_over': 0,
+        }
+
+    async def run(self):
+        """Run cycles forever"""
+        loop = asyncio.get_running_loop()
+        origin = loop.time()
+        tick = 0
+
+        while True:
+            scheduled = origin + tick * self.interval
+            now = loop.time()
+
+            # Previous cycle ran past one or more whole ticks: skip them
+            # instead of firing back-to-back catch-up cycles
+            if now >= scheduled + self.interval:
+                missed = int((now - scheduled) // self.interval)
+                tick += missed
+                scheduled = origin + tick * self.interval
+                self.metrics['skipped_cycles'] += missed
+                logger.warning("%s: skipped %s cycle(s) after overrun", self.name, missed)
+
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+
+            started = loop.time()
+            lag = started - scheduled
+            deadline = scheduled + self.interval
+
+            carried_over = 0
+            try:
+                carried_over = await self.run_cycle(deadline) or 0
+            except Exception as e:
+                logger.error("%s: cycle failed: %s", self.name, e)
+
+            finished = loop.time()
+            overrun = max(0.0, finished - deadline)
+
+            self.metrics['cycles'] += 1
+            self.metrics['last_lag'] = lag
+            self.metrics['max_lag'] = max(self.metrics['max_lag'], lag)
+            self.metrics['last_duration'] = finished - started
+            self.metrics['last_overrun'] = overrun
+            self.metrics['carried_over'] = carried_over
+            if overrun > 0:
+                self.metrics['overruns'] += 1
+
+            logger.info(
+                "%s: cycle %s took %.1fs (lag %.2fs, overrun %.1fs, carried over %s)",
+                self.name, self.metrics['cycles'], finished - started, lag, overrun, carried_over
+            )
+
+            tick += 1
+
+
+def stable_order(keys: List[Hashable]) -> List[Hashable]:
+    """Order keys by a stable hash so each key keeps its slot across cycles"""
+    return sorted(keys, key=lambda k: zlib.crc32(repr(k).encode()))
+
+
+async def run_spread(items: List[Tuple[Hashable, object]],
+                     worker: Callable[[Hashable, object], Awaitable[Optional[float]]],
+                     deadline: float, spread: Optional[float] = None) -> List[Tuple[Hashable, object]]:
+    """
+    Run worker over items spread evenly until deadline
+
+    Each item gets a slot at an even offset from now, plus random jitter. If
+    the worker returns a delay (seconds) that still fits before the
+    deadline, the item is rescheduled for an extra run within this cycle.
+
+    Args:
+        items: (key, payload) pairs, in slot order
+        worker: Coroutine function called with (key, payload)
+        deadline: Loop time by which the cycle must finish
+        spread: Seconds to spread slots over (default: SPREAD_FRACTION of the time left)
+
+    Returns:
+        (key, payload) pairs whose first run did not start before the deadline
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    if spread is None:
+        spread = max(0.0, (deadline - start) * SPREAD_FRACTION)
+
+    width = spread / len(items) if items else 0.0
+    heap = []
+    for i, (key, payload) in enumerate(items):
+        jitter = random.uniform(-JITTER_FRACTION, JITTER_FRACTION) * width if i else 0.0
+        heapq.heappush(heap, (start + i * width + jitter, i, True, key, payload))
+
+    seq = len(items)
+    while heap:
+        slot, _, first, key, payload = heap[0]
+        now = loop.time()
+        if now >= deadline:
+            break
+        if slot > now:
+            await asyncio.sleep(min(slot, deadline) - now)
+            continue
+
+        heapq.heappop(heap)
+        delay = await worker(key, payload)
+
+        if delay is not None:
+            next_slot = loop.time() + delay
+            if next_slot < deadline:
+                heapq.heappush(heap, (next_slot, seq, False, key, payload))
+                seq += 1
+
+    # Only first runs carry over; extra re-checks are recomputed next cycle
+    return [(key, payload) for _, _, first, key, payload in sorted(heap) if first]
+
+
+def summarize(metrics: Dict) -> str:
+    """Format scheduler metrics for logs or admin output"""
+    return (
+        f"cycles={metrics['cycles']} skipped={metrics['skipped_cycles']} "
+        f"overruns={metrics['overruns']} carried_over={metrics['carried_over']} last_lag={metrics['last_lag']:.2f}s "
+        f"max_lag={metrics['max_lag']:.2f}s last_duration={metrics['last_duration']:.1f}s"
+    )
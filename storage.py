@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Storage backends shared by Database and RateLimiter
+SQLite file backend with long-lived per-thread WAL connections, and an
+in-memory backend for tests and benchmarks
+"""
+
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Default database file for all bot data
+DEFAULT_DB_PATH = 'fluid_bot.db'
+
+# Path that selects the in-memory backend
+MEMORY_PATH = ':memory:'
+
+# Page cache per connection (KiB)
+CACHE_SIZE_KB = 8192
+
+# Prepared statements kept per connection
+STATEMENT_CACHE = 256
+
+# Wait this long for a locked database before failing (ms)
+BUSY_TIMEOUT_MS = 5000
+
+
+class StorageBackend:
+    """
+    Interface every storage backend provides
+
+    Callers run reads through connection()/execute() and writes inside
+    transaction(). The outermost transaction() block on a thread commits on
+    exit or rolls back on error; nested blocks are savepoints, so a nested
+    block that fails is undone even if its caller handles the error.
+    """
+
+    db_path = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection for the calling thread"""
+        raise NotImplementedError
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Run a read statement"""
+        return self.connection().execute(sql, params)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction"""
+        raise NotImplementedError
+        yield
+
+    def close(self):
+        """Release all connections"""
+        raise NotImplementedError
+
+    def _depth(self) -> int:
+        """Transaction nesting depth for the calling thread"""
+        return getattr(self._local, 'depth', 0)
+
+    @contextmanager
+    def _transaction(self, conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+        """Reentrant transaction on conn, tracked per thread"""
+        depth = self._local.depth = self._depth() + 1
+        if depth == 1:
+            # Explicit BEGIN: the sqlite3 module would only open one before
+            # DML, leaving earlier DDL and savepoints outside the transaction
+            if not conn.in_transaction:
+                conn.execute('BEGIN')
+        else:
+            conn.execute(f'SAVEPOINT nested_{depth}')
+        try:
+            yield conn
+        except BaseException:
+            if depth == 1:
+                conn.rollback()
+            else:
+                conn.execute(f'ROLLBACK TO nested_{depth}')
+                conn.execute(f'RELEASE nested_{depth}')
+            raise
+        else:
+            if depth == 1:
+                conn.commit()
+            else:
+                conn.execute(f'RELEASE nested_{depth}')
+        finally:
+            self._local.depth -= 1
+
+
+class SQLiteBackend(StorageBackend):
+    """Per-thread persistent connections to one SQLite database file"""
+
+    def __init__(self, db_path: str, cache_size_kb: int = CACHE_SIZE_KB,
+                 statement_cache: int = STATEMENT_CACHE):
+        """
+        Initialize backend
+
+        Args:
+            db_path: Path to SQLite database
+            cache_size_kb: Page cache size per connection in KiB
+            statement_cache: Number of prepared statements cached per connection
+        """
+        self.db_path = db_path
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=self.statement_cache,
+            check_same_thread=False,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{self.cache_size_kb}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+
+        with self._lock:
+            self._connections.append(conn)
+
+        logger.debug("Opened connection to %s for thread %s",
+                     self.db_path, threading.current_thread().name)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction on this thread's connection"""
+        with self._transaction(self.connection()) as conn:
+            yield conn
+
+    def close(self):
+        """Close every connection opened by this backend"""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning("Failed to close connection to %s: %s", self.db_path, e)
+            self._connections = []
+        self._local = threading.local()
+
+
+class MemoryBackend(StorageBackend):
+    """Single in-memory database shared by all threads (tests and benchmarks)"""
+
+    def __init__(self, statement_cache: int = STATEMENT_CACHE):
+        """Initialize an empty in-memory database"""
+        self.db_path = MEMORY_PATH
+        self._conn = sqlite3.connect(
+            MEMORY_PATH,
+            cached_statements=statement_cache,
+            check_same_thread=False,
+        )
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    def connection(self) -> sqlite3.Connection:
+        """Get the shared connection"""
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements in one transaction, serialized across threads"""
+        with self._lock:
+            with self._transaction(self._conn) as conn:
+                yield conn
+
+    def close(self):
+        """Close the in-memory database (its data is lost)"""
+        self._conn.close()
+
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(db_path: str = DEFAULT_DB_PATH) -> StorageBackend:
+    """
+    Get the shared backend for a database path
+
+    ':memory:' selects the in-memory backend. Every caller asking for the
+    same path gets the same backend, so they share connections and the
+    async write batching path.
+    """
+    with _backends_lock:
+        backend = _backends.get(db_path)
+        if backend is None:
+            backend = MemoryBackend() if db_path == MEMORY_PATH else SQLiteBackend(db_path)
+            _backends[db_path] = backend
+        return backend
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Vectorized price-shock stress testing
+Applies hypothetical oracle moves to every cached position at once (no RPC)
+"""
+
+import logging
+import math
+import re
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stress outcome levels, worst first
+LEVEL_LIQUIDATION = 'LIQUIDATION'
+LEVEL_CRITICAL = 'CRITICAL'
+LEVEL_ALERT = 'ALERT'
+LEVEL_SAFE = 'SAFE'
+
+LEVELS = (LEVEL_SAFE, LEVEL_ALERT, LEVEL_CRITICAL, LEVEL_LIQUIDATION)
+
+_INITIAL_CAPACITY = 1024
+
+# Token symbols /stress accepts (also keeps them safe inside Markdown replies)
+SYMBOL_PATTERN = re.compile(r'[A-Z0-9.]{1,20}')
+
+# Largest price rise /stress accepts (%)
+MAX_SHOCK_PCT = 1000
+
+
+class PositionBook:
+    """Columnar cache of monitored positions for batch what-if analysis"""
+
+    def __init__(self):
+        """Initialize empty position book"""
+        # Position columns (one row per (chain, nftId))
+        self._rows = {}  # (chain, nft_id) -> row index
+        self._meta = []  # row -> (chain, nft_id, owner, supply_token, borrow_token), None if free
+        self._free_rows = []  # Rows of removed positions, reused first
+        self._by_owner = {}  # (chain, owner) -> set of nft_ids
+        self._supply_raw = np.zeros(_INITIAL_CAPACITY)
+        self._borrow_raw = np.zeros(_INITIAL_CAPACITY)
+        self._oracle_raw = np.zeros(_INITIAL_CAPACITY)
+        self._lt_pct = np.zeros(_INITIAL_CAPACITY)
+        self._supply_tok = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._borrow_tok = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        self._tokens = {}  # token symbol (upper) -> id
+
+        # Watcher columns (one row per (user_id, chain, nftId))
+        self._watch_rows = {}  # (user_id, chain, nft_id) -> watcher index
+        self._watchers = {}  # (chain, nft_id) -> set of watching user_ids
+        self._free_watchers = []  # Watcher indexes of removed positions, reused first
+        self._w_row = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._w_user = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._w_alert = np.zeros(_INITIAL_CAPACITY)
+        self._w_critical = np.zeros(_INITIAL_CAPACITY)
+        self._w_active = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self._w_count = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _token_id(self, symbol: str) -> int:
+        """Intern a token symbol"""
+        symbol = symbol.upper()
+        if symbol not in self._tokens:
+            self._tokens[symbol] = len(self._tokens) + 1
+        return self._tokens[symbol]
+
+    @staticmethod
+    def _grow(array: np.ndarray, size: int) -> np.ndarray:
+        """Return array with capacity for at least size entries"""
+        if size <= len(array):
+            return array
+        grown = np.zeros(max(size, len(array) * 2), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def upsert(self, position: Dict):
+        """Add or refresh a position from parsed client data"""
+        key = (position['chain'], position['nftId'])
+        row = self._rows.get(key)
+
+        if row is None and self._free_rows:
+            row = self._free_rows.pop()
+            self._rows[key] = row
+        elif row is None:
+            row = len(self._meta)
+            self._rows[key] = row
+            self._meta.append(None)
+            size = row + 1
+            self._supply_raw = self._grow(self._supply_raw, size)
+            self._borrow_raw = self._grow(self._borrow_raw, size)
+            self._oracle_raw = self._grow(self._oracle_raw, size)
+            self._lt_pct = self._grow(self._lt_pct, size)
+            self._supply_tok = self._grow(self._supply_tok, size)
+            self._borrow_tok = self._grow(self._borrow_tok, size)
+
+        owner = position['owner'].lower()
+        previous = self._meta[row]
+        if previous is not None and previous[2] != owner:
+            # NFT changed hands
+            self._by_owner[(key[0], previous[2])].discard(key[1])
+        self._by_owner.setdefault((key[0], owner), set()).add(key[1])
+
+        self._meta[row] = (position['chain'], position['nftId'], owner,
+                           position['supply_token'], position['borrow_token'])
+        self._supply_raw[row] = position['supply_raw']
+        self._borrow_raw[row] = position['borrow_raw']
+        self._oracle_raw[row] = position['oracle_price_raw']
+        self._lt_pct[row] = position['liquidation_threshold']
+        self._supply_tok[row] = self._token_id(position['supply_token'])
+        self._borrow_tok[row] = self._token_id(position['borrow_token'])
+
+    def watch(self, user_id: int, position: Dict, alert_threshold: float, critical_threshold: float):
+        """Record that a user watches a position with the given thresholds"""
+        self.upsert(position)
+        row = self._rows[(position['chain'], position['nftId'])]
+        key = (user_id, position['chain'], position['nftId'])
+        idx = self._watch_rows.get(key)
+
+        if idx is None and self._free_watchers:
+            idx = self._free_watchers.pop()
+            self._watch_rows[key] = idx
+        elif idx is None:
+            idx = self._w_count
+            self._w_count += 1
+            self._watch_rows[key] = idx
+            self._w_row = self._grow(self._w_row, self._w_count)
+            self._w_user = self._grow(self._w_user, self._w_count)
+            self._w_alert = self._grow(self._w_alert, self._w_count)
+            self._w_critical = self._grow(self._w_critical, self._w_count)
+            self._w_active = self._grow(self._w_active, self._w_count)
+
+        self._watchers.setdefault(key[1:], set()).add(user_id)
+        self._w_row[idx] = row
+        self._w_user[idx] = user_id
+        self._w_alert[idx] = alert_threshold
+        self._w_critical[idx] = critical_threshold
+        self._w_active[idx] = True
+
+    def retain_watchers(self, monitored: set):
+        """
+        Deactivate watchers whose (user_id, owner address) is no longer monitored
+
+        Args:
+            monitored: Set of (user_id, lowercase address) pairs
+        """
+        for (user_id, chain, nft_id), idx in self._watch_rows.items():
+            owner = self._meta[self._rows[(chain, nft_id)]][2]
+            if (user_id, owner) not in monitored:
+                self._w_active[idx] = False
+
+    def retain_positions(self, chain: str, owner: str, nft_ids):
+        """
+        Remove owner's positions on chain that a fresh fetch no longer returned
+
+        Closed or transferred positions would otherwise stay in stress results
+        forever. Only call this with a complete, non-stale fetch.
+
+        Args:
+            chain: Chain key the fetch covered
+            owner: Address whose positions were fetched
+            nft_ids: Position IDs the fetch returned
+        """
+        known = self._by_owner.get((chain, owner.lower()))
+        if not known:
+            return
+        for nft_id in known - set(nft_ids):
+            self._remove((chain, nft_id))
+
+    def _remove(self, key: Tuple):
+        """Drop a position and its watchers, freeing their slots for reuse"""
+        row = self._rows.pop(key)
+        owner = self._meta[row][2]
+        self._by_owner[(key[0], owner)].discard(key[1])
+        if not self._by_owner[(key[0], owner)]:
+            del self._by_owner[(key[0], owner)]
+
+        # A free row reads as a debt-free (SAFE) position until reused
+        self._meta[row] = None
+        self._supply_raw[row] = self._borrow_raw[row] = self._oracle_raw[row] = 0
+        self._supply_tok[row] = self._borrow_tok[row] = 0
+        self._free_rows.append(row)
+
+        for user_id in self._watchers.pop(key, ()):
+            idx = self._watch_rows.pop((user_id,) + key)
+            self._w_active[idx] = False
+            self._free_watchers.append(idx)
+
+    def health_factors(self, shocks: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        Compute health factors for every cached position
+
+        Args:
+            shocks: {token symbol: price change in %}, e.g. {'ETH': -20}
+
+        Returns:
+            Array of health factors indexed by position row
+        """
+        n = len(self._meta)
+        supply_raw = self._supply_raw[:n]
+        borrow_raw = self._borrow_raw[:n]
+        oracle = self._oracle_raw[:n].copy()
+
+        # Oracle price is collateral priced in debt: collateral moves scale it
+        # up, debt moves scale it down
+        for symbol, pct in (shocks or {}).items():
+            token_id = self._tokens.get(symbol.upper())
+            if token_id is None:
+                continue
+            factor = 1 + pct / 100
+            oracle[self._supply_tok[:n] == token_id] *= factor
+            oracle[self._borrow_tok[:n] == token_id] /= factor
+
+        # HF = LT% / ratio% where ratio% = borrow / (supply * price) * 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            collateral = supply_raw * oracle / 1e27
+            hf = np.where(borrow_raw > 0, self._lt_pct[:n] * collateral / (borrow_raw * 100), np.inf)
+        return hf
+
+    def stress(self, shocks: Dict[str, float]) -> Dict[int, List[Dict]]:
+        """
+        Apply price shocks to all watched positions
+
+        Args:
+            shocks: {token symbol: price change in %}
+
+        Returns:
+            {user_id: [result, ...]} for every watcher whose position would move
+            to a worse level (ALERT or beyond) than it is at now. Each result has chain, nftId, owner, tokens,
+            health_factor, stressed_health_factor, level and previous_level.
+        """
+        if not self._w_count:
+            return {}
+
+        base = self.health_factors()
+        shocked = self.health_factors(shocks)
+
+        count = self._w_count
+        active = self._w_active[:count]
+        rows = self._w_row[:count]
+        alert = self._w_alert[:count]
+        critical = self._w_critical[:count]
+
+        base_level = self._levels(base[rows], alert, critical)
+        new_level = self._levels(shocked[rows], alert, critical)
+
+        # Only positions the shock pushes past a threshold they are not past yet
+        hits = np.flatnonzero(active & (new_level > base_level))
+        if not len(hits):
+            return {}
+
+        users = self._w_user[hits]
+        order = np.argsort(users, kind='stable')
+        hits = hits[order]
+        users = users[order]
+        splits = np.flatnonzero(np.diff(users)) + 1
+
+        results = {}
+        for group in np.split(hits, splits):
+            user_id = int(self._w_user[group[0]])
+            entries = []
+            for idx in group:
+                row = rows[idx]
+                chain, nft_id, owner, supply_token, borrow_token = self._meta[row]
+                entries.append({
+                    'chain': chain,
+                    'nftId': nft_id,
+                    'owner': owner,
+                    'supply_token': supply_token,
+                    'borrow_token': borrow_token,
+                    'health_factor': float(base[row]),
+                    'stressed_health_factor': float(shocked[row]),
+                    'level': LEVELS[new_level[idx]],
+                    'previous_level': LEVELS[base_level[idx]],
+                })
+            entries.sort(key=lambda r: r['stressed_health_factor'])
+            results[user_id] = entries
+
+        return results
+
+    @staticmethod
+    def _levels(hf: np.ndarray, alert: np.ndarray, critical: np.ndarray) -> np.ndarray:
+        """Map health factors to indexes into LEVELS"""
+        level = np.zeros(len(hf), dtype=np.int8)
+        level[hf < alert] = 1
+        level[hf < critical] = 2
+        level[hf < 1.0] = 3
+        return level
+
+
+def parse_shock(token: str, pct: str) -> Tuple[str, float]:
+    """
+    Parse /stress arguments
+
+    Args:
+        token: Token symbol, e.g. 'ETH'
+        pct: Price move in percent, e.g. '-20' or '-20%'
+
+    Returns:
+        (symbol, pct)
+    """
+    symbol = token.strip().upper()
+    if not SYMBOL_PATTERN.fullmatch(symbol):
+        raise ValueError("Token symbol may only contain letters, digits and '.'")
+    value = float(pct.strip().rstrip('%'))
+    if not math.isfinite(value):
+        raise ValueError("Price move must be a number")
+    if value <= -100:
+        raise ValueError("Price move must be greater than -100%")
+    if value > MAX_SHOCK_PCT:
+        raise ValueError(f"Price move must be at most +{MAX_SHOCK_PCT}%")
+    return symbol, value
+
+
+if __name__ == '__main__':
+    # Benchmark with 100k synthetic positions
+    import time
+    import random
+
+    book = PositionBook()
+    tokens = [('wstETH', 'USDC'), ('ETH', 'USDC'), ('WBTC', 'USDT'), ('wstETH', 'ETH')]
+
+    for i in range(100_000):
+        supply_token, borrow_token = random.choice(tokens)
+        position = {
+            'chain': 'eth', 'nftId': i, 'owner': f"0x{i:040x}",
+            'supply_token': supply_token, 'borrow_token': borrow_token,
+            'supply_raw': 10 ** 18, 'borrow_raw': random.uniform(1000, 2600) * 10 ** 6,
+            'oracle_price_raw': 3000 * 10 ** 27 // 10 ** 12,
+            'liquidation_threshold': 92.0,
+        }
+        book.watch(i % 20_000, position, 1.15, 1.05)
+
+    start = time.perf_counter()
+    results = book.stress({'ETH': -20, 'wstETH': -20})
+    elapsed = time.perf_counter() - start
+
+    affected = sum(len(r) for r in results.values())
+    print(f"Stressed {len(book)} positions in {elapsed * 1000:.1f} ms")
+    print(f"{affected} positions pushed to ALERT or worse across {len(results)} users")
+
+    # A closed position leaves the book and its slots are reused
+    book.retain_positions('eth', f"0x{0:040x}", [])
+    assert ('eth', 0) not in book._rows and len(book) == 99_999
+    assert all(r['nftId'] != 0 for entries in book.stress({'ETH': -50}).values() for r in entries)
+    book.watch(7, {**position, 'nftId': 100_000}, 1.15, 1.05)
+    assert book._rows[('eth', 100_000)] == 0 and len(book._meta) == 100_000
+    print("Closed position removed: OK")
+
+    for bad in ('nan', 'inf', '-inf', '-100', '1001%'):
+        try:
+            parse_shock('ETH', bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"parse_shock accepted {bad}")
+    assert parse_shock('usdc.e', '+1000%') == ('USDC.E', 1000.0)
+    print("Invalid shocks rejected: OK")